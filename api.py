@@ -0,0 +1,271 @@
+"""
+API HTTP do onboarding de fãs, com as mesmas cinco etapas do app Streamlit.
+
+    uvicorn api:app --workers 4 --port 8000
+    python api.py                      # usa KYF_API_WORKERS (padrão: 4)
+
+Os perfis ficam no profile_store (SQLite em KYF_DATA_DIR), compartilhado
+entre os workers e com o app. O cabeçalho X-Tenant escolhe o clube
+(tenants/<id>.json; padrão: KYF_TENANT), e cada clube tem os próprios dados.
+
+As rotas /fans exigem "Authorization: Bearer <chave>" com uma das chaves do
+clube em KYF_API_KEYS_<CLUBE> (separadas por vírgula, ex.: KYF_API_KEYS_FURIA);
+sem chaves configuradas o clube não é acessível pela API.
+"""
+import hmac
+import os
+import uuid
+from contextlib import asynccontextmanager
+
+import plotly.io as pio
+from fastapi import (APIRouter, Depends, FastAPI, File, Header, HTTPException,
+                     UploadFile)
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+
+from utils.activity_features import load_features
+from utils.data_visualization import create_dashboard_figures
+from utils.document_validator import (MAX_UPLOAD_BYTES, inspect_image_header,
+                                      prepare_document_image)
+from utils.onboarding import (check_personal_data, link_social_profiles,
+                              prepare_interests, record_fan_scores,
+                              verify_document, warm_up_tenants)
+from utils.pii_crypto import ENCRYPTED_FIELDS
+from utils.profile_store import (load_profile, load_section, profile_exists,
+                                 save_sections)
+from utils.social_media import (analyze_social_relevance,
+                                extract_social_media_info)
+from utils.tenants import DEFAULT_TENANT, set_tenant
+
+
+async def _select_tenant(x_tenant: str = Header(DEFAULT_TENANT)):
+    # O clube vale para a requisição inteira, inclusive no run_in_threadpool
+    try:
+        set_tenant(x_tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+def _api_keys(tenant_id):
+    name = f"KYF_API_KEYS_{tenant_id.upper().replace('-', '_')}"
+    return [key.strip() for key in os.environ.get(name, '').split(',') if key.strip()]
+
+
+async def _authenticate(x_tenant: str = Header(DEFAULT_TENANT),
+                        authorization: str = Header('')):
+    # Cada chave vale só para o seu clube: o X-Tenant não dá acesso sozinho
+    scheme, _, key = authorization.partition(' ')
+    if scheme.lower() != 'bearer' or not any(
+            hmac.compare_digest(key.encode(), valid.encode())
+            for valid in _api_keys(x_tenant)):
+        raise HTTPException(status_code=401, detail="Chave de API inválida.",
+                            headers={'WWW-Authenticate': 'Bearer'})
+
+
+@asynccontextmanager
+async def _lifespan(app):
+    # Configurações e catálogos de todos os clubes carregados antes da
+    # primeira requisição
+    await run_in_threadpool(warm_up_tenants)
+    yield
+
+
+app = FastAPI(title="Conheça Seu Fã - API de Onboarding",
+              dependencies=[Depends(_select_tenant)], lifespan=_lifespan)
+
+# Rotas dos fãs, todas autenticadas
+fans = APIRouter(dependencies=[Depends(_authenticate)])
+
+
+class PersonalData(BaseModel):
+    name: str = ''
+    email: str = ''
+    cpf: str = ''
+    phone: str = ''
+    address: str = ''
+    city: str = ''
+    state: str = ''
+    birth_date: str | None = None
+
+
+class InterestsData(BaseModel):
+    favorite_games: list[str] = []
+    favorite_teams: list[str] = []
+    other_games: str = ''
+    other_teams: str = ''
+    attended_events: str = ''
+    hours_gaming: int = 10
+    hours_watching: int = 5
+    merchandise: list[str] = []
+
+
+class SocialData(BaseModel):
+    twitter_username: str = ''
+    instagram_username: str = ''
+    facebook_profile: str = ''
+    discord_username: str = ''
+    twitch_username: str = ''
+    steam_profile: str = ''
+    other_platforms: str = ''
+
+
+async def _require_fan(fan_id):
+    if not await run_in_threadpool(profile_exists, fan_id):
+        raise HTTPException(status_code=404, detail="Perfil de fã não encontrado.")
+
+
+@app.get('/health')
+async def health():
+    return {'status': 'ok'}
+
+
+@fans.post('/fans', status_code=201)
+async def create_fan():
+    fan_id = uuid.uuid4().hex
+    await run_in_threadpool(save_sections, fan_id, {'documents': {}})
+    return {'fan_id': fan_id}
+
+
+# Etapa 1: Informações Pessoais
+@fans.put('/fans/{fan_id}/personal')
+async def submit_personal(fan_id: str, personal: PersonalData):
+    await _require_fan(fan_id)
+    form_data = personal.model_dump()
+    previous = await run_in_threadpool(load_section, fan_id, 'personal')
+
+    error = await run_in_threadpool(check_personal_data, form_data, fan_id,
+                                    previous.get('cpf'))
+    if error:
+        raise HTTPException(status_code=422, detail=error)
+
+    await run_in_threadpool(save_sections, fan_id,
+                            {'personal': {**previous, **form_data}})
+    return {'fan_id': fan_id, 'step': 2}
+
+
+# Etapa 2: Interesses e Atividades
+@fans.put('/fans/{fan_id}/interests')
+async def submit_interests(fan_id: str, interests: InterestsData):
+    await _require_fan(fan_id)
+    form_data = interests.model_dump()
+    if "Outro" not in form_data['favorite_games']:
+        form_data.pop('other_games')
+    if "Outro" not in form_data['favorite_teams']:
+        form_data.pop('other_teams')
+
+    form_data = await run_in_threadpool(prepare_interests, form_data, fan_id)
+    await run_in_threadpool(save_sections, fan_id, {'interests': form_data})
+    return {'fan_id': fan_id, 'step': 3}
+
+
+# Etapa 3: Verificação de Documentos
+@fans.post('/fans/{fan_id}/documents')
+async def submit_document(fan_id: str, document: UploadFile = File(...)):
+    await _require_fan(fan_id)
+
+    # O corpo multipart é gravado em disco em blocos pelo parser (acima de
+    # 1 MB); a imagem é decodificada direto desse arquivo, já reduzida
+    if document.size is not None and document.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Arquivo muito grande.")
+
+    is_valid, message = await run_in_threadpool(inspect_image_header,
+                                                document.file)
+    if not is_valid:
+        raise HTTPException(status_code=422, detail=message)
+
+    image = await run_in_threadpool(prepare_document_image, document.file)
+    await document.close()
+
+    personal = await run_in_threadpool(load_section, fan_id, 'personal')
+    result = await run_in_threadpool(verify_document, image, personal,
+                                     fan_id)
+
+    documents = await run_in_threadpool(load_section, fan_id, 'documents')
+    documents.update(result)
+    await run_in_threadpool(save_sections, fan_id, {'documents': documents})
+    return {'fan_id': fan_id, 'step': 4, **result}
+
+
+# Etapa 4: Redes Sociais e Perfis de Esports
+@fans.put('/fans/{fan_id}/social')
+async def submit_social(fan_id: str, social: SocialData):
+    await _require_fan(fan_id)
+    data = social.model_dump()
+    social_media_data = {key: data[key] for key in (
+        'twitter_username', 'instagram_username', 'facebook_profile',
+        'discord_username')}
+    esports_profiles_data = {key: data[key] for key in (
+        'twitch_username', 'steam_profile', 'other_platforms')}
+
+    if not any(social_media_data.values()) and not any(
+            esports_profiles_data.values()):
+        raise HTTPException(
+            status_code=422,
+            detail="Forneça pelo menos um perfil de rede social ou de esports.")
+
+    sections = {}
+    interests = await run_in_threadpool(load_section, fan_id, 'interests')
+    if any(social_media_data.values()):
+        social_media_data['analysis'] = await run_in_threadpool(
+            extract_social_media_info, social_media_data)
+        sections['social_media'] = social_media_data
+    if any(esports_profiles_data.values()):
+        esports_profiles_data['relevance'] = await run_in_threadpool(
+            analyze_social_relevance, esports_profiles_data, interests)
+        sections['esports_profiles'] = esports_profiles_data
+
+    await run_in_threadpool(save_sections, fan_id, sections)
+    shared_profiles = await run_in_threadpool(
+        link_social_profiles, social_media_data, esports_profiles_data, fan_id)
+    await run_in_threadpool(record_fan_scores, fan_id, interests,
+                            social_media_data, esports_profiles_data)
+    return {
+        'fan_id': fan_id,
+        'step': 5,
+        'shared_profiles': len(shared_profiles),
+        'analysis': sections.get('social_media', {}).get('analysis'),
+        'relevance': sections.get('esports_profiles', {}).get('relevance'),
+    }
+
+
+def _redacted(profile):
+    personal = {key: value for key, value in profile['personal'].items()
+                if key not in ENCRYPTED_FIELDS['personal']}
+    return {**profile, 'personal': personal}
+
+
+def _build_dashboard(profile):
+    return {name: pio.to_json(figure)
+            for name, figure in create_dashboard_figures(profile).items()}
+
+
+# Etapa 5: Painel
+@fans.get('/fans/{fan_id}/dashboard')
+async def dashboard(fan_id: str):
+    await _require_fan(fan_id)
+    profile = await run_in_threadpool(load_profile, fan_id)
+    charts = await run_in_threadpool(_build_dashboard, profile)
+    trends = await run_in_threadpool(load_features, fan_id)
+    return {
+        'fan_id': fan_id,
+        'verified': bool(profile['documents'].get('id_validated')),
+        # Sem os dados pessoais sensíveis (CPF, e-mail, telefone, endereço e
+        # data de nascimento)
+        'profile': _redacted(profile),
+        # Tendências e previsão da atividade semanal (ou None)
+        'activity_trends': trends,
+        # Figuras Plotly serializadas (plotly.io.to_json)
+        'charts': charts,
+    }
+
+
+app.include_router(fans)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run('api:app',
+                host=os.environ.get('KYF_API_HOST', '0.0.0.0'),
+                port=int(os.environ.get('KYF_API_PORT', '8000')),
+                workers=int(os.environ.get('KYF_API_WORKERS', '4')))
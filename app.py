@@ -1,31 +1,85 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import pandas as pd
 import os
 import json
+import time
+import uuid
 from datetime import datetime
-from utils.document_validator import validate_document, process_image_ocr
+from utils.document_validator import (inspect_image_header,
+                                      prepare_document_image)
 from utils.social_media import extract_social_media_info, analyze_social_relevance
 from utils.data_visualization import create_interest_chart, create_activity_timeline
+from utils.assets import asset_file, responsive_image_html
+from utils.instrumentation import record_duration
+from utils.onboarding import (check_personal_data, form_options,
+                              link_social_profiles, prepare_interests,
+                              record_fan_scores, verify_document,
+                              warm_up_tenants)
+from utils.session_profile import LazyProfile, fan_from_token, resume_token
+from utils.recommendations import recommend_for_fan
+from utils.fan_vectors import encode_profile
+from utils.similarity_index import SIMILAR_FAN_THRESHOLD, get_fan_index
+from utils.scoring import current_relevance
+from utils.activity_features import load_features
+from utils.session_memory import (deep_size, enforce_image_budget,
+                                  get_registry, load_image, release_images,
+                                  spill_image, sweep_spill_dir)
+from utils.tenants import DEFAULT_TENANT, set_tenant
+from utils.cpf_index import release_cpf
+
+# Clube da sessão, escolhido por ?club= na URL (padrão: KYF_TENANT); define
+# a identidade visual, as opções dos formulários e onde os dados são gravados
+if 'tenant' not in st.session_state:
+    st.session_state.tenant = st.query_params.get('club') or DEFAULT_TENANT
+try:
+    tenant = set_tenant(st.session_state.tenant)
+except ValueError:
+    st.session_state.tenant = DEFAULT_TENANT
+    tenant = set_tenant(DEFAULT_TENANT)
 
 # Configuração da página
-st.set_page_config(page_title="Conheça Seu Fã - FURIA",
-                   page_icon="🎮",
+st.set_page_config(page_title=tenant.page_title,
+                   page_icon=(tenant.icon and asset_file(tenant.icon, 32)) or "🎮",
                    layout="wide",
                    initial_sidebar_state="expanded")
 
+# Mantém o clube na URL, junto com o token de retomada, para voltar após recarregar
+st.query_params['club'] = tenant.id
+
+
+@st.cache_resource
+def warm_up():
+    # Uma vez por processo: imagens despejadas por processos anteriores e
+    # configurações e catálogos de todos os clubes
+    sweep_spill_dir()
+    return warm_up_tenants()
+
+
+warm_up()
+
 # Inicializa as variáveis do estado da sessão se elas não existirem
+if 'fan_id' not in st.session_state:
+    # O perfil é retomado após recarregar a página ou reiniciar o servidor,
+    # em qualquer réplica do app, só com um token assinado e com validade;
+    # o fan_id em si não vai para a URL
+    st.session_state.fan_id = (fan_from_token(st.query_params.get('resume'))
+                               or uuid.uuid4().hex)
+    st.query_params.pop('fan', None)
+    st.query_params['resume'] = resume_token(st.session_state.fan_id)
 if 'step' not in st.session_state:
     st.session_state.step = 1
 if 'user_data' not in st.session_state:
-    st.session_state.user_data = {
-        'personal': {},
-        'interests': {},
-        'documents': {},
-        'social_media': {},
-        'esports_profiles': {}
-    }
+    # Apenas o fan_id fica em memória; as seções do perfil são carregadas do
+    # profile_store sob demanda e gravadas ao final de cada execução
+    st.session_state.user_data = LazyProfile(st.session_state.fan_id)
 if 'progress' not in st.session_state:
     st.session_state.progress = 0
+if 'document_images' not in st.session_state:
+    st.session_state.document_images = {}
+if 'upload_generations' not in st.session_state:
+    # Muda a chave de cada uploader para recriá-lo vazio após a validação
+    st.session_state.upload_generations = {'id_doc': 0, 'secondary_doc': 0}
 
 
 # Funções para navegar entre as etapas
@@ -42,15 +96,89 @@ def prev_step():
 
 
 def save_form_data(form_data, category):
+    # Gravado na hora: um erro ou st.rerun() antes do fim da execução não
+    # perde a alteração
     st.session_state.user_data[category].update(form_data)
-
+    st.session_state.user_data.flush()
+
+
+def show_image(name, caption=None, width=None, fallback=None):
+    # Imagens servidas localmente (static/img) em variantes responsivas,
+    # geradas por python -m utils.assets; nada é carregado de fora
+    html = responsive_image_html(name, alt=caption or '', width=width)
+    if html:
+        st.markdown(html, unsafe_allow_html=True)
+        if caption:
+            st.caption(caption)
+    elif fallback:
+        st.image(fallback, caption=caption, width=width)
+
+
+def load_document_image(uploaded_file):
+    # Valida o cabeçalho e decodifica o upload uma única vez; o array reduzido
+    # é reutilizado nas execuções seguintes para a prévia e para o OCR
+    images = st.session_state.document_images
+    if uploaded_file.file_id not in images:
+        is_valid, message = inspect_image_header(uploaded_file)
+        if not is_valid:
+            st.error(message)
+            return None
+        images[uploaded_file.file_id] = prepare_document_image(uploaded_file)
+    return load_image(images[uploaded_file.file_id])
+
+
+def drop_upload(uploaded_file, uploader):
+    # Depois da validação a imagem vai para o disco e os bytes do upload
+    # guardados pelo Streamlit são descartados; só este uploader volta vazio
+    spill_image(st.session_state.document_images, uploaded_file.file_id)
+    ctx = get_script_run_ctx()
+    if ctx is not None:
+        ctx.uploaded_file_mgr.remove_file(ctx.session_id, uploaded_file.file_id)
+    st.session_state.validated_document = uploaded_file.file_id
+    st.session_state.upload_generations[uploader] += 1
+
+
+def track_session_memory():
+    # Mede o estado da sessão (incluindo uploads e imagens) e registra uma
+    # função que o libera se a sessão ficar ociosa (utils/session_memory.py)
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return
+    images = st.session_state.document_images
+    enforce_image_budget(images)
+    state = {key: st.session_state[key] for key in st.session_state}
+    session_id, uploads = ctx.session_id, ctx.uploaded_file_mgr
+
+    def release():
+        release_images(images)
+        uploads.remove_session_files(session_id)
+
+    get_registry().touch(session_id, deep_size(state), release)
+
+
+def release_evicted_session():
+    # Uma sessão marcada como excedente (KYF_MAX_SESSIONS) não é liberada
+    # pela thread de outra sessão; a liberação acontece aqui, no início da
+    # própria execução, antes de as imagens e uploads serem usados
+    ctx = get_script_run_ctx()
+    if ctx is not None:
+        get_registry().release_pending(ctx.session_id)
+
+
+release_evicted_session()
+
+
+# Tempo de renderização da etapa atual (exibido na página de administração)
+render_started = time.perf_counter()
+rendered_step = st.session_state.step
 
 # Cabeçalho
 col1, col2 = st.columns([1, 5])
 with col1:
-    st.image("https://upload.wikimedia.org/wikipedia/pt/f/f9/Furia_Esports_logo.png", width=80)
+    if tenant.logo:
+        show_image(tenant.logo, width=80, fallback=tenant.logo_fallback)
 with col2:
-    st.title("Conheça Seu Fã - FURIA")
+    st.title(tenant.page_title)
     st.subheader(
         "Crie seu perfil de fã para desbloquear experiências exclusivas")
 
@@ -142,16 +270,13 @@ if st.session_state.step == 1:
                 birth_date.strftime('%Y-%m-%d') if birth_date else None
             }
 
-            # Validar campos obrigatórios
-            required_fields = ['name', 'email', 'cpf']
-            empty_fields = [
-                field for field in required_fields if not form_data.get(field)
-            ]
+            # Validar campos obrigatórios, CPF e cadastro duplicado
+            error = check_personal_data(
+                form_data, st.session_state.fan_id,
+                st.session_state.user_data['personal'].get('cpf'))
 
-            if empty_fields:
-                st.error(
-                    f"Por favor, preencha os seguintes campos obrigatórios: {', '.join(empty_fields)}"
-                )
+            if error:
+                st.error(error)
             else:
                 save_form_data(form_data, 'personal')
                 next_step()
@@ -161,16 +286,13 @@ elif st.session_state.step == 2:
     st.header("Interesses e Atividades de Esports")
 
     with st.form("interests_form"):
+        options = form_options()
+
         # Jogos favoritos
         st.subheader("Jogos Favoritos")
-        games_options = [
-            "League of Legends", "Counter-Strike", "Valorant", "Dota 2",
-            "Overwatch", "Fortnite", "Rainbow Six Siege", "Rocket League",
-            "Outro"
-        ]
         favorite_games = st.multiselect(
             "Selecione seus jogos favoritos",
-            games_options,
+            options['games'],
             default=st.session_state.user_data['interests'].get(
                 'favorite_games', []))
 
@@ -184,13 +306,9 @@ elif st.session_state.step == 2:
 
         # Times favoritos
         st.subheader("Times Favoritos")
-        teams_options = [
-            "FURIA", "LOUD", "Team Liquid", "paiN Gaming", "Cloud9", "Fnatic",
-            "G2 Esports", "T1", "FaZe Clan", "Outro"
-        ]
         favorite_teams = st.multiselect(
             "Selecione seus times favoritos",
-            teams_options,
+            options['teams'],
             default=st.session_state.user_data['interests'].get(
                 'favorite_teams', []))
 
@@ -220,13 +338,9 @@ elif st.session_state.step == 2:
 
         # Compras de produtos
         st.subheader("Compras de Produtos")
-        merch_options = [
-            "Camisetas de Times", "Acessórios de Times",
-            "Equipamentos de Gaming", "Colecionáveis", "Nenhum"
-        ]
         merchandise = st.multiselect(
             "Produtos comprados no último ano",
-            merch_options,
+            options['merchandise'],
             default=st.session_state.user_data['interests'].get(
                 'merchandise', []))
 
@@ -247,6 +361,8 @@ elif st.session_state.step == 2:
             if "Outro" in favorite_teams:
                 form_data['other_teams'] = other_teams
 
+            form_data = prepare_interests(form_data,
+                                          st.session_state.fan_id)
             save_form_data(form_data, 'interests')
             next_step()
 
@@ -271,43 +387,55 @@ elif st.session_state.step == 3:
         st.subheader("Documento de Identidade")
         id_doc = st.file_uploader(
             "Carregue seu documento de identidade (frente)",
-            type=["jpg", "jpeg", "png"])
+            type=["jpg", "jpeg", "png"],
+            key=f"id_doc_{st.session_state.upload_generations['id_doc']}")
+
+        id_image = load_document_image(id_doc) if id_doc else None
+        if id_image is None and st.session_state.get(
+                'validated_document') in st.session_state.document_images:
+            # Documento já validado: a prévia vem da imagem despejada
+            id_image = load_image(st.session_state.document_images[
+                st.session_state.validated_document])
 
-        if id_doc:
+        if id_image is not None:
             # Exibir o documento carregado
-            st.image(id_doc, caption="Documento Carregado", width=300)
+            st.image(id_image, caption="Documento Carregado", width=300)
 
             # Processar e validar documento usando OCR
             if st.button("Validar Documento"):
                 with st.spinner("Processando documento..."):
-                    # Processar o documento usando OCR
-                    extracted_text = process_image_ocr(id_doc)
-
-                    # Validar as informações extraídas
-                    is_valid, validation_message = validate_document(
-                        extracted_text, st.session_state.user_data['personal'])
-
-                    if is_valid:
-                        st.success(validation_message)
-                        st.session_state.user_data['documents'][
-                            'id_validated'] = True
-                        st.session_state.user_data['documents'][
-                            'id_validation_message'] = validation_message
+                    # Processar o documento usando OCR e validar as informações extraídas
+                    result = verify_document(
+                        id_image, st.session_state.user_data['personal'],
+                        st.session_state.fan_id)
+                    save_form_data(result, 'documents')
+
+                    if result['id_validated']:
+                        st.success(result['id_validation_message'])
                     else:
-                        st.error(validation_message)
-                        st.session_state.user_data['documents'][
-                            'id_validated'] = False
-                        st.session_state.user_data['documents'][
-                            'id_validation_message'] = validation_message
+                        st.error(result['id_validation_message'])
+
+                    if result.get('image_reused'):
+                        st.warning(
+                            "Esta imagem de documento já foi enviada em outro perfil de fã e será revisada."
+                        )
+
+                    # Se a validação falhar o upload fica para uma nova tentativa
+                    if id_doc is not None and result['id_validated']:
+                        drop_upload(id_doc, 'id_doc')
 
         # Documento secundário (opcional)
         st.subheader("Documento Secundário (Opcional)")
         secondary_doc = st.file_uploader(
             "Carregue outro documento para verificação adicional",
-            type=["jpg", "jpeg", "png"])
+            type=["jpg", "jpeg", "png"],
+            key=f"secondary_doc_{st.session_state.upload_generations['secondary_doc']}")
+
+        secondary_image = load_document_image(
+            secondary_doc) if secondary_doc else None
 
-        if secondary_doc:
-            st.image(secondary_doc,
+        if secondary_image is not None:
+            st.image(secondary_image,
                      caption="Documento Secundário Carregado",
                      width=300)
 
@@ -450,6 +578,21 @@ elif st.session_state.step == 4:
                     st.warning(
                         "Por favor, forneça pelo menos um perfil de esports.")
 
+                # Registrar os usuários normalizados no índice de perfis
+                shared_profiles = link_social_profiles(
+                    st.session_state.user_data['social_media'],
+                    st.session_state.user_data['esports_profiles'],
+                    st.session_state.fan_id)
+                record_fan_scores(st.session_state.fan_id,
+                                  st.session_state.user_data['interests'],
+                                  st.session_state.user_data['social_media'],
+                                  st.session_state.user_data['esports_profiles'])
+                if shared_profiles:
+                    st.warning(
+                        "Alguns perfis informados já estão vinculados a outro perfil de fã: "
+                        + ', '.join(f"{platform}: {handle}"
+                                    for platform, handle in shared_profiles))
+
     with col2:
         st.subheader("Por que Conectar Redes Sociais?")
         st.info("""
@@ -467,10 +610,8 @@ elif st.session_state.step == 4:
         """)
 
         # Exibir uma imagem de amostra de fãs de esports
-        st.image(
-            "https://images.unsplash.com/photo-1513151233558-d860c5398176",
-            caption="Fãs de esports celebrando em um evento",
-            use_column_width=True)
+        show_image('fans-celebrating',
+                   caption="Fãs de esports celebrando em um evento")
 
     # Resultados da análise de redes sociais (se disponível)
     if 'analysis' in st.session_state.user_data['social_media']:
@@ -493,14 +634,14 @@ elif st.session_state.step == 4:
         st.subheader("Relevância do Perfil de Esports")
 
         relevance = st.session_state.user_data['esports_profiles']['relevance']
+        # Recalculada se os pesos mudaram desde a análise
+        relevance_score, confidence = current_relevance(relevance)
 
         col1, col2 = st.columns(2)
         with col1:
-            st.metric("Pontuação de Relevância",
-                      f"{relevance.get('relevance_score', 0)}/10")
+            st.metric("Pontuação de Relevância", f"{relevance_score}/10")
         with col2:
-            st.metric("Nível de Confiança",
-                      relevance.get('confidence', 'Médio'))
+            st.metric("Nível de Confiança", confidence)
 
     # Botões de navegação
     col1, col2 = st.columns(2)
@@ -526,9 +667,7 @@ elif st.session_state.step == 5:
 
         with col1:
             # Exibir uma imagem de configuração de jogo como foto de perfil
-            st.image(
-                "https://images.unsplash.com/photo-1598550457678-aa60413d7c80",
-                use_column_width=True)
+            show_image('gaming-setup')
 
             # Exibir status de verificação
             if st.session_state.user_data['documents'].get('id_validated'):
@@ -572,6 +711,23 @@ elif st.session_state.step == 5:
                 fig = create_activity_timeline(
                     st.session_state.user_data['social_media']['analysis'])
                 st.plotly_chart(fig, use_container_width=True)
+
+                # Tendências da atividade semanal (utils/activity_features.py)
+                trends = load_features(st.session_state.fan_id)
+                if trends:
+                    trend_cols = st.columns(3)
+                    trend_cols[0].metric(
+                        "Média (4 semanas)", trends['mean_4w'],
+                        f"{trends['growth_4w']:+.0%}")
+                    trend_cols[1].metric("Semanas Ativas Seguidas",
+                                         trends['active_streak'])
+                    trend_cols[2].metric(
+                        "Previsão (próx. semana)", trends['forecast'][0],
+                        round(trends['forecast'][0] - trends['mean_4w'], 1))
+                    if trends['at_risk']:
+                        st.warning(
+                            "Sua atividade está caindo. Que tal conferir os próximos eventos recomendados?"
+                        )
             else:
                 st.info(
                     "Nenhum dado de redes sociais disponível. Conecte suas contas para ver insights."
@@ -620,23 +776,33 @@ elif st.session_state.step == 5:
         recommendations_col1, recommendations_col2, recommendations_col3 = st.columns(
             3)
 
+        recommendations = recommend_for_fan(st.session_state.user_data)
+
         with recommendations_col1:
             st.markdown("#### Próximos Eventos")
-            st.markdown("- FURIA vs. Liquid - 15 de Junho")
-            st.markdown("- ESL Pro League Temporada 18 - Julho 2023")
-            st.markdown("- GamesCon Brasil - Setembro 2023")
+            for title in recommendations['events']:
+                st.markdown(f"- {title}")
 
         with recommendations_col2:
             st.markdown("#### Produtos")
-            st.markdown("- Camiseta de Edição Limitada do Time")
-            st.markdown("- Pacote de Periféricos de Gaming")
-            st.markdown("- Itens Colecionáveis do Campeonato")
+            for title in recommendations['products']:
+                st.markdown(f"- {title}")
 
         with recommendations_col3:
             st.markdown("#### Comunidade")
-            st.markdown("- Entre no Discord Oficial")
-            st.markdown("- Siga as Redes Sociais do Time")
-            st.markdown("- Participe de Concursos para Fãs")
+            for title in recommendations['community']:
+                st.markdown(f"- {title}")
+
+        # Fãs com perfil parecido (apenas a contagem, sem expor outros fãs)
+        fan_vector = encode_profile(st.session_state.user_data)
+        similar_fans = [
+            fan for fan, similarity in get_fan_index().search(
+                fan_vector, k=50, exclude=st.session_state.fan_id)
+            if similarity >= SIMILAR_FAN_THRESHOLD
+        ]
+        if similar_fans:
+            st.info(f"🤝 {len(similar_fans)}{'+' if len(similar_fans) == 50 else ''} "
+                    "fãs têm um perfil parecido com o seu!")
 
         # Galeria de imagens de fãs
         st.markdown("### Comunidade de Fãs de Esports")
@@ -644,24 +810,16 @@ elif st.session_state.step == 5:
         gallery_col1, gallery_col2, gallery_col3, gallery_col4 = st.columns(4)
 
         with gallery_col1:
-            st.image(
-                "https://images.unsplash.com/photo-1527529482837-4698179dc6ce",
-                use_column_width=True)
+            show_image('community-1')
 
         with gallery_col2:
-            st.image(
-                "https://images.unsplash.com/photo-1593305841991-05c297ba4575",
-                use_column_width=True)
+            show_image('community-2')
 
         with gallery_col3:
-            st.image(
-                "https://images.unsplash.com/photo-1516880711640-ef7db81be3e1",
-                use_column_width=True)
+            show_image('community-3')
 
         with gallery_col4:
-            st.image(
-                "https://images.unsplash.com/photo-1467810563316-b5476525c0f9",
-                use_column_width=True)
+            show_image('community-4')
 
         # Opção de exportar dados
         st.markdown("### Gerenciamento de Dados")
@@ -671,7 +829,8 @@ elif st.session_state.step == 5:
         with export_col1:
             if st.button("Exportar Dados do Perfil"):
                 # Converter os dados para JSON
-                profile_json = json.dumps(st.session_state.user_data, indent=4)
+                profile_json = json.dumps(
+                    st.session_state.user_data.to_dict(), indent=4)
 
                 # Criar um botão de download
                 st.download_button(label="Baixar JSON",
@@ -681,14 +840,13 @@ elif st.session_state.step == 5:
 
         with export_col2:
             if st.button("Recomeçar"):
-                # Resetar o estado da sessão
-                st.session_state.user_data = {
-                    'personal': {},
-                    'interests': {},
-                    'documents': {},
-                    'social_media': {},
-                    'esports_profiles': {}
-                }
+                # Resetar o estado da sessão, liberando o CPF para um novo cadastro
+                cpf = (st.session_state.user_data.get('personal') or {}).get('cpf')
+                if cpf:
+                    release_cpf(cpf, st.session_state.fan_id)
+                st.session_state.user_data.clear()
+                st.session_state.user_data.flush()
+                release_images(st.session_state.document_images)
                 st.session_state.step = 1
                 st.session_state.progress = 0
                 st.rerun()
@@ -699,6 +857,7 @@ elif st.session_state.step == 5:
 
         if st.button("Iniciar Criação de Perfil"):
             st.session_state.step = 1
+            st.session_state.user_data.flush()
             st.rerun()
 
 # Rodapé
@@ -710,3 +869,9 @@ st.markdown("""
 </div>
 """,
             unsafe_allow_html=True)
+
+# Gravar as seções do perfil alteradas nesta execução
+st.session_state.user_data.flush()
+track_session_memory()
+
+record_duration(f"app.step_{rendered_step}", time.perf_counter() - render_started)
@@ -0,0 +1 @@
+# Benchmarks reproduzíveis do pipeline de documentos
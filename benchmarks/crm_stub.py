@@ -0,0 +1,96 @@
+"""
+Local stand-in for the CRM bulk import endpoint, for tests and benchmarks.
+
+    python -m benchmarks.crm_stub --port 8765 --fail-rate 0.2
+    KYF_CRM_URL=http://localhost:8765/profiles python -m utils.crm_sync --all
+
+Batches are deduplicated by their Idempotency-Key header, as the real CRM
+does. --fail-rate answers that fraction of requests with 503 so the sync
+retries can be exercised.
+"""
+import argparse
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class CRMStub(ThreadingHTTPServer):
+    """
+    HTTP server that keeps every profile it accepted.
+
+    Attributes:
+        profiles (dict): fan_id to the last record received
+        batches (set): Idempotency keys already accepted
+        requests (int): Requests received, including failed and duplicate
+        duplicates (int): Batches received again with a known key
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), fail_rate=0.0, seed=0):
+        super().__init__(address, _Handler)
+        self.fail_rate = fail_rate
+        self.profiles = {}
+        self.batches = set()
+        self.requests = 0
+        self.duplicates = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/profiles"
+
+    def start(self):
+        """Serve in a background thread and return the server."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        stub = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        key = self.headers.get('Idempotency-Key')
+        with stub._lock:
+            stub.requests += 1
+            if stub._random.random() < stub.fail_rate:
+                status = 503
+            elif not key:
+                status = 400
+            elif key in stub.batches:
+                stub.duplicates += 1
+                status = 200
+            else:
+                for record in json.loads(body)['profiles']:
+                    stub.profiles[record['fan_id']] = record
+                stub.batches.add(key)
+                status = 200
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    stub = CRMStub(('127.0.0.1', args.port), fail_rate=args.fail_rate)
+    print(f"CRM de teste em {stub.url}")
+    try:
+        stub.serve_forever()
+    except KeyboardInterrupt:
+        print(f"{len(stub.profiles)} perfis, {len(stub.batches)} lotes, "
+              f"{stub.requests} requisições ({stub.duplicates} repetidas)")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,122 @@
+"""
+Benchmark of bulk profile reads with and without field-level encryption.
+
+    python -m benchmarks.crypto_benchmark                 # 5000 fans, budget 2x
+    python -m benchmarks.crypto_benchmark --fans 20000 --budget 1.8
+
+The same synthetic 'personal' sections are stored twice in a temporary data
+directory, once in plain text and once with the sensitive fields sealed
+(utils/pii_crypto.py), and both sets are read back with export_section.
+
+The run exits with status 1 when the encrypted bulk read takes longer than
+--budget times the plain one.
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from utils import pii_crypto, storage
+from utils.profile_store import export_section, load_section, save_sections
+
+
+def _personal(rng, fan_id):
+    return {
+        'name': f"Fã {fan_id}",
+        'email': f"{fan_id}@example.com",
+        'cpf': ''.join(rng.choice('0123456789') for _ in range(11)),
+        'phone': f"(11) 9{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}",
+        'address': f"Rua {rng.randint(1, 999)}, {rng.randint(1, 3000)}",
+        'city': 'São Paulo',
+        'state': 'SP',
+        'birth_date': f"{rng.randint(1970, 2008)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+        'registration_date': '2025-01-01 12:00:00',
+    }
+
+
+def _best_of(repeat, function):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run_benchmark(fans=5000, repeat=9, seed=0):
+    """
+    Stores both sets of fans and times the bulk reads.
+
+    Args:
+        fans (int): Fans in each set
+        repeat (int): Runs per measurement (the best one is kept)
+        seed (int): Seed of the synthetic data
+
+    Returns:
+        dict: Timings (ms) and the encrypted/plain ratio
+    """
+    rng = random.Random(seed)
+    plain_ids = [f"plain-{i}" for i in range(fans)]
+    sealed_ids = [f"sealed-{i}" for i in range(fans)]
+
+    pii_crypto.ENCRYPTION_ENABLED = False
+    for fan_id in plain_ids:
+        save_sections(fan_id, {'personal': _personal(rng, fan_id)})
+    pii_crypto.ENCRYPTION_ENABLED = True
+    start = time.perf_counter()
+    for fan_id in sealed_ids:
+        save_sections(fan_id, {'personal': _personal(rng, fan_id)})
+    save_ms = (time.perf_counter() - start) * 1000 / fans
+
+    plain_s = _best_of(repeat, lambda: export_section('personal', plain_ids))
+    sealed_s = _best_of(repeat, lambda: export_section('personal', sealed_ids))
+
+    single = []
+    for fan_id in rng.sample(sealed_ids, min(fans, 500)):
+        start = time.perf_counter()
+        load_section(fan_id, 'personal')
+        single.append(time.perf_counter() - start)
+
+    return {
+        'fans': fans,
+        'seed': seed,
+        'bulk_plain_ms': round(plain_s * 1000, 2),
+        'bulk_encrypted_ms': round(sealed_s * 1000, 2),
+        'ratio': round(sealed_s / plain_s, 3),
+        'encrypted_rows_per_s': round(fans / sealed_s),
+        'save_encrypted_ms_per_fan': round(save_ms, 3),
+        'load_encrypted_p95_ms': round(float(np.percentile(single, 95)) * 1000, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--fans', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=9)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--budget', type=float, default=2.0,
+                        help="Razão máxima entre a leitura cifrada e a em texto puro")
+    args = parser.parse_args(argv)
+
+    if pii_crypto.AESGCM is None:
+        print("Pacote cryptography não instalado.")
+        return 2
+
+    storage.DATA_DIR = tempfile.mkdtemp(prefix='kyf-crypto-')
+    result = run_benchmark(fans=args.fans, repeat=args.repeat, seed=args.seed)
+    result['budget'] = args.budget
+    print(json.dumps(result, indent=2))
+
+    if result['ratio'] > args.budget:
+        print(f"Leitura cifrada {result['ratio']}x acima do orçamento de {args.budget}x.")
+        return 1
+    print("Leitura cifrada dentro do orçamento.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,316 @@
+"""
+Load test of the full onboarding flow (steps 1 to 5), run headlessly through
+the same functions the Streamlit app and the API call.
+
+    python -m benchmarks.load_test --levels 10,50,100 --sessions 200 --output run.json
+    python -m benchmarks.load_test --compare before.json after.json
+
+Each simulated fan runs in its own thread, as a Streamlit session would.
+Concurrency is ramped level by level while per-step latency, error rate,
+CPU usage and process RSS are recorded.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from benchmarks.synthetic_documents import generate_dataset
+from utils import storage
+from utils.data_visualization import (create_activity_timeline,
+                                      create_engagement_radar,
+                                      create_interest_chart)
+from utils.document_validator import inspect_image_header, prepare_document_image
+from utils.onboarding import (check_personal_data, link_social_profiles,
+                              prepare_interests, record_fan_scores,
+                              verify_document)
+from utils.profile_store import load_profile, load_section, save_sections
+from utils.social_media import analyze_social_relevance, extract_social_media_info
+
+STEPS = ('personal', 'interests', 'documents', 'social', 'dashboard')
+
+GAMES = ["League of Legends", "Counter-Strike", "Valorant", "Dota 2",
+         "Overwatch", "Fortnite", "Rainbow Six Siege", "Rocket League"]
+TEAMS = ["FURIA", "LOUD", "Team Liquid", "paiN Gaming", "Cloud9", "Fnatic",
+         "G2 Esports", "T1", "FaZe Clan"]
+
+
+class UploadedBytes(io.BytesIO):
+    """Minimal stand-in for Streamlit's UploadedFile."""
+
+    @property
+    def size(self):
+        return len(self.getbuffer())
+
+
+def _read_rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _cpu_seconds():
+    # Inclui os subprocessos do Tesseract já finalizados
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+class ResourceSampler(threading.Thread):
+    """Samples process RSS in the background and keeps the peak."""
+
+    def __init__(self, interval=0.1):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak_rss_mb = _read_rss_mb()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.peak_rss_mb = max(self.peak_rss_mb, _read_rss_mb())
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+def build_document_pool(size, seed):
+    """
+    Encode a pool of synthetic documents as JPEG uploads.
+
+    Args:
+        size (int): Number of documents
+        seed (int): Dataset seed
+
+    Returns:
+        list: (jpeg_bytes, name, cpf) tuples
+    """
+    pool = []
+    for sample in generate_dataset(size, seed=seed):
+        ok, encoded = cv2.imencode('.jpg', sample['image'][:, :, ::-1],
+                                   [cv2.IMWRITE_JPEG_QUALITY, 85])
+        pool.append((encoded.tobytes(), sample['name'], sample['cpf']))
+    return pool
+
+
+def run_session(document, rng, with_ocr=True):
+    """
+    Run one fan through the five onboarding steps.
+
+    Args:
+        document (tuple): (jpeg_bytes, name, cpf) from build_document_pool
+        rng (random.Random): Random generator for the form answers
+        with_ocr (bool): Run Tesseract in step 3
+
+    Returns:
+        dict: Step name to latency in seconds
+    """
+    jpeg_bytes, name, cpf = document
+    fan_id = uuid.uuid4().hex
+    timings = {}
+
+    t0 = time.perf_counter()
+    personal = {'name': name, 'email': f"{fan_id[:8]}@example.com",
+                'cpf': cpf, 'city': 'São Paulo', 'state': 'SP'}
+    # O pool de documentos é reutilizado, então o CPF pode já estar
+    # cadastrado por outra sessão simulada; o conflito é esperado aqui
+    error = check_personal_data(personal, fan_id)
+    if error and 'já está cadastrado' not in error:
+        raise ValueError(error)
+    save_sections(fan_id, {'personal': personal})
+    timings['personal'] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    interests = {
+        'favorite_games': rng.sample(GAMES, rng.randint(1, 4)),
+        'favorite_teams': rng.sample(TEAMS, rng.randint(1, 3)),
+        'attended_events': '\n'.join(['IEM Rio', 'CBLOL Final'][:rng.randint(0, 2)]),
+        'hours_gaming': rng.randint(0, 50),
+        'hours_watching': rng.randint(0, 30),
+        'merchandise': [],
+    }
+    interests = prepare_interests(interests, fan_id)
+    save_sections(fan_id, {'interests': interests})
+    timings['interests'] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    upload = UploadedBytes(jpeg_bytes)
+    is_valid, message = inspect_image_header(upload)
+    if not is_valid:
+        raise ValueError(message)
+    image = prepare_document_image(upload)
+    if with_ocr:
+        result = verify_document(image, load_section(fan_id, 'personal'),
+                                 fan_id)
+        save_sections(fan_id, {'documents': result})
+    timings['documents'] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    social_media = {'twitter_username': f"fan_{fan_id[:6]}",
+                    'instagram_username': '', 'facebook_profile': '',
+                    'discord_username': ''}
+    esports = {'twitch_username': f"tv_{fan_id[:6]}", 'steam_profile': '',
+               'other_platforms': ''}
+    social_media['analysis'] = extract_social_media_info(social_media)
+    esports['relevance'] = analyze_social_relevance(esports, interests)
+    save_sections(fan_id, {'social_media': social_media,
+                           'esports_profiles': esports})
+    link_social_profiles(social_media, esports, fan_id)
+    record_fan_scores(fan_id, interests, social_media, esports)
+    timings['social'] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    profile = load_profile(fan_id)
+    create_interest_chart(dict(profile['interests'])).to_json()
+    create_activity_timeline(profile['social_media']['analysis']).to_json()
+    create_engagement_radar(profile['social_media']['analysis'],
+                            profile['interests']).to_json()
+    timings['dashboard'] = time.perf_counter() - t0
+
+    return timings
+
+
+def run_level(concurrency, sessions, pool, seed, with_ocr):
+    """
+    Run `sessions` onboarding sessions with `concurrency` parallel fans.
+
+    Returns:
+        dict: Latency percentiles per step, error rate, CPU and RSS figures
+    """
+    latencies = {step: [] for step in STEPS}
+    errors = []
+    lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random(seed * 100003 + index)
+        try:
+            timings = run_session(pool[index % len(pool)], rng, with_ocr)
+        except Exception:
+            with lock:
+                errors.append(traceback.format_exc(limit=1).strip().splitlines()[-1])
+            return
+        with lock:
+            for step, seconds in timings.items():
+                latencies[step].append(seconds)
+
+    sampler = ResourceSampler()
+    sampler.start()
+    cpu_before = _cpu_seconds()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(sessions)))
+    elapsed = time.perf_counter() - started
+    cpu_seconds = _cpu_seconds() - cpu_before
+    sampler.stop()
+
+    steps = {}
+    for step, values in latencies.items():
+        if values:
+            p50, p95, p99 = np.percentile(np.asarray(values) * 1000, [50, 95, 99])
+            steps[step] = {'p50_ms': round(p50, 2), 'p95_ms': round(p95, 2),
+                           'p99_ms': round(p99, 2)}
+
+    return {
+        'concurrency': concurrency,
+        'sessions': sessions,
+        'errors': len(errors),
+        'error_rate': round(len(errors) / sessions, 4),
+        'sample_errors': sorted(set(errors))[:5],
+        'sessions_per_s': round((sessions - len(errors)) / elapsed, 2),
+        'cpu_percent': round(100 * cpu_seconds / elapsed, 1),
+        'peak_rss_mb': round(sampler.peak_rss_mb, 1),
+        'steps': steps,
+    }
+
+
+def compare_reports(before, after):
+    """
+    Print a side-by-side comparison of two reports, level by level.
+
+    Args:
+        before (dict): Earlier report
+        after (dict): Later report
+    """
+    previous = {level['concurrency']: level for level in before['levels']}
+    print(f"{'conc':>5} {'metric':<22} {'antes':>10} {'depois':>10} {'delta':>8}")
+    for level in after['levels']:
+        old = previous.get(level['concurrency'])
+        if not old:
+            continue
+        rows = [('sessions_per_s', old['sessions_per_s'], level['sessions_per_s']),
+                ('error_rate', old['error_rate'], level['error_rate']),
+                ('cpu_percent', old['cpu_percent'], level['cpu_percent']),
+                ('peak_rss_mb', old['peak_rss_mb'], level['peak_rss_mb'])]
+        for step in STEPS:
+            if step in old['steps'] and step in level['steps']:
+                rows.append((f"{step}.p95_ms", old['steps'][step]['p95_ms'],
+                             level['steps'][step]['p95_ms']))
+        for metric, a, b in rows:
+            delta = f"{(b - a) / a * 100:+.1f}%" if a else 'n/a'
+            print(f"{level['concurrency']:>5} {metric:<22} {a:>10} {b:>10} {delta:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--levels', default='10,50,100',
+                        help="Níveis de concorrência, separados por vírgula")
+    parser.add_argument('--sessions', type=int, default=200,
+                        help="Sessões simuladas por nível")
+    parser.add_argument('--documents', type=int, default=12,
+                        help="Tamanho do pool de documentos sintéticos")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-ocr', action='store_true',
+                        help="Não executar o Tesseract na etapa 3")
+    parser.add_argument('--data-dir',
+                        help="Diretório de dados (padrão: temporário)")
+    parser.add_argument('--output', help="Arquivo JSON do relatório")
+    parser.add_argument('--compare', nargs=2, metavar=('ANTES', 'DEPOIS'))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f1, open(args.compare[1]) as f2:
+            compare_reports(json.load(f1), json.load(f2))
+        return 0
+
+    # Nunca gravar os fãs simulados no diretório de dados real por acidente
+    storage.DATA_DIR = args.data_dir or tempfile.mkdtemp(prefix='kyf-load-')
+
+    pool = build_document_pool(args.documents, args.seed)
+    report = {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'with_ocr': not args.no_ocr,
+        'cpu_count': os.cpu_count(),
+        'levels': [],
+    }
+    for concurrency in (int(level) for level in args.levels.split(',')):
+        result = run_level(concurrency, args.sessions, pool, args.seed,
+                           not args.no_ocr)
+        report['levels'].append(result)
+        print(f"concorrência {concurrency:>4}: {result['sessions_per_s']} sessões/s, "
+              f"erros {result['error_rate']:.1%}, CPU {result['cpu_percent']}%, "
+              f"RSS {result['peak_rss_mb']} MB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Relatório gravado em {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,246 @@
+"""
+Benchmark of the document hot path: OCR + find_document_type +
+validate_document over a reproducible set of synthetic documents.
+
+    python -m benchmarks.ocr_benchmark                    # compare with baseline
+    python -m benchmarks.ocr_benchmark --update-baseline  # store a new baseline
+    python -m benchmarks.ocr_benchmark --mode full        # single full-text pass
+    python -m benchmarks.ocr_benchmark --lang por+eng     # no language detection
+
+The default mode is the two-pass field OCR used by the app (KYF_OCR_MODE);
+each mode keeps its own baseline file.
+
+The run exits with status 1 when throughput, p95 latency or accuracy
+regress past the tolerances stored in the baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.synthetic_documents import (EXPECTED_TYPES, font_name,
+                                            generate_dataset)
+from utils.document_ocr import process_document_fields, process_full_text
+from utils.document_validator import (find_document_type, to_grayscale,
+                                      validate_document)
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATHS = {
+    'full': os.path.join(BENCHMARK_DIR, 'baseline.json'),
+    'fields': os.path.join(BENCHMARK_DIR, 'baseline-fields.json'),
+}
+
+# Regressões toleradas em relação ao baseline
+DEFAULT_TOLERANCES = {
+    'throughput_drop': 0.20,
+    'p95_increase': 0.25,
+    'cpu_increase': 0.25,
+    'accuracy_drop': 0.02,
+}
+
+
+def _percentiles(values):
+    p50, p95, p99 = np.percentile(np.asarray(values) * 1000, [50, 95, 99])
+    return {'p50_ms': round(p50, 2), 'p95_ms': round(p95, 2),
+            'p99_ms': round(p99, 2)}
+
+
+def _cpu_seconds():
+    # Inclui os subprocessos do Tesseract já finalizados
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def _ocr(image, mode, lang):
+    gray = to_grayscale(image)
+    probe = None
+    if mode == 'fields':
+        # Como no app: a primeira passada serve de sondagem do idioma
+        probe = []
+        try:
+            text = process_document_fields(gray, probe)
+        except ValueError:
+            # MRZ recusada: o app recusa o documento sem o OCR completo
+            return ''
+        if text:
+            return text
+    return process_full_text(gray, lang, probe)
+
+
+def run_benchmark(count=30, seed=0, warmup=2, mode='fields', lang='auto'):
+    """
+    Run the OCR + validation pipeline over a synthetic dataset.
+
+    Args:
+        count (int): Number of documents
+        seed (int): Dataset seed
+        warmup (int): Documents processed before measuring
+        mode (str): 'fields' (two-pass, with full-text fallback) or 'full'
+        lang (str): Full-text OCR language: 'auto' (detected per document)
+            or a Tesseract language such as 'por+eng'
+
+    Returns:
+        dict: Throughput, per-stage latency percentiles, CPU time per
+            document, peak Python memory and accuracy figures
+    """
+    samples = generate_dataset(count + warmup, seed=seed)
+    for sample in samples[:warmup]:
+        _ocr(sample['image'], mode, lang)
+    samples = samples[warmup:]
+
+    latencies = {'ocr': [], 'find_type': [], 'validate': [], 'total': []}
+    type_hits = 0
+    validated = 0
+    full_matches = 0
+
+    tracemalloc.start()
+    cpu_before = _cpu_seconds()
+    started = time.perf_counter()
+    for sample in samples:
+        personal = {'name': sample['name'], 'cpf': sample['cpf']}
+
+        t0 = time.perf_counter()
+        text = _ocr(sample['image'], mode, lang)
+        t1 = time.perf_counter()
+        doc_type = find_document_type(text)
+        t2 = time.perf_counter()
+        is_valid, message = validate_document(text, personal)
+        t3 = time.perf_counter()
+
+        latencies['ocr'].append(t1 - t0)
+        latencies['find_type'].append(t2 - t1)
+        latencies['validate'].append(t3 - t2)
+        latencies['total'].append(t3 - t0)
+
+        type_hits += doc_type == EXPECTED_TYPES[sample['doc_type']]
+        validated += is_valid
+        full_matches += is_valid and 'CPF correspondem' in message
+    elapsed = time.perf_counter() - started
+    cpu_seconds = _cpu_seconds() - cpu_before
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    with_cpf = sum(1 for s in samples if s['doc_type'] != 'passport')
+    return {
+        'documents': len(samples),
+        'seed': seed,
+        'mode': mode,
+        'lang': lang,
+        'throughput_docs_per_s': round(len(samples) / elapsed, 3),
+        'cpu_s_per_doc': round(cpu_seconds / len(samples), 4),
+        'latency': {stage: _percentiles(values)
+                    for stage, values in latencies.items()},
+        # Memória do processo Python; o Tesseract roda em subprocesso
+        'peak_python_memory_mb': round(peak / (1024 * 1024), 2),
+        'accuracy': {
+            'document_type': round(type_hits / len(samples), 4),
+            'validated': round(validated / len(samples), 4),
+            'cpf_match': round(full_matches / with_cpf, 4) if with_cpf else None,
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'font': font_name(),
+        },
+    }
+
+
+def compare_with_baseline(result, baseline):
+    """
+    Compare a run against the stored baseline.
+
+    Args:
+        result (dict): Output of run_benchmark
+        baseline (dict): Stored baseline, including its tolerances
+
+    Returns:
+        list: Human-readable regression messages (empty when none)
+    """
+    tolerances = {**DEFAULT_TOLERANCES, **baseline.get('tolerances', {})}
+    reference = baseline['result']
+    regressions = []
+
+    min_throughput = reference['throughput_docs_per_s'] * (
+        1 - tolerances['throughput_drop'])
+    if result['throughput_docs_per_s'] < min_throughput:
+        regressions.append(
+            f"throughput {result['throughput_docs_per_s']} docs/s < {min_throughput:.3f}")
+
+    max_p95 = reference['latency']['total']['p95_ms'] * (
+        1 + tolerances['p95_increase'])
+    if result['latency']['total']['p95_ms'] > max_p95:
+        regressions.append(
+            f"total p95 {result['latency']['total']['p95_ms']} ms > {max_p95:.2f} ms")
+
+    if reference.get('cpu_s_per_doc'):
+        max_cpu = reference['cpu_s_per_doc'] * (1 + tolerances['cpu_increase'])
+        if result['cpu_s_per_doc'] > max_cpu:
+            regressions.append(
+                f"CPU {result['cpu_s_per_doc']} s/doc > {max_cpu:.4f} s/doc")
+
+    for metric, value in reference['accuracy'].items():
+        current = result['accuracy'].get(metric)
+        if value is None or current is None:
+            continue
+        if current < value - tolerances['accuracy_drop']:
+            regressions.append(f"accuracy.{metric} {current} < {value}")
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--mode', choices=sorted(BASELINE_PATHS), default='fields')
+    parser.add_argument('--lang', default='auto',
+                        help="Idioma do OCR completo: auto ou um idioma do Tesseract")
+    parser.add_argument('--baseline',
+                        help="Arquivo de baseline (padrão: um por modo)")
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args(argv)
+
+    if not shutil.which('tesseract'):
+        print("Tesseract não encontrado no PATH; o benchmark precisa do OCR real.")
+        return 2
+
+    result = run_benchmark(count=args.count, seed=args.seed, mode=args.mode,
+                           lang=args.lang)
+    print(json.dumps(result, indent=2))
+
+    baseline_path = args.baseline or BASELINE_PATHS[args.mode]
+    if args.update_baseline or not os.path.exists(baseline_path):
+        with open(baseline_path, 'w') as f:
+            json.dump({'tolerances': DEFAULT_TOLERANCES, 'result': result},
+                      f, indent=2)
+        print(f"Baseline gravado em {baseline_path}")
+        return 0
+
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if (baseline['result']['documents'], baseline['result']['seed']) != (
+            result['documents'], result['seed']):
+        print("Aviso: baseline gerado com outro --count/--seed.")
+
+    regressions = compare_with_baseline(result, baseline)
+    if regressions:
+        print("Regressões em relação ao baseline:")
+        for message in regressions:
+            print(f"  - {message}")
+        return 1
+    print("Sem regressões em relação ao baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,243 @@
+import random
+import unicodedata
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from utils.document_ocr import mrz_check_digit
+
+FIRST_NAMES = [
+    "Ana", "Bruno", "Carla", "Diego", "Eduarda", "Felipe", "Gabriela",
+    "Henrique", "Isabela", "João", "Larissa", "Marcos", "Natália", "Otávio",
+    "Paula", "Rafael", "Sofia", "Thiago", "Vitória", "Yuri"
+]
+LAST_NAMES = [
+    "Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves",
+    "Pereira", "Lima", "Gomes", "Costa", "Ribeiro", "Martins", "Carvalho"
+]
+
+DOCUMENT_TYPES = ('rg', 'cnh', 'passport')
+
+# Tipo retornado por find_document_type para cada documento gerado
+EXPECTED_TYPES = {
+    'rg': "National ID Card (RG)",
+    'cnh': "Driver's License (CNH)",
+    'passport': "Passport",
+}
+
+CARD_SIZE = (1280, 820)
+
+# Fontes TrueType com acentuação; a fonte embutida do Pillow não tem glifos
+# como Ú e Ç, então nesse caso o texto do cartão é gerado sem acentos
+FONT_CANDIDATES = ("DejaVuSans.ttf", "LiberationSans-Regular.ttf", "Arial.ttf")
+
+
+def _load_font(size):
+    for candidate in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(candidate, size), True
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size), False
+
+
+def _fold_accents(text):
+    text = text.replace('º', 'o')
+    normalized = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in normalized if not unicodedata.combining(c))
+
+
+def font_name():
+    """
+    Name of the font used to render cards, recorded with benchmark results.
+
+    Returns:
+        str: Font file name, or 'pillow-default'
+    """
+    font, _ = _load_font(12)
+    return getattr(font, 'path', None) or 'pillow-default'
+
+
+def random_cpf(rng):
+    """
+    Generate a random CPF with valid check digits.
+
+    Args:
+        rng (random.Random): Random generator
+
+    Returns:
+        str: CPF formatted as 000.000.000-00
+    """
+    digits = [rng.randint(0, 9) for _ in range(9)]
+    for length in (9, 10):
+        total = sum(d * (length + 1 - i) for i, d in enumerate(digits))
+        remainder = (total * 10) % 11
+        digits.append(0 if remainder == 10 else remainder)
+    cpf = ''.join(map(str, digits))
+    return f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}"
+
+
+def _mrz_name(name):
+    parts = name.upper().split()
+    surname, given = parts[-1], '<'.join(parts[:-1])
+    text = f"{surname}<<{given}"
+    for accented, plain in zip("ÁÂÃÉÊÍÓÔÕÚÇ", "AAAEEIOOOUC"):
+        text = text.replace(accented, plain)
+    return text
+
+
+def _mrz_second_line(passport_number, birth):
+    # Formato TD3 com dígitos verificadores válidos (ICAO 9303)
+    day, month, year = birth.split('/')
+    number = passport_number.ljust(9, '<')
+    birth_date = f"{year[2:]}{month}{day}"
+    expiry = "300101"
+    optional = '<' * 14
+    composite = (number + mrz_check_digit(number) + birth_date +
+                 mrz_check_digit(birth_date) + expiry +
+                 mrz_check_digit(expiry) + optional + mrz_check_digit(optional))
+    return (f"{number}{mrz_check_digit(number)}BRA{birth_date}"
+            f"{mrz_check_digit(birth_date)}M{expiry}{mrz_check_digit(expiry)}"
+            f"{optional}{mrz_check_digit(optional)}{mrz_check_digit(composite)}")
+
+
+def _card_lines(doc_type, name, cpf, rng):
+    birth = f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1970, 2006)}"
+    if doc_type == 'rg':
+        return [
+            "REPÚBLICA FEDERATIVA DO BRASIL",
+            "CARTEIRA DE IDENTIDADE",
+            f"REGISTRO GERAL {rng.randint(10, 99)}.{rng.randint(100, 999)}.{rng.randint(100, 999)}-{rng.randint(0, 9)}",
+            "NOME",
+            name.upper(),
+            f"DATA DE NASCIMENTO {birth}",
+            f"CPF {cpf}",
+        ], []
+    if doc_type == 'cnh':
+        return [
+            "REPÚBLICA FEDERATIVA DO BRASIL",
+            "CARTEIRA NACIONAL DE HABILITAÇÃO",
+            "NOME",
+            name.upper(),
+            f"CPF {cpf}   DATA NASCIMENTO {birth}",
+            f"Nº REGISTRO {rng.randint(10**10, 10**11 - 1)}   CAT. HAB. B",
+        ], []
+    passport_number = f"F{rng.randint(100000, 999999)}"
+    mrz = [
+        f"P<BRA{_mrz_name(name)}".ljust(44, '<')[:44],
+        _mrz_second_line(passport_number, birth),
+    ]
+    return [
+        "REPÚBLICA FEDERATIVA DO BRASIL",
+        "PASSAPORTE / PASSPORT",
+        f"Nº {passport_number}",
+        "NOME / NAME",
+        name.upper(),
+        f"DATA DE NASCIMENTO {birth}",
+    ], mrz
+
+
+def render_document(doc_type, name, cpf, rng):
+    """
+    Render a clean synthetic ID card.
+
+    Args:
+        doc_type (str): One of DOCUMENT_TYPES
+        name (str): Holder name
+        cpf (str): Holder CPF
+        rng (random.Random): Random generator
+
+    Returns:
+        numpy.ndarray: RGB image
+    """
+    background = tuple(rng.randint(215, 245) for _ in range(3))
+    card = Image.new('RGB', CARD_SIZE, background)
+    draw = ImageDraw.Draw(card)
+    font, has_accents = _load_font(34)
+    mono, _ = _load_font(30)
+
+    # Faixa de cabeçalho e "foto" do titular
+    draw.rectangle([0, 0, CARD_SIZE[0], 24], fill=(40, 90, 60))
+    draw.rectangle([60, 180, 300, 480], fill=(170, 170, 170))
+
+    lines, mrz = _card_lines(doc_type, name, cpf, rng)
+    y = 50
+    for line in lines:
+        if not has_accents:
+            line = _fold_accents(line)
+        draw.text((340, y), line, fill=(20, 20, 20), font=font)
+        y += 62
+    y = CARD_SIZE[1] - 120
+    for line in mrz:
+        draw.text((40, y), line, fill=(10, 10, 10), font=mono)
+        y += 46
+
+    return np.asarray(card)
+
+
+def degrade(image, rng, noise=8.0, blur=1.0, max_rotation=4.0,
+            jpeg_quality=70):
+    """
+    Apply camera-like degradations: rotation, blur, sensor noise and JPEG
+    compression artifacts.
+
+    Args:
+        image (numpy.ndarray): RGB image
+        rng (random.Random): Random generator
+        noise (float): Standard deviation of the Gaussian noise
+        blur (float): Maximum Gaussian blur sigma
+        max_rotation (float): Maximum rotation in degrees (either direction)
+        jpeg_quality (int): JPEG quality used for the final re-encode
+
+    Returns:
+        numpy.ndarray: Degraded RGB image
+    """
+    height, width = image.shape[:2]
+    angle = rng.uniform(-max_rotation, max_rotation)
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    image = cv2.warpAffine(image, matrix, (width, height),
+                           borderMode=cv2.BORDER_REPLICATE)
+
+    sigma = rng.uniform(0, blur)
+    if sigma > 0.1:
+        image = cv2.GaussianBlur(image, (0, 0), sigma)
+
+    np_rng = np.random.default_rng(rng.randint(0, 2**32 - 1))
+    noisy = image.astype(np.float32) + np_rng.normal(0, noise, image.shape)
+    image = np.clip(noisy, 0, 255).astype(np.uint8)
+
+    ok, encoded = cv2.imencode('.jpg', image[:, :, ::-1],
+                               [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+    return cv2.imdecode(encoded, cv2.IMREAD_COLOR)[:, :, ::-1].copy()
+
+
+def generate_dataset(count, seed=0, **degrade_options):
+    """
+    Generate a reproducible set of degraded synthetic documents.
+
+    Args:
+        count (int): Number of documents
+        seed (int): Random seed; the same seed always yields the same set
+        **degrade_options: Passed to degrade()
+
+    Returns:
+        list: Dicts with 'image', 'doc_type', 'name' and 'cpf'
+    """
+    rng = random.Random(seed)
+    samples = []
+    for i in range(count):
+        doc_type = DOCUMENT_TYPES[i % len(DOCUMENT_TYPES)]
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}"
+        cpf = random_cpf(rng)
+        image = degrade(render_document(doc_type, name, cpf, rng), rng,
+                        **degrade_options)
+        if not _load_font(12)[1]:
+            name = _fold_accents(name)
+        samples.append({
+            'image': image,
+            'doc_type': doc_type,
+            'name': name,
+            'cpf': cpf,
+        })
+    return samples
@@ -0,0 +1,97 @@
+import hmac
+import os
+
+import streamlit as st
+
+from utils.document_ocr import language_stats
+from utils.event_catalog import attendance_counts
+from utils.instrumentation import latency_summary, counters, reset
+from utils.session_memory import get_registry
+from utils.tenants import current_tenant_id, tenant_ids, use_tenant
+
+st.set_page_config(page_title="Administração - Conheça Seu Fã",
+                   page_icon="📈",
+                   layout="wide")
+
+st.title("Administração")
+
+# A página só é liberada quando KYF_ADMIN_PASSWORD está definida no servidor
+admin_password = os.environ.get('KYF_ADMIN_PASSWORD')
+if not admin_password:
+    st.info(
+        "Página de administração desativada. Defina KYF_ADMIN_PASSWORD no servidor para habilitá-la."
+    )
+    st.stop()
+
+if not st.session_state.get('admin_authenticated'):
+    password = st.text_input("Senha de administração", type="password")
+    # Comparação em tempo constante: o tempo da resposta não revela a senha
+    if password and hmac.compare_digest(password.encode(), admin_password.encode()):
+        st.session_state.admin_authenticated = True
+        st.rerun()
+    elif password:
+        st.error("Senha incorreta.")
+    st.stop()
+
+st.header("Latência por Etapa")
+st.caption(
+    "Amostras deste processo do servidor desde a última inicialização (ou limpeza)."
+)
+
+summary = latency_summary()
+
+if summary.empty:
+    st.info("Nenhuma amostra registrada ainda.")
+else:
+    app_steps = summary[summary['stage'].str.startswith('app.')]
+    pipeline = summary[~summary['stage'].str.startswith('app.')]
+
+    st.subheader("Etapas do App")
+    st.dataframe(app_steps, hide_index=True, use_container_width=True)
+
+    st.subheader("Pipeline (OCR, Validação, Análise e Gráficos)")
+    st.dataframe(pipeline, hide_index=True, use_container_width=True)
+
+stats = counters()
+if stats:
+    st.subheader("Contadores")
+    st.dataframe([{'counter': name, 'value': value}
+                  for name, value in sorted(stats.items())],
+                 hide_index=True,
+                 use_container_width=True)
+
+ocr_languages = language_stats()
+if ocr_languages:
+    # Idioma escolhido por documento no OCR completo; a economia é líquida
+    # (amostra pareada com por+eng, menos releituras e sondagem)
+    st.subheader("OCR por Idioma")
+    st.dataframe(ocr_languages, hide_index=True, use_container_width=True)
+
+memory = get_registry().stats()
+if memory['sessions']:
+    st.subheader("Memória das Sessões")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Sessões", memory['sessions'])
+    col2.metric("Total", f"{memory['total_bytes'] / 2**20:.1f} MB")
+    col3.metric("Maior", f"{memory['max_bytes'] / 2**20:.1f} MB")
+    col4.metric("Média", f"{memory['mean_bytes'] / 2**20:.2f} MB")
+
+# Os dados de cada clube ficam separados (utils/tenants.py)
+clubs = tenant_ids()
+club = st.selectbox("Clube", clubs,
+                    index=clubs.index(current_tenant_id())
+                    if current_tenant_id() in clubs else 0)
+with use_tenant(club):
+    attendance = attendance_counts()
+if attendance:
+    st.subheader("Presença em Eventos")
+    st.dataframe(attendance, hide_index=True, use_container_width=True)
+
+col1, col2 = st.columns(2)
+with col1:
+    if st.button("Atualizar"):
+        st.rerun()
+with col2:
+    if st.button("Limpar Amostras"):
+        reset()
+        st.rerun()
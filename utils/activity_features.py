@@ -0,0 +1,373 @@
+import json
+from datetime import date, datetime
+
+import numpy as np
+
+from utils.instrumentation import increment, timed
+from utils.storage import connect
+
+# Semanas de histórico usadas nas características (janelas e sequências);
+# as médias móveis usam as últimas 4 e 12 semanas
+HISTORY_WEEKS = 26
+ROLLING_WINDOWS = (4, 12)
+
+# Suavização exponencial dupla (Holt): nível e tendência
+HOLT_ALPHA = 0.5
+HOLT_BETA = 0.3
+FORECAST_WEEKS = 4
+
+# Fã em risco: previsão média abaixo desta fração da média de 12 semanas,
+# ou este número de semanas seguidas sem atividade
+AT_RISK_RATIO = 0.6
+AT_RISK_INACTIVE_WEEKS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS activity_buckets (
+    fan_id TEXT NOT NULL,
+    week INTEGER NOT NULL,
+    engagement REAL NOT NULL,
+    PRIMARY KEY (fan_id, week)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS activity_fans (
+    fan_id TEXT PRIMARY KEY,
+    first_week INTEGER NOT NULL,
+    last_week INTEGER NOT NULL,
+    state_week INTEGER,
+    level REAL,
+    trend REAL,
+    features TEXT,
+    updated_at TEXT
+) WITHOUT ROWID;
+"""
+
+
+def _db():
+    conn = connect('activity')
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def week_index(dates):
+    """
+    Monday-based week number of each date.
+
+    Args:
+        dates (list): ISO dates (YYYY-MM-DD)
+
+    Returns:
+        numpy.ndarray: Weeks since the week of 1970-01-01
+    """
+    days = np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+    # 1970-01-01 foi uma quinta-feira
+    return (days + 3) // 7
+
+
+def week_start(week):
+    """
+    Monday of a week number, as an ISO date.
+
+    Args:
+        week (int): Week from week_index
+
+    Returns:
+        str: YYYY-MM-DD
+    """
+    return str(np.datetime64(int(week) * 7 - 3, 'D'))
+
+
+def weekly_buckets(activity):
+    """
+    Sum an activity series into weekly engagement buckets.
+
+    Args:
+        activity (list): Dicts with date, posts and interactions
+
+    Returns:
+        tuple: (weeks, engagement) arrays, weeks increasing and unique
+    """
+    if not activity:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    weeks = week_index([point['date'] for point in activity])
+    values = np.array([point.get('posts', 0) + point.get('interactions', 0)
+                       for point in activity], dtype=np.float64)
+    unique, inverse = np.unique(weeks, return_inverse=True)
+    return unique, np.bincount(inverse, weights=values, minlength=len(unique))
+
+
+def record_activity(fan_id, activity, today=None):
+    """
+    Store (or overwrite) a fan's weekly buckets.
+
+    Only complete weeks are stored: the week containing `today` is still
+    in progress and would read as a drop in engagement, so it is left out
+    until a later submission covers it. The submitted history replaces the
+    stored buckets over the weeks it spans, including weeks it no longer
+    has; the fan's features become stale and are recomputed by
+    update_features.
+
+    Args:
+        fan_id (str): Fan identifier
+        activity (list): Dicts with date, posts and interactions
+        today (str): ISO date of the submission (default: today)
+
+    Returns:
+        int: Buckets written
+    """
+    weeks, values = weekly_buckets(activity)
+    current = week_index([today or date.today().isoformat()])[0]
+    complete = weeks < current
+    weeks, values = weeks[complete], values[complete]
+    if not len(weeks):
+        return 0
+    conn = _db()
+    with conn:
+        conn.execute('BEGIN')
+        # Semanas do intervalo reenviado que sumiram do histórico
+        conn.execute(
+            'DELETE FROM activity_buckets WHERE fan_id = ? AND week BETWEEN ? AND ?',
+            (fan_id, int(weeks[0]), int(weeks[-1])))
+        conn.executemany(
+            'INSERT INTO activity_buckets (fan_id, week, engagement) '
+            'VALUES (?, ?, ?)',
+            [(fan_id, int(week), float(value)) for week, value in zip(weeks, values)])
+        conn.execute(
+            'INSERT INTO activity_fans (fan_id, first_week, last_week) VALUES (?, ?, ?) '
+            'ON CONFLICT (fan_id) DO UPDATE SET '
+            'first_week = MIN(first_week, excluded.first_week), '
+            'last_week = MAX(last_week, excluded.last_week)',
+            (fan_id, int(weeks[0]), int(weeks[-1])))
+        # Um balde reescrito antes do estado do Holt invalida o estado
+        conn.execute(
+            'UPDATE activity_fans SET state_week = NULL, level = NULL, trend = NULL '
+            'WHERE fan_id = ? AND state_week >= ?', (fan_id, int(weeks[0])))
+    return len(weeks)
+
+
+def holt(matrix, level, trend, alpha=HOLT_ALPHA, beta=HOLT_BETA):
+    """
+    Holt's linear smoothing over every fan at once.
+
+    The recursion runs week by week; each step updates all fans with a
+    value in that column. Fans without a level yet start at their first
+    value with zero trend.
+
+    Args:
+        matrix (numpy.ndarray): (fans x weeks), NaN where a fan has no value
+        level (numpy.ndarray): (fans,) level before the first column (NaN
+            for fans not started)
+        trend (numpy.ndarray): (fans,) trend before the first column
+        alpha (float): Level smoothing
+        beta (float): Trend smoothing
+
+    Returns:
+        tuple: (level, trend) after the last column
+    """
+    level, trend = level.copy(), trend.copy()
+    for column in matrix.T:
+        present = ~np.isnan(column)
+        fresh = present & np.isnan(level)
+        level[fresh], trend[fresh] = column[fresh], 0.0
+        update = present & ~fresh
+        previous = level[update]
+        level[update] = (alpha * column[update] +
+                         (1 - alpha) * (previous + trend[update]))
+        trend[update] = (beta * (level[update] - previous) +
+                         (1 - beta) * trend[update])
+    return level, trend
+
+
+def _trailing_run(condition):
+    # Quantas colunas seguidas, a partir da última, satisfazem a condição
+    reversed_ = condition[:, ::-1]
+    broken = ~reversed_
+    return np.where(broken.any(axis=1), broken.argmax(axis=1), condition.shape[1])
+
+
+def trend_features(matrix, level, trend):
+    """
+    Trend features of the last column of each fan's weekly series.
+
+    Args:
+        matrix (numpy.ndarray): (fans x weeks) engagement, right-aligned on
+            each fan's last week, NaN before the fan's first week
+        level (numpy.ndarray): (fans,) Holt level at the last week
+        trend (numpy.ndarray): (fans,) Holt trend at the last week
+
+    Returns:
+        dict: Feature name to a (fans,) array, plus 'forecast' as
+            (fans x FORECAST_WEEKS)
+    """
+    fans, weeks = matrix.shape
+    present = ~np.isnan(matrix)
+    values = np.where(present, matrix, 0.0)
+    # Somas acumuladas: cada janela móvel é uma diferença de duas colunas
+    sums = np.concatenate([np.zeros((fans, 1)), values.cumsum(axis=1)], axis=1)
+    counts = np.concatenate([np.zeros((fans, 1)), present.cumsum(axis=1)], axis=1)
+
+    def window_mean(width, offset=0):
+        end = weeks - offset
+        start = max(end - width, 0)
+        total = sums[:, end] - sums[:, start]
+        n = counts[:, end] - counts[:, start]
+        return np.divide(total, n, out=np.zeros(fans), where=n > 0)
+
+    features = {f"mean_{width}w": window_mean(width) for width in ROLLING_WINDOWS}
+    last = values[:, -1]
+    previous = values[:, -2] if weeks > 1 else np.zeros(fans)
+    has_previous = present[:, -2] if weeks > 1 else np.zeros(fans, dtype=bool)
+    features['wow_growth'] = np.where(
+        has_previous, (last - previous) / np.maximum(previous, 1.0), 0.0)
+    prior = window_mean(4, offset=4)
+    features['growth_4w'] = np.where(
+        counts[:, -1] > 4, (features['mean_4w'] - prior) / np.maximum(prior, 1.0), 0.0)
+    features['active_streak'] = _trailing_run(present & (values > 0))
+    features['inactive_streak'] = _trailing_run(present & (values == 0))
+
+    horizon = np.arange(1, FORECAST_WEEKS + 1)
+    forecast = np.maximum(level[:, None] + trend[:, None] * horizon, 0.0)
+    features['forecast'] = np.nan_to_num(forecast)
+    features['at_risk'] = (
+        (forecast.mean(axis=1) < AT_RISK_RATIO * features['mean_12w']) |
+        (features['inactive_streak'] >= AT_RISK_INACTIVE_WEEKS))
+    return features
+
+
+def _feature_rows(features, index):
+    return {
+        **{f"mean_{width}w": round(float(features[f"mean_{width}w"][index]), 2)
+           for width in ROLLING_WINDOWS},
+        'wow_growth': round(float(features['wow_growth'][index]), 3),
+        'growth_4w': round(float(features['growth_4w'][index]), 3),
+        'active_streak': int(features['active_streak'][index]),
+        'inactive_streak': int(features['inactive_streak'][index]),
+        'forecast': np.round(features['forecast'][index], 1).tolist(),
+        'at_risk': bool(features['at_risk'][index]),
+    }
+
+
+def _load_matrix(conn, fans):
+    # Matriz (fãs x semanas) alinhada à direita na última semana de cada fã:
+    # NaN antes da primeira semana do fã, 0 nas semanas sem balde
+    last = np.array([fan[1] for fan in fans], dtype=np.int64)
+    first = np.array([fan[2] for fan in fans], dtype=np.int64)
+    state = np.array([fan[3] if fan[3] is not None else -1 for fan in fans],
+                     dtype=np.int64)
+    start = np.maximum(np.minimum(last - HISTORY_WEEKS + 1,
+                                  np.where(state >= 0, state + 1, first)), first)
+    width = int((last - start).max()) + 1
+    base = last - width + 1
+
+    row_of = {fan[0]: row for row, fan in enumerate(fans)}
+    rows, weeks, values = [], [], []
+    fan_ids = list(row_of)
+    for chunk_start in range(0, len(fan_ids), 500):
+        chunk = fan_ids[chunk_start:chunk_start + 500]
+        placeholders = ', '.join('?' * len(chunk))
+        for fan_id, week, value in conn.execute(
+                f'SELECT fan_id, week, engagement FROM activity_buckets '
+                f'WHERE fan_id IN ({placeholders}) AND week >= ?',
+                (*chunk, int(start.min()))):
+            rows.append(row_of[fan_id])
+            weeks.append(week)
+            values.append(value)
+    rows, weeks = np.array(rows, dtype=np.int64), np.array(weeks, dtype=np.int64)
+    columns = weeks - base[rows]
+
+    matrix = np.zeros((len(fans), width))
+    keep = columns >= 0
+    matrix[rows[keep], columns[keep]] = np.array(values)[keep]
+    column_weeks = base[:, None] + np.arange(width)
+    matrix[column_weeks < start[:, None]] = np.nan
+    return matrix, column_weeks, state
+
+
+@timed('activity.update_features')
+def update_features(fan_ids=None, batch_size=50000):
+    """
+    Recompute the trend features of fans with new weekly buckets.
+
+    Only fans whose last bucket is past their last computed week are
+    processed. Each batch becomes one (fans x weeks) matrix: rolling means,
+    growth and streaks are column operations over the last HISTORY_WEEKS,
+    and Holt's recursion continues from the stored level and trend over
+    the new weeks only.
+
+    Args:
+        fan_ids (list): Restrict to these fans (default: every stale fan)
+        batch_size (int): Fans per matrix
+
+    Returns:
+        int: Fans updated
+    """
+    conn = _db()
+    query = ('SELECT fan_id, last_week, first_week, state_week, level, trend '
+             'FROM activity_fans WHERE state_week IS NULL OR state_week < last_week')
+    if fan_ids is None:
+        stale = conn.execute(query).fetchall()
+    else:
+        stale = []
+        fan_ids = list(fan_ids)
+        for start in range(0, len(fan_ids), 500):
+            chunk = fan_ids[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            stale.extend(conn.execute(
+                f'{query} AND fan_id IN ({placeholders})', chunk).fetchall())
+
+    now = datetime.now().isoformat()
+    for start in range(0, len(stale), batch_size):
+        batch = stale[start:start + batch_size]
+        matrix, column_weeks, state = _load_matrix(conn, batch)
+        level = np.array([fan[4] if fan[4] is not None else np.nan for fan in batch])
+        trend = np.array([fan[5] if fan[5] is not None else 0.0 for fan in batch])
+        # O Holt só percorre as semanas posteriores ao estado guardado
+        new_weeks = np.where(column_weeks > state[:, None], matrix, np.nan)
+        level, trend = holt(new_weeks, level, trend)
+        features = trend_features(matrix[:, -HISTORY_WEEKS:], level, trend)
+
+        with conn:
+            conn.execute('BEGIN')
+            conn.executemany(
+                'UPDATE activity_fans SET state_week = ?, level = ?, trend = ?, '
+                'features = ?, updated_at = ? WHERE fan_id = ?',
+                [(fan[1], float(level[i]), float(trend[i]),
+                  json.dumps({'week': week_start(fan[1]), **_feature_rows(features, i)}),
+                  now, fan[0])
+                 for i, fan in enumerate(batch)])
+    increment('activity.fans_updated', len(stale))
+    return len(stale)
+
+
+def load_features(fan_id):
+    """
+    Read a fan's stored trend features.
+
+    Args:
+        fan_id (str): Fan identifier
+
+    Returns:
+        dict: Features (week, mean_4w, mean_12w, wow_growth, growth_4w,
+            active_streak, inactive_streak, forecast, at_risk), or None
+    """
+    row = _db().execute('SELECT features FROM activity_fans WHERE fan_id = ?',
+                        (fan_id,)).fetchone()
+    return json.loads(row[0]) if row and row[0] else None
+
+
+def at_risk_fans():
+    """
+    Fans whose engagement is forecast to drop, for segmentation.
+
+    Returns:
+        list: (fan_id, features) pairs, longest inactive streak first
+    """
+    rows = [(fan_id, json.loads(features)) for fan_id, features in _db().execute(
+        'SELECT fan_id, features FROM activity_fans WHERE features IS NOT NULL')]
+    return sorted(((fan_id, features) for fan_id, features in rows
+                   if features['at_risk']),
+                  key=lambda item: (-item[1]['inactive_streak'], item[1]['mean_4w']))
+
+
+if __name__ == '__main__':
+    # Job em lote (por exemplo, diário): python -m utils.activity_features
+    print(f"{update_features()} fãs com características de atividade atualizadas.")
+    print(f"{len(at_risk_fans())} fãs em risco de perder o interesse.")
@@ -0,0 +1,199 @@
+import hashlib
+import html
+import json
+import os
+from functools import lru_cache
+
+from PIL import Image
+
+# Diretórios do pipeline de assets. As imagens-mestre ficam em assets/ e as
+# variantes redimensionadas em static/img/, servidas pelo Streamlit em
+# /app/static/ (server.enableStaticServing). As duas pastas são versionadas:
+# o app não acessa nenhuma CDN nem depende de rede.
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MASTERS_DIR = os.path.join(ROOT_DIR, 'assets')
+VARIANTS_DIR = os.path.join(ROOT_DIR, 'static', 'img')
+MANIFEST_PATH = os.path.join(VARIANTS_DIR, 'manifest.json')
+STATIC_URL = 'app/static/img'
+
+# Imagens exibidas pelo app. `widths` são as larguras (em px CSS) realmente
+# usadas no layout; cada uma também é gerada em 2x para telas retina.
+ASSETS = {
+    'kyf-logo': {
+        'master': 'logo.png',
+        'widths': [80],
+        'alpha': True,
+    },
+    'fans-celebrating': {
+        'master': 'fans-celebrating.jpg',
+        'widths': [400, 600],
+    },
+    'gaming-setup': {
+        'master': 'gaming-setup.jpg',
+        'widths': [200, 300],
+    },
+    'community-1': {
+        'master': 'community-1.jpg',
+        'widths': [200, 300],
+    },
+    'community-2': {
+        'master': 'community-2.jpg',
+        'widths': [200, 300],
+    },
+    'community-3': {
+        'master': 'community-3.jpg',
+        'widths': [200, 300],
+    },
+    'community-4': {
+        'master': 'community-4.jpg',
+        'widths': [200, 300],
+    },
+    'app-icon': {
+        'master': os.path.join('..', 'generated-icon.png'),
+        'widths': [32, 64],
+        'alpha': True,
+    },
+}
+
+
+def _fingerprint(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:10]
+
+
+def build_variants():
+    """
+    Gera as variantes WebP (e o fallback JPEG/PNG) de cada imagem-mestre
+    nas larguras exibidas, e grava o manifesto com o fingerprint de cada
+    arquivo.
+
+    Returns:
+        dict: O manifesto gerado
+    """
+    os.makedirs(VARIANTS_DIR, exist_ok=True)
+    manifest = {}
+
+    for name, spec in ASSETS.items():
+        master_path = os.path.normpath(
+            os.path.join(MASTERS_DIR, spec['master']))
+        if not os.path.exists(master_path):
+            continue
+
+        with Image.open(master_path) as master:
+            master.load()
+            alpha = spec.get('alpha', False)
+            master = master.convert('RGBA' if alpha else 'RGB')
+            fallback_ext = 'png' if alpha else 'jpg'
+
+            variants = []
+            widths = sorted({w * density for w in spec['widths']
+                             for density in (1, 2)})
+            for width in widths:
+                width = min(width, master.width)
+                height = round(master.height * width / master.width)
+                resized = master.resize((width, height), Image.LANCZOS)
+
+                entry = {'width': width, 'height': height}
+                for ext in ('webp', fallback_ext):
+                    filename = f"{name}-{width}w.{ext}"
+                    path = os.path.join(VARIANTS_DIR, filename)
+                    if ext == 'webp':
+                        resized.save(path, 'WEBP', quality=80, method=6)
+                    elif ext == 'jpg':
+                        resized.save(path, 'JPEG', quality=82,
+                                     optimize=True, progressive=True)
+                    else:
+                        resized.save(path, 'PNG', optimize=True)
+                    entry[ext] = f"{filename}?v={_fingerprint(path)}"
+                variants.append(entry)
+
+            manifest[name] = {'fallback': fallback_ext, 'variants': variants}
+
+    with open(MANIFEST_PATH, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    load_manifest.cache_clear()
+    return manifest
+
+
+@lru_cache(maxsize=1)
+def load_manifest():
+    """
+    Carrega o manifesto das variantes geradas.
+
+    Returns:
+        dict: Manifesto de assets, ou vazio se o pipeline ainda não rodou
+    """
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def asset_file(name, width):
+    """
+    Retorna o caminho local da menor variante que cobre a largura pedida.
+
+    Args:
+        name (str): Nome do asset em ASSETS
+        width (int): Largura de exibição em px
+
+    Returns:
+        str or None: Caminho do arquivo, ou None se o asset não foi gerado
+    """
+    entry = load_manifest().get(name)
+    if not entry:
+        return None
+    variants = entry['variants']
+    chosen = next((v for v in variants if v['width'] >= width), variants[-1])
+    filename = chosen[entry['fallback']].split('?')[0]
+    return os.path.join(VARIANTS_DIR, filename)
+
+
+def responsive_image_html(name, alt='', sizes='100vw', width=None):
+    """
+    Monta um elemento <picture> com srcset WebP e fallback para as
+    variantes do asset.
+
+    As URLs levam o fingerprint do conteúdo em `?v=`, o que faz o servidor
+    estático do Streamlit (tornado) responder com cache de longa duração.
+
+    Args:
+        name (str): Nome do asset em ASSETS
+        alt (str): Texto alternativo
+        sizes (str): Atributo `sizes` do elemento <img>
+        width (int, optional): Largura fixa de exibição em px
+
+    Returns:
+        str or None: HTML da imagem, ou None se o asset não foi gerado
+    """
+    entry = load_manifest().get(name)
+    if not entry:
+        return None
+
+    variants = entry['variants']
+    webp_srcset = ', '.join(f"{STATIC_URL}/{v['webp']} {v['width']}w"
+                            for v in variants)
+    fallback_srcset = ', '.join(
+        f"{STATIC_URL}/{v[entry['fallback']]} {v['width']}w" for v in variants)
+    fallback_src = f"{STATIC_URL}/{variants[0][entry['fallback']]}"
+
+    alt = html.escape(alt, quote=True)
+    if width:
+        sizes = f"{width}px"
+        style = f"width:{width}px;height:auto;"
+    else:
+        style = "width:100%;height:auto;"
+
+    return (f'<picture>'
+            f'<source type="image/webp" srcset="{webp_srcset}" sizes="{sizes}">'
+            f'<img src="{fallback_src}" srcset="{fallback_srcset}" '
+            f'sizes="{sizes}" alt="{alt}" loading="lazy" decoding="async" '
+            f'style="{style}border-radius:4px;">'
+            f'</picture>')
+
+
+if __name__ == '__main__':
+    # python -m utils.assets
+    generated = build_variants()
+    print(f"Variantes geradas para: {', '.join(sorted(generated))}")
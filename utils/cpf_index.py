@@ -0,0 +1,95 @@
+from datetime import datetime
+
+from utils.document_validator import normalize_cpf
+from utils.pii_crypto import blind_index
+from utils.storage import connect
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cpf_index (
+    cpf_hash BLOB PRIMARY KEY,
+    fan_id TEXT NOT NULL,
+    created_at TEXT NOT NULL
+) WITHOUT ROWID
+"""
+
+
+def _db():
+    conn = connect('cpf_index')
+    conn.execute(_SCHEMA)
+    return conn
+
+
+def cpf_hash(cpf):
+    """
+    Calcula o hash do CPF usado como chave do índice.
+    
+    É o índice cego do campo 'cpf' (HMAC-SHA256 com chave secreta local):
+    o índice não guarda CPFs em texto puro, e o hash não pode ser revertido
+    por força bruta sem a chave.
+    
+    Args:
+        cpf (str): CPF formatado ou apenas dígitos
+        
+    Returns:
+        bytes: Hash de 32 bytes
+    """
+    return blind_index('cpf', normalize_cpf(cpf))
+
+
+def find_fan_by_cpf(cpf):
+    """
+    Procura o fã que registrou o CPF.
+    
+    Args:
+        cpf (str): CPF formatado ou apenas dígitos
+        
+    Returns:
+        str or None: fan_id do dono do CPF, ou None se não registrado
+    """
+    row = _db().execute('SELECT fan_id FROM cpf_index WHERE cpf_hash = ?',
+                        (cpf_hash(cpf),)).fetchone()
+    return row[0] if row else None
+
+
+def register_cpf(cpf, fan_id, previous_cpf=None):
+    """
+    Registra o CPF para o fã, detectando cadastros duplicados.
+    
+    A consulta é feita pela chave primária (o hash), então o custo não
+    cresce de forma perceptível com o número de fãs cadastrados.
+    
+    Args:
+        cpf (str): CPF informado no cadastro
+        fan_id (str): Identificador do perfil de fã
+        previous_cpf (str, optional): CPF registrado antes pelo mesmo fã,
+            liberado se for diferente do novo
+        
+    Returns:
+        tuple: (is_registered, owner_fan_id) - Se o CPF ficou com este fã e
+            quem é o dono do CPF
+    """
+    conn = _db()
+    digest = cpf_hash(cpf)
+    conn.execute(
+        'INSERT OR IGNORE INTO cpf_index (cpf_hash, fan_id, created_at) VALUES (?, ?, ?)',
+        (digest, fan_id, datetime.now().isoformat()))
+    owner = conn.execute('SELECT fan_id FROM cpf_index WHERE cpf_hash = ?',
+                         (digest,)).fetchone()[0]
+    if owner != fan_id:
+        return False, owner
+
+    if previous_cpf and normalize_cpf(previous_cpf) != normalize_cpf(cpf):
+        release_cpf(previous_cpf, fan_id)
+    return True, owner
+
+
+def release_cpf(cpf, fan_id):
+    """
+    Libera um CPF registrado pelo fã.
+    
+    Args:
+        cpf (str): CPF a liberar
+        fan_id (str): Fã que registrou o CPF; outros registros não são afetados
+    """
+    _db().execute('DELETE FROM cpf_index WHERE cpf_hash = ? AND fan_id = ?',
+                  (cpf_hash(cpf), fan_id))
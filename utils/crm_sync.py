@@ -0,0 +1,285 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import urllib3
+from urllib3.util import Retry
+
+from utils.instrumentation import increment, timed
+from utils.profile_log import ChangeFeed
+from utils.profile_store import get_backend, load_profiles
+from utils.scoring import current_relevance
+
+# Endpoint de importação em lote do CRM e token enviado como Bearer
+CRM_URL = os.environ.get('KYF_CRM_URL', 'http://localhost:8765/profiles')
+CRM_TOKEN = os.environ.get('KYF_CRM_TOKEN', '')
+
+# Consumidor do log de perfis (cursor em profile_log/cursors/crm.json)
+FEED_NAME = 'crm'
+
+# Alterações lidas do log por rodada e perfis por requisição ao CRM
+CHANGES_PER_POLL = 2000
+PROFILES_PER_REQUEST = 200
+
+# Tentativas por requisição; a espera dobra a cada tentativa (0,5 s, 1 s, ...)
+# e o Retry-After do CRM é respeitado
+RETRIES = 5
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+
+# Campos das redes sociais que não vão para o CRM (análise e histórico)
+_SOCIAL_SKIP = ('analysis', 'relevance')
+
+
+class CRMClient:
+    """
+    Cliente HTTP do CRM com conexões reaproveitadas e novas tentativas.
+
+    Todas as requisições passam pelo mesmo pool do urllib3; erros de rede
+    e os status de RETRY_STATUSES são repetidos com espera exponencial.
+    """
+
+    def __init__(self, url=CRM_URL, token=CRM_TOKEN, retries=RETRIES,
+                 backoff_factor=BACKOFF_FACTOR, timeout=30):
+        self.url = url
+        self._headers = {'Content-Type': 'application/json'}
+        if token:
+            self._headers['Authorization'] = f"Bearer {token}"
+        self._timeout = timeout
+        self._pool = urllib3.PoolManager(
+            maxsize=4,
+            retries=Retry(total=retries, backoff_factor=backoff_factor,
+                          status_forcelist=RETRY_STATUSES,
+                          allowed_methods=frozenset({'POST'}),
+                          respect_retry_after_header=True,
+                          raise_on_status=False))
+
+    def send(self, idempotency_key, profiles):
+        """
+        Envia um lote de perfis.
+
+        O CRM ignora um lote cuja chave já recebeu, então reenviar depois de
+        uma falha (ou de um reinício) não duplica registros.
+
+        Args:
+            idempotency_key (str): Chave do lote
+            profiles (list): Registros de crm_record
+
+        Raises:
+            RuntimeError: Se o CRM não aceitou o lote depois das tentativas
+        """
+        body = json.dumps({'batch_id': idempotency_key, 'profiles': profiles},
+                          separators=(',', ':')).encode()
+        try:
+            response = self._pool.request(
+                'POST', self.url, body=body, timeout=self._timeout,
+                headers={**self._headers, 'Idempotency-Key': idempotency_key})
+        except urllib3.exceptions.HTTPError as e:
+            raise RuntimeError(f"CRM indisponível: {e}") from e
+        if response.status >= 300:
+            raise RuntimeError(
+                f"CRM recusou o lote {idempotency_key}: HTTP {response.status}")
+
+    def close(self):
+        self._pool.clear()
+
+
+def crm_record(fan_id, profile, updated_at):
+    """
+    Monta o registro de um fã enviado ao CRM.
+
+    Args:
+        fan_id (str): Identificador do fã
+        profile (dict): Perfil completo, com os campos decifrados
+        updated_at (str): Data da última gravação do perfil
+
+    Returns:
+        dict: Dados pessoais, interesses, perfis sociais e pontuações
+    """
+    social = {**profile['social_media'], **profile['esports_profiles']}
+    relevance = profile['esports_profiles'].get('relevance') or {}
+    return {
+        'fan_id': fan_id,
+        'updated_at': updated_at,
+        'verified': bool(profile['documents'].get('id_validated')),
+        'personal': profile['personal'],
+        'interests': profile['interests'],
+        'social_profiles': {key: value for key, value in social.items()
+                            if key not in _SOCIAL_SKIP and value},
+        'engagement_score': (profile['social_media'].get('analysis') or {}).get(
+            'engagement_score'),
+        'relevance_score': current_relevance(relevance)[0] if relevance else None,
+    }
+
+
+def _batch_key(records):
+    # Derivada do conteúdo do lote (fãs, datas e dados): reenviar o mesmo lote
+    # repete a chave, e um lote diferente nunca reaproveita uma chave aceita
+    payload = json.dumps(records, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(f"{FEED_NAME}:{payload}".encode()).hexdigest()[:32]
+
+
+@timed('crm_sync.poll')
+def sync_once(client, feed, verified_only=True,
+              changes_per_poll=CHANGES_PER_POLL,
+              profiles_per_request=PROFILES_PER_REQUEST):
+    """
+    Envia ao CRM os perfis alterados desde o cursor e avança o cursor.
+
+    As alterações de um mesmo fã na rodada viram um único registro com o
+    perfil atual. O cursor só avança depois que todos os lotes da rodada
+    foram aceitos; se um falhar, a rodada inteira é reenviada depois. Cada
+    chave de idempotência é derivada do conteúdo do lote, então os lotes
+    que não mudaram são ignorados pelo CRM e os que mudaram são aceitos.
+
+    Args:
+        client (CRMClient): Cliente do CRM
+        feed (ChangeFeed): Consumidor do log de perfis
+        verified_only (bool): Enviar só fãs com documento validado
+        changes_per_poll (int): Alterações lidas do log por rodada
+        profiles_per_request (int): Perfis por requisição
+
+    Returns:
+        dict: changes lidas, profiles e batches enviados
+    """
+    changes = feed.poll(changes_per_poll)
+    if not changes:
+        return {'changes': 0, 'profiles': 0, 'batches': 0}
+
+    updated = {}
+    for _, entry in changes:
+        updated[entry['fan_id']] = entry['ts']
+    records = [crm_record(fan_id, profile, updated[fan_id])
+               for fan_id, profile in load_profiles(list(updated)).items()]
+    if verified_only:
+        records = [record for record in records if record['verified']]
+
+    end = changes[-1][0]
+    batches = 0
+    for index in range(0, len(records), profiles_per_request):
+        batch = records[index:index + profiles_per_request]
+        client.send(_batch_key(batch), batch)
+        batches += 1
+    feed.commit(end)
+
+    increment('crm_sync.profiles', len(records))
+    increment('crm_sync.batches', batches)
+    return {'changes': len(changes), 'profiles': len(records), 'batches': batches}
+
+
+def backfill(client, verified_only=True,
+             profiles_per_request=PROFILES_PER_REQUEST):
+    """
+    Envia todos os perfis já gravados, sem passar pelo log.
+
+    Usado na primeira sincronização: gravações anteriores ao cursor do CRM
+    podem já ter sido compactadas e não aparecem mais no log.
+
+    Args:
+        client (CRMClient): Cliente do CRM
+        verified_only (bool): Enviar só fãs com documento validado
+        profiles_per_request (int): Perfis por requisição
+
+    Returns:
+        dict: profiles e batches enviados
+    """
+    fan_ids = sorted(get_backend().load_many('personal'))
+    totals = {'profiles': 0, 'batches': 0}
+    for start in range(0, len(fan_ids), profiles_per_request):
+        chunk = fan_ids[start:start + profiles_per_request]
+        records = [crm_record(fan_id, profile,
+                              profile['personal'].get('registration_date'))
+                   for fan_id, profile in load_profiles(chunk).items()]
+        if verified_only:
+            records = [record for record in records if record['verified']]
+        if not records:
+            continue
+        client.send(_batch_key(records), records)
+        totals['profiles'] += len(records)
+        totals['batches'] += 1
+    increment('crm_sync.profiles', totals['profiles'])
+    increment('crm_sync.batches', totals['batches'])
+    return totals
+
+
+def run_sync(client, feed=None, follow=False, interval=5.0,
+             verified_only=True):
+    """
+    Envia tudo o que está pendente e, com follow, continua acompanhando o log.
+
+    Com follow, uma falha de entrega não encerra a sincronização: a rodada
+    é repetida depois de `interval`, a partir do mesmo cursor.
+
+    Args:
+        client (CRMClient): Cliente do CRM
+        feed (ChangeFeed): Consumidor do log (padrão: o de FEED_NAME)
+        follow (bool): Continuar depois de esvaziar o log
+        interval (float): Espera (s) entre rodadas sem alterações
+        verified_only (bool): Enviar só fãs com documento validado
+
+    Returns:
+        dict: Totais de changes, profiles e batches, seconds e profiles_per_s
+    """
+    feed = feed or ChangeFeed(FEED_NAME)
+    totals = {'changes': 0, 'profiles': 0, 'batches': 0}
+    started = time.perf_counter()
+    while True:
+        try:
+            result = sync_once(client, feed, verified_only)
+        except RuntimeError:
+            if not follow:
+                raise
+            increment('crm_sync.failures')
+            time.sleep(interval)
+            continue
+        for key in totals:
+            totals[key] += result[key]
+        if not result['changes']:
+            if not follow:
+                break
+            time.sleep(interval)
+    seconds = time.perf_counter() - started
+    totals['seconds'] = round(seconds, 3)
+    totals['profiles_per_s'] = round(totals['profiles'] / seconds, 1) if seconds else 0.0
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Envia ao CRM os perfis de fã alterados desde a última execução.")
+    parser.add_argument('--url', default=CRM_URL)
+    parser.add_argument('--follow', action='store_true',
+                        help="Continuar acompanhando o log depois de esvaziá-lo")
+    parser.add_argument('--interval', type=float, default=5.0)
+    parser.add_argument('--backfill', action='store_true',
+                        help="Enviar antes todos os perfis já gravados")
+    parser.add_argument('--all', action='store_true',
+                        help="Enviar também fãs sem documento validado")
+    args = parser.parse_args(argv)
+
+    client = CRMClient(args.url)
+    # O cursor é registrado antes da carga inicial, para que as gravações
+    # feitas durante ela fiquem no log e sejam enviadas em seguida
+    feed = ChangeFeed(FEED_NAME)
+    try:
+        if args.backfill:
+            sent = backfill(client, verified_only=not args.all)
+            print(f"Carga inicial: {sent['profiles']} perfis em {sent['batches']} lotes")
+        totals = run_sync(client, feed, args.follow, args.interval,
+                          verified_only=not args.all)
+    except RuntimeError as e:
+        print(e)
+        return 1
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        client.close()
+    print(f"{totals['profiles']} perfis em {totals['batches']} lotes "
+          f"({totals['changes']} alterações) em {totals['seconds']} s: "
+          f"{totals['profiles_per_s']} perfis/s")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
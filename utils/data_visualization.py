@@ -4,7 +4,13 @@ import plotly.graph_objects as go
 import random
 from datetime import datetime, timedelta
 
+from utils.event_catalog import count_attended_events
+from utils.instrumentation import timed
+from utils.scoring import feature_vector, load_rules
+from utils.timeseries import build_activity_levels
 
+
+@timed('charts.interest')
 def create_interest_chart(interests_data):
     """
     Create a visualization of the user's esports interests.
@@ -94,10 +100,26 @@ def create_interest_chart(interests_data):
         return fig
 
 
+# A partir deste número de pontos por série, a linha do tempo usa WebGL
+# (Scattergl) e deixa de desenhar marcadores
+SCATTERGL_MIN_POINTS = 200
+
+_ACTIVITY_STYLES = {
+    'posts': ('Posts', '#FF5722'),
+    'interactions': ('Interactions', '#2196F3'),
+}
+
+
+@timed('charts.activity_timeline')
 def create_activity_timeline(social_media_analysis):
     """
     Create a timeline visualization of the user's social media activity.
     
+    Long histories are drawn from resolution levels downsampled to a fixed
+    point budget (see utils/timeseries.py), precomputed in the analysis as
+    'activity_levels' or built here, so the payload does not grow with the
+    history. With more than one level, buttons switch between them.
+    
     Args:
         social_media_analysis (dict): Analyzed social media data
         
@@ -108,36 +130,46 @@ def create_activity_timeline(social_media_analysis):
     activity = social_media_analysis.get('activity', [])
 
     if activity:
-        # Create a DataFrame
-        df = pd.DataFrame(activity)
-
-        # Convert date strings to datetime
-        df['date'] = pd.to_datetime(df['date'])
+        levels = (social_media_analysis.get('activity_levels') or
+                  build_activity_levels(activity))
+        names = list(levels)
 
         # Create a line chart
         fig = go.Figure()
 
-        # Add posts line
-        fig.add_trace(
-            go.Scatter(x=df['date'],
-                       y=df['posts'],
-                       mode='lines+markers',
-                       name='Posts',
-                       line=dict(color='#FF5722', width=2),
-                       marker=dict(size=6)))
-
-        # Add interactions line
-        fig.add_trace(
-            go.Scatter(x=df['date'],
-                       y=df['interactions'],
-                       mode='lines+markers',
-                       name='Interactions',
-                       line=dict(color='#2196F3', width=2),
-                       marker=dict(size=6)))
+        # One trace per series and level; only the first level is visible
+        for level_index, name in enumerate(names):
+            for series, (label, color) in _ACTIVITY_STYLES.items():
+                points = levels[name][series]
+                dense = len(points['x']) >= SCATTERGL_MIN_POINTS
+                trace = go.Scattergl if dense else go.Scatter
+                fig.add_trace(
+                    trace(x=points['x'],
+                          y=points['y'],
+                          mode='lines' if dense else 'lines+markers',
+                          name=label,
+                          visible=level_index == 0,
+                          line=dict(color=color, width=2),
+                          marker=dict(size=6)))
+
+        if len(names) > 1:
+            series_count = len(_ACTIVITY_STYLES)
+            buttons = [
+                dict(label=name,
+                     method='update',
+                     args=[{'visible': [i // series_count == level_index
+                                        for i in range(len(fig.data))]}])
+                for level_index, name in enumerate(names)
+            ]
+            fig.update_layout(updatemenus=[
+                dict(type='buttons', direction='right', x=1, y=1.15,
+                     xanchor='right', buttons=buttons)
+            ])
 
         # Update layout
         fig.update_layout(
-            title='Atividade de eSports nas mídias sociais (Last 6 Months)',
+            title='Atividade de eSports nas mídias sociais (Last 6 Months)'
+            if len(names) == 1 else 'Atividade de eSports nas mídias sociais',
             xaxis_title='Date',
             yaxis_title='Count',
             legend_title='Activity Type',
@@ -167,6 +199,60 @@ def create_activity_timeline(social_media_analysis):
         return fig
 
 
+# Eixos do radar de engajamento; os quatro primeiros vêm do perfil e os dois
+# últimos ainda são simulados
+ENGAGEMENT_CATEGORIES = [
+    'Presença nas mídias sociais', 'Conhecimento em jogos',
+    'Suporte de Equipe', 'Participação no evento', 'Criação de conteúdo',
+    'Envolvimento na comunidade'
+]
+PROFILE_ENGAGEMENT_AXES = 4
+
+
+def engagement_features(social_media_analysis, interests_data):
+    """
+    Extract the features behind the engagement radar.
+    
+    Args:
+        social_media_analysis (dict): Analyzed social media data
+        interests_data (dict): User's interests data
+        
+    Returns:
+        dict: Feature name to value (see scoring.ENGAGEMENT_FEATURES)
+    """
+    return {
+        'social': social_media_analysis.get('engagement_score', 0),
+        'games': len(interests_data.get('favorite_games', [])),
+        'teams': len(interests_data.get('favorite_teams', [])),
+        # Distinct events, resolved against the event catalog
+        'events': count_attended_events(interests_data),
+        # Content Creation and Community Involvement are still simulated,
+        # drawn once by extract_social_media_info (0 for older analyses)
+        'content': social_media_analysis.get('content_creation', 0),
+        'community': social_media_analysis.get('community_involvement', 0),
+    }
+
+
+def compute_engagement_scores(social_media_analysis, interests_data,
+                              features=None):
+    """
+    Calculate the engagement score (0-10) of each radar axis.
+    
+    Args:
+        social_media_analysis (dict): Analyzed social media data
+        interests_data (dict): User's interests data
+        features (dict): Features already extracted (engagement_features)
+        
+    Returns:
+        list: One score per entry of ENGAGEMENT_CATEGORIES
+    """
+    if features is None:
+        features = engagement_features(social_media_analysis, interests_data)
+    return load_rules().score(
+        'engagement', feature_vector('engagement', features)).tolist()
+
+
+@timed('charts.engagement_radar')
 def create_engagement_radar(social_media_analysis, interests_data):
     """
     Create a radar chart visualization of the user's engagement across different aspects.
@@ -178,42 +264,10 @@ def create_engagement_radar(social_media_analysis, interests_data):
     Returns:
         plotly.graph_objects.Figure: Visualization figure
     """
-    # Define categories for the radar chart
-    categories = [
-        'Presença nas mídias sociais', 'Conhecimento em jogos',
-        'Suporte de Equipe', 'Participação no evento', 'Criação de conteúdo',
-        'Envolvimento na comunidade'
-    ]
+    categories = ENGAGEMENT_CATEGORIES
 
     # Calculate scores for each category (1-10)
-    scores = []
-
-    # Social Media Presence
-    social_score = min(10, social_media_analysis.get('engagement_score', 0))
-    scores.append(social_score)
-
-    # Game Knowledge (based on favorite games)
-    game_knowledge = min(10, len(interests_data.get('favorite_games', [])) * 2)
-    scores.append(game_knowledge)
-
-    # Team Support (based on favorite teams)
-    team_support = min(10, len(interests_data.get('favorite_teams', [])) * 2.5)
-    scores.append(team_support)
-
-    # Event Attendance
-    events = interests_data.get('attended_events', '')
-    event_count = len([e for e in events.split('\n')
-                       if e.strip()]) if events else 0
-    event_attendance = min(10, event_count * 2)
-    scores.append(event_attendance)
-
-    # Content Creation (simulated)
-    content_creation = random.randint(3, 8)
-    scores.append(content_creation)
-
-    # Community Involvement (simulated)
-    community_involvement = random.randint(4, 9)
-    scores.append(community_involvement)
+    scores = compute_engagement_scores(social_media_analysis, interests_data)
 
     # Create the radar chart
     fig = go.Figure()
@@ -239,3 +293,25 @@ def create_engagement_radar(social_media_analysis, interests_data):
                       title_font_size=16)
 
     return fig
+
+
+def create_dashboard_figures(profile):
+    """
+    Create the dashboard figures available for a stored profile.
+    
+    Args:
+        profile (dict): Fan profile with all sections (profile_store.load_profile)
+        
+    Returns:
+        dict: Chart name ('interests', 'engagement', 'activity') to figure,
+            only for the charts the profile has data for
+    """
+    interests = profile['interests']
+    analysis = profile['social_media'].get('analysis', {})
+    figures = {}
+    if interests:
+        figures['interests'] = create_interest_chart(dict(interests))
+        figures['engagement'] = create_engagement_radar(analysis, interests)
+    if analysis:
+        figures['activity'] = create_activity_timeline(analysis)
+    return figures
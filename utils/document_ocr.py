@@ -0,0 +1,485 @@
+import os
+import random
+import re
+import threading
+import time
+
+import cv2
+import pytesseract
+
+from utils.document_validator import find_document_type, process_image_ocr
+from utils.instrumentation import (counters, increment, latency_summary,
+                                   record_duration, timed)
+
+# Modo do OCR na etapa 3: 'fields' (duas passadas, padrão) ou 'full' (texto
+# completo, no idioma de KYF_OCR_LANG)
+OCR_MODE = os.environ.get('KYF_OCR_MODE', 'fields')
+
+# Idioma do OCR completo: 'auto' (padrão) escolhe um idioma por documento
+# com uma leitura de baixa resolução; qualquer outro valor (ex.: 'por+eng')
+# é passado direto ao Tesseract
+OCR_LANG = os.environ.get('KYF_OCR_LANG', 'auto')
+DUAL_LANG = 'por+eng'
+
+# Sondagem do idioma: imagem bem reduzida, lida só em português (as letras
+# do inglês são um subconjunto); abaixo desta confiança média (0-100) das
+# palavras, o OCR completo usa os dois idiomas
+PROBE_MAX_SIDE = 600
+PROBE_MIN_CONFIDENCE = 55
+
+# Fração dos documentos lidos com um só idioma que também é lida com
+# por+eng, só para medir a economia nos mesmos documentos (language_stats).
+# A leitura extra roda em segundo plano, uma de cada vez, fora da requisição
+PAIRED_SAMPLE = float(os.environ.get('KYF_OCR_PAIRED_SAMPLE', '0.05'))
+_paired_slot = threading.Semaphore(1)
+
+# Primeira passada: imagem reduzida, só português, apenas para classificar o
+# documento e localizar as linhas dos campos
+CLASSIFY_MAX_SIDE = 1000
+
+# Segunda passada: cada campo é recortado da imagem cheia e lido como uma
+# única linha (psm 7)
+LINE_CONFIG = '--psm 7'
+CPF_CONFIG = '--psm 7 -c tessedit_char_whitelist=0123456789.-'
+MRZ_CONFIG = '--psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789<'
+
+# Margem (px) em volta de cada linha recortada e fração inferior do
+# passaporte onde fica a zona de leitura mecânica (MRZ)
+FIELD_PADDING = 8
+MRZ_BAND = 0.3
+
+# Rótulo reconhecido por find_document_type, repetido no texto composto
+_TYPE_LABELS = {
+    "National ID Card (RG)": "CARTEIRA DE IDENTIDADE",
+    "Driver's License (CNH)": "CARTEIRA NACIONAL DE HABILITAÇÃO",
+    "CPF Card": "CPF",
+    "Passport": "PASSAPORTE",
+}
+
+# Indícios de cada idioma no texto da sondagem
+_PORTUGUESE_MARKERS = re.compile(
+    r'[ãõçáéíóúâêô]|\b(nome|data|nascimento|filia|naturalidade|validade|'
+    r'emiss|identidade|habilita|registro|geral|rep[uú]blica|federativa|brasil|'
+    r'cpf|rg|cnh|passaporte)', re.IGNORECASE)
+_ENGLISH_MARKERS = re.compile(
+    r'\b(name|surname|given|birth|date|nationality|issued?|expir\w*|sex|'
+    r'united|kingdom|states|license|driver|passport|card)\b', re.IGNORECASE)
+
+_CPF_LIKE = re.compile(r'[\d.\-]{6,}')
+_MRZ_LINE = re.compile(r'[A-Z0-9<]{40,48}')
+
+
+def _binarize(gray):
+    return cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
+
+
+def _read_data(gray, lang):
+    return pytesseract.image_to_data(_binarize(gray), lang=lang,
+                                     output_type=pytesseract.Output.DICT)
+
+
+def _scored_words(data):
+    """Palavras lidas com sua confiança (0-100), sem as vazias."""
+    return [(word, float(conf)) for word, conf in zip(data['text'], data['conf'])
+            if word.strip() and float(conf) >= 0]
+
+
+def _read_lines(data):
+    """
+    Agrupa as palavras lidas pelo Tesseract em linhas com suas caixas.
+
+    Returns:
+        list: (texto, palavras) por linha, onde palavras são (texto, caixa)
+            e caixa é (esquerda, topo, direita, base)
+    """
+    lines = {}
+    for i, word in enumerate(data['text']):
+        if not word.strip():
+            continue
+        key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        box = (data['left'][i], data['top'][i],
+               data['left'][i] + data['width'][i],
+               data['top'][i] + data['height'][i])
+        lines.setdefault(key, []).append((word, box))
+    return [(' '.join(word for word, _ in words), words)
+            for _, words in sorted(lines.items())]
+
+
+def _union(boxes, scale):
+    left = min(box[0] for box in boxes)
+    top = min(box[1] for box in boxes)
+    right = max(box[2] for box in boxes)
+    bottom = max(box[3] for box in boxes)
+    return tuple(int(round(value / scale)) for value in (left, top, right, bottom))
+
+
+def _read_field(gray, box, lang, config):
+    height, width = gray.shape
+    left, top, right, bottom = box
+    crop = gray[max(top - FIELD_PADDING, 0):min(bottom + FIELD_PADDING, height),
+                max(left - FIELD_PADDING, 0):min(right + FIELD_PADDING, width)]
+    if not crop.size:
+        return ''
+    return pytesseract.image_to_string(_binarize(crop), lang=lang,
+                                       config=config).strip()
+
+
+def mrz_check_digit(value):
+    """
+    Calcula o dígito verificador de um campo da MRZ (ICAO 9303, pesos 7-3-1).
+
+    Args:
+        value (str): Campo da MRZ (dígitos, letras e '<')
+
+    Returns:
+        str: O dígito verificador
+    """
+    total = 0
+    for i, char in enumerate(value):
+        if char.isdigit():
+            number = int(char)
+        elif char.isalpha():
+            number = ord(char) - ord('A') + 10
+        else:
+            number = 0
+        total += number * (7, 3, 1)[i % 3]
+    return str(total % 10)
+
+
+def parse_mrz(text):
+    """
+    Extrai os dados da MRZ de um passaporte (formato TD3, 2 linhas de 44).
+
+    Args:
+        text (str): Texto lido da faixa inferior do passaporte
+
+    Returns:
+        dict or None: name, passport_number, nationality, birth_date e
+            checks_ok (dígitos verificadores conferem), ou None sem MRZ
+    """
+    lines = _MRZ_LINE.findall(text.upper().replace(' ', '').replace('«', '<'))
+    lines = [line[:44].ljust(44, '<') for line in lines]
+    for first, second in zip(lines, lines[1:]):
+        if not first.startswith('P'):
+            continue
+        surname, _, given = first[5:].partition('<<')
+        name = ' '.join(part for part in given.split('<') + [surname]
+                        if part)
+        number, birth = second[0:9], second[13:19]
+        return {
+            'name': name,
+            'passport_number': number.rstrip('<'),
+            'nationality': second[10:13],
+            'birth_date': birth,
+            'checks_ok': (mrz_check_digit(number) == second[9] and
+                          mrz_check_digit(birth) == second[19]),
+        }
+    return None
+
+
+def _field_lines(lines):
+    """Localiza, nas linhas da primeira passada, as do nome e do CPF."""
+    name_line = cpf_words = None
+    for i, (text, words) in enumerate(lines):
+        lowered = text.lower()
+        if name_line is None and lowered.startswith('nome'):
+            # O valor fica na mesma linha do rótulo ou na linha seguinte
+            label_only = len(words) == 1 or '/' in lowered
+            if not label_only:
+                name_line = words[1:]
+            elif i + 1 < len(lines):
+                name_line = lines[i + 1][1]
+        if cpf_words is None and 'cpf' in lowered:
+            digits = [word for word in words if _CPF_LIKE.search(word[0])]
+            if not digits and i + 1 < len(lines):
+                digits = [word for word in lines[i + 1][1]
+                          if _CPF_LIKE.search(word[0])]
+            cpf_words = digits or None
+    return name_line, cpf_words
+
+
+@timed('document.ocr_fields')
+def process_document_fields(gray, probe=None):
+    """
+    OCR em duas passadas, lendo só os campos usados na validação.
+
+    A primeira passada lê a imagem reduzida, só em português, para
+    classificar o documento com as palavras-chave de find_document_type e
+    localizar as linhas dos campos. A segunda relê cada campo na resolução
+    cheia como uma única linha: o CPF com lista de dígitos permitidos e o
+    nome em português; nos passaportes, a MRZ é lida e interpretada, e o
+    documento é recusado se os dígitos verificadores não conferem.
+
+    Args:
+        gray (numpy.ndarray): Imagem em escala de cinza (to_grayscale)
+        probe (list): Se dada, recebe as (palavra, confiança) da primeira
+            passada, que servem de sondagem do idioma no OCR completo
+
+    Returns:
+        str or None: Texto no formato esperado por validate_document, ou
+            None se os campos não foram localizados
+
+    Raises:
+        ValueError: Se a MRZ do passaporte foi lida, mas os dígitos
+            verificadores não conferem
+    """
+    scale = min(CLASSIFY_MAX_SIDE / max(gray.shape), 1.0)
+    small = cv2.resize(gray, None, fx=scale, fy=scale,
+                       interpolation=cv2.INTER_AREA) if scale < 1 else gray
+    try:
+        data = _read_data(small, 'por')
+        if probe is not None:
+            probe.extend(_scored_words(data))
+        lines = _read_lines(data)
+        document_type = find_document_type(' '.join(text for text, _ in lines))
+
+        if document_type == "Passport":
+            height = gray.shape[0]
+            band = gray[int(height * (1 - MRZ_BAND)):]
+            mrz = parse_mrz(pytesseract.image_to_string(
+                _binarize(band), lang='eng', config=MRZ_CONFIG))
+            if not mrz:
+                return None
+            if mrz['checks_ok']:
+                # Sem acentos na MRZ: o nome também é lido na zona visual
+                name_line, _ = _field_lines(lines)
+                fields = [_TYPE_LABELS[document_type], mrz['name']]
+                if name_line:
+                    fields.append(_read_field(gray, _union(
+                        [box for _, box in name_line], scale), 'por', LINE_CONFIG))
+                return '\n'.join(fields)
+            # MRZ mal lida ou adulterada: o documento é recusado, sem cair
+            # para o OCR completo, que o validaria pelo texto livre
+            increment('document.mrz.check_failed')
+        elif document_type == "Unknown":
+            return None
+        else:
+            name_line, cpf_words = _field_lines(lines)
+            if not name_line:
+                return None
+            fields = [_TYPE_LABELS[document_type]]
+            fields.append(_read_field(gray, _union(
+                [box for _, box in name_line], scale), 'por', LINE_CONFIG))
+            if cpf_words:
+                cpf_text = _read_field(gray, _union(
+                    [box for _, box in cpf_words], scale), 'por', CPF_CONFIG)
+                fields.append(f"CPF {cpf_text}")
+            return '\n'.join(fields)
+    except Exception as e:
+        print(f"Erro no processamento OCR: {e}")
+        return None
+
+    # Só um passaporte com a MRZ recusada chega aqui
+    raise ValueError("A zona de leitura mecânica (MRZ) do passaporte não "
+                     "confere. Por favor, carregue uma foto mais nítida do "
+                     "passaporte.")
+
+
+def choose_language(words):
+    """
+    Escolhe o idioma do OCR completo a partir de uma leitura em português.
+
+    Compara os indícios de português (acentos, rótulos dos documentos
+    brasileiros) e de inglês. Com pouca confiança, sem texto ou sem um
+    idioma predominante, devolve os dois idiomas.
+
+    Args:
+        words (list): (palavra, confiança) lidas em português
+
+    Returns:
+        tuple: (idioma do Tesseract, confiança média das palavras)
+    """
+    if not words:
+        return DUAL_LANG, 0.0
+    confidence = sum(conf for _, conf in words) / len(words)
+    if confidence < PROBE_MIN_CONFIDENCE:
+        return DUAL_LANG, confidence
+
+    text = ' '.join(word for word, _ in words)
+    portuguese = len(_PORTUGUESE_MARKERS.findall(text))
+    english = len(_ENGLISH_MARKERS.findall(text))
+    if portuguese > english:
+        return 'por', confidence
+    if english > portuguese:
+        return 'eng', confidence
+    return DUAL_LANG, confidence
+
+
+@timed('document.ocr_probe')
+def detect_language(gray):
+    """
+    Sondagem do idioma: lê a imagem reduzida (PROBE_MAX_SIDE) em português.
+
+    Args:
+        gray (numpy.ndarray): Imagem em escala de cinza (to_grayscale)
+
+    Returns:
+        tuple: (idioma do Tesseract, confiança média da sondagem)
+    """
+    scale = min(PROBE_MAX_SIDE / max(gray.shape), 1.0)
+    small = cv2.resize(gray, None, fx=scale, fy=scale,
+                       interpolation=cv2.INTER_AREA) if scale < 1 else gray
+    try:
+        data = _read_data(small, 'por')
+    except Exception as e:
+        print(f"Erro no processamento OCR: {e}")
+        return DUAL_LANG, 0.0
+    return choose_language(_scored_words(data))
+
+
+def _timed_ocr(gray, lang, stage):
+    started = time.perf_counter()
+    text = process_image_ocr(gray, lang)
+    elapsed = time.perf_counter() - started
+    record_duration(stage, elapsed)
+    return text, elapsed
+
+
+def process_full_text(gray, lang=None, probe=None):
+    """
+    OCR completo com um idioma por documento (KYF_OCR_LANG).
+
+    Com 'auto', o idioma vem das palavras já lidas em português na
+    primeira passada do modo 'fields' (probe) ou, sem elas, de uma
+    sondagem própria (detect_language). Se o texto lido com um só idioma
+    não permite classificar o documento, a leitura é refeita com os dois
+    idiomas. Uma amostra (KYF_OCR_PAIRED_SAMPLE) dos documentos lidos com
+    um só idioma também é lida com por+eng para medir a economia, em uma
+    thread em segundo plano: o fã não espera pela leitura extra.
+
+    Args:
+        gray (numpy.ndarray): Imagem em escala de cinza (to_grayscale)
+        lang (str): Idioma do Tesseract (padrão: KYF_OCR_LANG)
+        probe (list): (palavra, confiança) já lidas em português, mesmo
+            que vazia (None: faz a sondagem)
+
+    Returns:
+        str: Texto extraído
+    """
+    lang = lang or OCR_LANG
+    if lang == 'auto':
+        increment('document.ocr_auto')
+        if probe is not None:
+            increment('document.ocr_probe.reused')
+            lang, _ = choose_language(probe)
+        else:
+            lang, _ = detect_language(gray)
+    text, elapsed = _timed_ocr(gray, lang, f'document.ocr_full.{lang}')
+    increment(f'document.ocr_lang.{lang}')
+    if lang == DUAL_LANG:
+        return text
+
+    paired = random.random() < PAIRED_SAMPLE
+    if find_document_type(text) == "Unknown":
+        increment(f'document.ocr_retry.{lang}')
+        text, dual_elapsed = _timed_ocr(gray, DUAL_LANG, 'document.ocr_retry')
+        if paired:
+            _record_paired(lang, elapsed, dual_elapsed)
+    elif paired:
+        _start_paired_sample(gray, lang, elapsed)
+    return text
+
+
+def _record_paired(lang, elapsed, dual_elapsed):
+    # Os dois tempos do mesmo documento, escolhido ao acaso
+    record_duration(f'document.ocr_paired.{lang}', elapsed)
+    record_duration(f'document.ocr_paired.{lang}.{DUAL_LANG}', dual_elapsed)
+
+
+def _start_paired_sample(gray, lang, elapsed):
+    # Com uma leitura pareada ainda em andamento, o documento fica fora da
+    # amostra em vez de formar fila
+    if not _paired_slot.acquire(blocking=False):
+        increment('document.ocr_paired_skipped')
+        return
+
+    def run():
+        try:
+            _, dual_elapsed = _timed_ocr(gray, DUAL_LANG,
+                                         'document.ocr_paired_sample')
+            _record_paired(lang, elapsed, dual_elapsed)
+        finally:
+            _paired_slot.release()
+
+    threading.Thread(target=run, name='ocr-paired-sample', daemon=True).start()
+
+
+def language_stats():
+    """
+    Resumo do OCR completo por idioma, para a página admin.
+
+    A economia líquida por documento de um idioma é a diferença das
+    medianas de por+eng e do idioma medidas nos mesmos documentos (amostra
+    KYF_OCR_PAIRED_SAMPLE), menos as releituras com por+eng desse idioma e
+    a sondagem paga por todo documento com KYF_OCR_LANG=auto (zero quando
+    a primeira passada do modo 'fields' é reaproveitada). A linha 'total'
+    é a média ponderada pelos documentos.
+
+    Returns:
+        list: Um dict por idioma com documents, retries, p50_ms e
+            saved_ms_per_doc (None enquanto não há amostras pareadas)
+    """
+    summary = latency_summary()
+    p50 = dict(zip(summary['stage'], summary['p50_ms']))
+    counts = dict(zip(summary['stage'], summary['count']))
+    stats = counters()
+    auto = stats.get('document.ocr_auto', 0)
+    probe_ms = (p50['document.ocr_probe'] * counts['document.ocr_probe'] / auto
+                if auto and 'document.ocr_probe' in p50 else 0.0)
+
+    rows = []
+    for name, documents in sorted(stats.items()):
+        if not name.startswith('document.ocr_lang.'):
+            continue
+        lang = name[len('document.ocr_lang.'):]
+        retries = stats.get(f'document.ocr_retry.{lang}', 0)
+        if lang == DUAL_LANG:
+            saved = -probe_ms
+        elif f'document.ocr_paired.{lang}' in p50:
+            retry_ms = p50['document.ocr_retry'] * retries / documents if retries else 0.0
+            saved = (p50[f'document.ocr_paired.{lang}.{DUAL_LANG}']
+                     - p50[f'document.ocr_paired.{lang}'] - retry_ms - probe_ms)
+        else:
+            saved = None
+        rows.append({'lang': lang, 'documents': documents, 'retries': retries,
+                     'p50_ms': p50.get(f'document.ocr_full.{lang}'),
+                     'saved_ms_per_doc': None if saved is None else round(saved, 2)})
+
+    if rows and all(row['saved_ms_per_doc'] is not None for row in rows):
+        documents = sum(row['documents'] for row in rows)
+        rows.append({
+            'lang': 'total', 'documents': documents,
+            'retries': sum(row['retries'] for row in rows), 'p50_ms': None,
+            'saved_ms_per_doc': round(sum(row['saved_ms_per_doc'] * row['documents']
+                                          for row in rows) / documents, 2)})
+    return rows
+
+
+def extract_document_text(gray):
+    """
+    Extrai o texto de um documento conforme KYF_OCR_MODE.
+
+    No modo 'fields', cai para o OCR completo quando o documento não é
+    classificado ou os campos não são encontrados; o OCR completo usa um
+    só idioma quando a sondagem é confiável (process_full_text). Um
+    passaporte com a MRZ recusada não cai para o OCR completo.
+
+    Args:
+        gray (numpy.ndarray): Imagem em escala de cinza (to_grayscale)
+
+    Returns:
+        str: Texto extraído
+
+    Raises:
+        ValueError: Se a MRZ do passaporte não confere (process_document_fields)
+    """
+    probe = None
+    if OCR_MODE == 'fields':
+        probe = []
+        text = process_document_fields(gray, probe)
+        if text:
+            increment('document.ocr_fields.hit')
+            return text
+        increment('document.ocr_fields.fallback')
+    # A primeira passada já leu o documento em português: serve de sondagem
+    return process_full_text(gray, probe=probe)
@@ -1,26 +1,236 @@
 import cv2
 import numpy as np
 import pytesseract
-from PIL import Image
+from PIL import Image, ImageOps
 import io
 import re
 
-def process_image_ocr(uploaded_file):
+from utils.instrumentation import increment, timed
+
+# Limites para aceitar um upload antes de decodificá-lo
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+MAX_IMAGE_PIXELS = 40_000_000
+MIN_IMAGE_SIDE = 300
+ACCEPTED_FORMATS = ('JPEG', 'PNG')
+
+# Maior lado da imagem usada no OCR; acima disso o Tesseract só fica mais lento
+OCR_MAX_SIDE = 2000
+
+# Verificação de qualidade antes do OCR, feita em uma redução da imagem.
+# Os limites de nitidez dependem desse tamanho: mudá-lo exige recalibrar.
+QUALITY_MAX_SIDE = 640
+QUALITY_TILES = 8
+MIN_SHARPNESS = 400
+MIN_BRIGHTNESS = 50
+MIN_CONTRAST = 40
+MAX_SATURATED_FRACTION = 0.5
+MAX_GLARE_FRACTION = 0.015
+
+
+def normalize_cpf(cpf):
     """
-    Processa um arquivo de imagem carregado com OCR para extrair texto.
+    Remove a formatação de um CPF.
+    
+    Args:
+        cpf (str): CPF em qualquer formato (ex.: 123.456.789-09)
+        
+    Returns:
+        str: Os 11 dígitos do CPF, ou string vazia se não houver 11 dígitos
+    """
+    digits = re.sub(r'[^\d]', '', cpf or '')
+    return digits if len(digits) == 11 else ''
+
+
+def is_valid_cpf(cpf):
+    """
+    Verifica os dígitos verificadores (módulo 11) de um CPF.
+    
+    Args:
+        cpf (str): CPF formatado ou apenas dígitos
+        
+    Returns:
+        bool: Se o CPF tem 11 dígitos e dígitos verificadores corretos
+    """
+    digits = normalize_cpf(cpf)
+    # Sequências repetidas (000.000.000-00, 111...) passam no módulo 11,
+    # mas não são CPFs emitidos
+    if not digits or digits == digits[0] * 11:
+        return False
+    
+    numbers = [int(d) for d in digits]
+    for length in (9, 10):
+        total = sum(n * (length + 1 - i) for i, n in enumerate(numbers[:length]))
+        check_digit = (total * 10) % 11 % 10
+        if check_digit != numbers[length]:
+            return False
+    return True
+
+
+@timed('document.inspect_header')
+def inspect_image_header(uploaded_file):
+    """
+    Verifica um upload lendo apenas o cabeçalho da imagem, sem decodificá-la.
     
     Args:
         uploaded_file: O arquivo carregado pelo Streamlit file_uploader
         
     Returns:
-        str: Texto extraído da imagem
+        tuple: (is_valid, message) - Se a imagem pode ser processada e o motivo da rejeição
+    """
+    size = getattr(uploaded_file, 'size', None)
+    if size is not None and size > MAX_UPLOAD_BYTES:
+        return False, f"Arquivo muito grande. O limite é de {MAX_UPLOAD_BYTES // (1024 * 1024)} MB."
+    
+    try:
+        uploaded_file.seek(0)
+        with Image.open(uploaded_file) as img:
+            image_format = img.format
+            width, height = img.size
+    except Exception:
+        return False, "Não foi possível ler a imagem. Envie um arquivo JPG ou PNG válido."
+    finally:
+        uploaded_file.seek(0)
+    
+    if image_format not in ACCEPTED_FORMATS:
+        return False, "Formato de imagem não suportado. Envie um arquivo JPG ou PNG."
+    if width * height > MAX_IMAGE_PIXELS:
+        return False, "Imagem com resolução excessiva. Envie uma foto com no máximo 40 megapixels."
+    if min(width, height) < MIN_IMAGE_SIDE:
+        return False, "Imagem com resolução muito baixa para leitura do documento."
+    
+    return True, ""
+
+
+@timed('document.prepare_image')
+def prepare_document_image(uploaded_file, max_side=OCR_MAX_SIDE):
+    """
+    Decodifica o upload uma única vez, já reduzido para a resolução do OCR.
+    
+    Para JPEG, o decodificador reduz a imagem durante a própria decodificação
+    (escala DCT), sem materializar o original em resolução cheia. O array
+    resultante serve tanto para a pré-visualização quanto para o OCR.
+    
+    Args:
+        uploaded_file: O arquivo carregado pelo Streamlit file_uploader
+        max_side (int): Maior lado permitido, em pixels
+        
+    Returns:
+        numpy.ndarray: Imagem RGB (altura x largura x 3, uint8)
     """
-    # Ler o arquivo de imagem
-    file_bytes = np.asarray(bytearray(uploaded_file.read()), dtype=np.uint8)
-    image = cv2.imdecode(file_bytes, 1)
+    uploaded_file.seek(0)
+    with Image.open(uploaded_file) as img:
+        img.draft('RGB', (max_side, max_side))
+        img = ImageOps.exif_transpose(img)
+        img = img.convert('RGB')
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+        image = np.asarray(img)
+    uploaded_file.seek(0)
+    return image
+
+
+def to_grayscale(image):
+    """
+    Converte a imagem preparada por prepare_document_image para escala de cinza.
     
-    # Converter para escala de cinza
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    Args:
+        image (numpy.ndarray): Imagem RGB, ou já em escala de cinza
+        
+    Returns:
+        numpy.ndarray: Imagem em escala de cinza (altura x largura, uint8)
+    """
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+
+
+def _reject(reason, message):
+    increment(f"document.quality.{reason}")
+    return False, message
+
+
+@timed('document.quality')
+def check_image_quality(gray):
+    """
+    Verifica rapidamente se a imagem tem condições de ser lida pelo OCR.
+    
+    Roda em poucos milissegundos sobre uma redução da imagem, para que fotos
+    escuras, estouradas, com reflexo ou desfocadas sejam recusadas antes do
+    Otsu + Tesseract, que levam segundos e falhariam de qualquer forma.
+    
+    Args:
+        gray (numpy.ndarray): Imagem em escala de cinza (to_grayscale)
+        
+    Returns:
+        tuple: (is_valid, message) - Se a imagem pode seguir para o OCR e o motivo da rejeição
+    """
+    if min(gray.shape) < MIN_IMAGE_SIDE:
+        return _reject('resolution', "Imagem com resolução muito baixa para leitura do documento.")
+    
+    scale = QUALITY_MAX_SIDE / max(gray.shape)
+    if scale < 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale,
+                          interpolation=cv2.INTER_AREA)
+    
+    # Exposição: brilho médio, contraste e pixels estourados
+    histogram = np.bincount(gray.ravel(), minlength=256) / gray.size
+    if gray.mean() < MIN_BRIGHTNESS:
+        return _reject('dark', "A imagem está muito escura. Fotografe o documento em um local mais iluminado.")
+    low, high = np.percentile(gray, (1, 99))
+    if high - low < MIN_CONTRAST:
+        return _reject('contrast', "A imagem está sem contraste. Fotografe o documento sobre um fundo diferente e com boa iluminação.")
+    saturated_fraction = histogram[250:].sum()
+    if saturated_fraction > MAX_SATURATED_FRACTION:
+        return _reject('overexposed', "A imagem está clara demais. Evite luz direta ou o flash sobre o documento.")
+    
+    # Reflexo: uma mancha contínua de pixels estourados
+    if saturated_fraction > MAX_GLARE_FRACTION:
+        _, _, stats, _ = cv2.connectedComponentsWithStats(
+            (gray >= 250).astype(np.uint8), connectivity=8)
+        if stats[1:, cv2.CC_STAT_AREA].max() > MAX_GLARE_FRACTION * gray.size:
+            return _reject('glare', "Há reflexo de luz sobre o documento. Incline-o ou mude a posição da luz.")
+    
+    # Nitidez: variância do Laplaciano por região, após esticar o contraste
+    # e remover o ruído do sensor; o percentil 90 mede as regiões com texto,
+    # sem ser diluído pelo fundo
+    stretched = cv2.convertScaleAbs(gray, alpha=255 / (high - low),
+                                    beta=-low * 255 / (high - low))
+    laplacian = cv2.Laplacian(cv2.medianBlur(stretched, 3), cv2.CV_32F)
+    tile_h = laplacian.shape[0] // QUALITY_TILES
+    tile_w = laplacian.shape[1] // QUALITY_TILES
+    tiles = laplacian[:tile_h * QUALITY_TILES, :tile_w * QUALITY_TILES].reshape(
+        QUALITY_TILES, tile_h, QUALITY_TILES, tile_w)
+    sharpness = np.percentile(tiles.var(axis=(1, 3)), 90)
+    if sharpness < MIN_SHARPNESS:
+        return _reject('blur', "A imagem está desfocada. Segure o celular firme e aproxime do documento.")
+    
+    return True, ""
+
+
+@timed('document.ocr')
+def process_image_ocr(uploaded_file, lang='por+eng'):
+    """
+    Processa um arquivo de imagem carregado com OCR para extrair texto.
+    
+    Args:
+        uploaded_file: O arquivo carregado pelo Streamlit file_uploader, ou a
+            imagem (RGB ou escala de cinza) já preparada por
+            prepare_document_image
+        lang (str): Idiomas do Tesseract (utils/document_ocr.py escolhe um
+            por documento)
+        
+    Returns:
+        str: Texto extraído da imagem
+    """
+    if isinstance(uploaded_file, np.ndarray):
+        # Imagem já decodificada e reduzida no upload
+        gray = to_grayscale(uploaded_file)
+    else:
+        # Ler o arquivo de imagem
+        file_bytes = np.asarray(bytearray(uploaded_file.read()), dtype=np.uint8)
+        image = cv2.imdecode(file_bytes, 1)
+        
+        # Converter para escala de cinza
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     
     # Aplicar limiar para obter imagem apenas em preto e branco
     thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
@@ -30,12 +240,13 @@ def process_image_ocr(uploaded_file):
     
     # Extrair texto usando tesseract
     try:
-        text = pytesseract.image_to_string(pil_img, lang='por+eng')
+        text = pytesseract.image_to_string(pil_img, lang=lang)
         return text
     except Exception as e:
         print(f"Erro no processamento OCR: {e}")
         return ""
 
+@timed('document.validate')
 def validate_document(extracted_text, personal_info):
     """
     Valida o texto extraído de um documento comparando com as informações pessoais do usuário.
@@ -61,20 +272,23 @@ def validate_document(extracted_text, personal_info):
             cpf = personal_info.get('cpf', '').strip()
             if cpf:
                 # Remover qualquer formatação do CPF para comparação
-                cpf_clean = re.sub(r'[^\d]', '', cpf)
+                cpf_clean = normalize_cpf(cpf)
                 
                 # Procurar padrão de CPF no texto
                 cpf_pattern = r'\d{3}\.?\d{3}\.?\d{3}-?\d{2}'
                 found_cpfs = re.findall(cpf_pattern, extracted_text)
                 
-                if found_cpfs:
-                    # Clean the found CPFs for comparison
-                    found_cpfs_clean = [re.sub(r'[^\d]', '', found_cpf) for found_cpf in found_cpfs]
-                    
-                    if cpf_clean in found_cpfs_clean:
+                # Descartar leituras com dígitos verificadores inválidos (erros de OCR)
+                valid_cpfs = [normalize_cpf(found_cpf) for found_cpf in found_cpfs
+                              if is_valid_cpf(found_cpf)]
+                
+                if valid_cpfs:
+                    if cpf_clean in valid_cpfs:
                         return True, "Documento validado com sucesso. Nome e CPF correspondem ao seu perfil."
                     else:
                         return False, "Nome encontrado, mas o CPF no documento não corresponde ao seu perfil."
+                elif found_cpfs:
+                    return False, "Nome encontrado, mas o CPF do documento não pôde ser lido corretamente. Por favor, carregue uma imagem mais clara."
                 else:
                     # If we couldn't find a CPF pattern, still accept if the name matches
                     return True, "Documento parcialmente validado. Nome corresponde, mas não foi possível verificar o CPF."
@@ -86,6 +300,7 @@ def validate_document(extracted_text, personal_info):
     else:
         return False, "Informações pessoais insuficientes para validar o documento."
 
+@timed('document.find_type')
 def find_document_type(extracted_text):
     """
     Attempt to determine the type of document from the extracted text.
@@ -0,0 +1,284 @@
+import json
+import os
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from utils.instrumentation import timed
+from utils.storage import connect
+from utils.tenants import current_tenant, tenant_cache
+
+# Similaridade mínima (coeficiente de Dice sobre trigramas) para aceitar
+# um evento do catálogo como correspondente a uma linha digitada pelo fã
+MIN_SIMILARITY = 0.55
+
+# Trigramas em comum exigidos de uma correspondência aproximada: linhas
+# curtas demais ("Major") só valem com o nome exato
+MIN_SHARED_TRIGRAMS = 7
+
+_YEAR = re.compile(r'\b(?:19|20)\d{2}\b')
+
+# Palavras que não distinguem eventos ("final do cblol" = "cblol final")
+_STOPWORDS = {'a', 'o', 'as', 'os', 'da', 'de', 'do', 'das', 'dos', 'e',
+              'em', 'no', 'na', 'the', 'of'}
+
+
+def normalize_event_name(text):
+    """
+    Normalize an event name for matching: lowercase, no accents or
+    punctuation, no stopwords and no years.
+
+    Args:
+        text (str): Event name as typed by the fan or listed in the catalog
+
+    Returns:
+        tuple: (normalized name, year or None)
+    """
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    years = _YEAR.findall(text)
+    text = _YEAR.sub(' ', text)
+    tokens = [token for token in re.split(r'[^a-z0-9]+', text)
+              if token and token not in _STOPWORDS]
+    return ' '.join(tokens), int(years[-1]) if years else None
+
+
+def _trigrams(name):
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class EventIndex:
+    """
+    Trigram index over the names and aliases of the event catalog.
+
+    Attributes:
+        events (dict): Event id to catalog entry
+        series (dict): Event id to its series (normalized name without the
+            year), shared by the editions of an event
+        exact (dict): Normalized name to the ids of the events using it
+        postings (dict): Trigram to the keys (normalized names) containing it
+    """
+
+    def __init__(self, events):
+        self.events = {event['id']: event for event in events}
+        self.series = {event['id']: normalize_event_name(event['name'])[0]
+                       for event in events}
+        self.exact = defaultdict(list)
+        for event in events:
+            for name in [event['name']] + event.get('aliases', []):
+                key, _ = normalize_event_name(name)
+                if event['id'] not in self.exact[key]:
+                    self.exact[key].append(event['id'])
+
+        self.sizes = {}
+        self.postings = defaultdict(list)
+        for key in self.exact:
+            grams = _trigrams(key)
+            self.sizes[key] = len(grams)
+            for gram in grams:
+                self.postings[gram].append(key)
+
+    def _pick(self, event_ids, year):
+        # Com o ano digitado, só edições daquele ano; sem ano, a mais recente
+        if year is not None:
+            event_ids = [e for e in event_ids if self.events[e].get('year') == year]
+        if not event_ids:
+            return None
+        return max(event_ids, key=lambda e: self.events[e].get('year', 0))
+
+    def resolve(self, text):
+        """
+        Resolve one line typed by the fan to a catalog event.
+
+        Args:
+            text (str): Event name as typed
+
+        Returns:
+            str or None: Event id, or None if no event is similar enough
+        """
+        return self.resolve_normalized(*normalize_event_name(text))
+
+    def resolve_normalized(self, key, year):
+        """
+        Resolve an already normalized name (see normalize_event_name).
+
+        Args:
+            key (str): Normalized name
+            year (int): Year typed with the name, or None
+
+        Returns:
+            str or None: Event id, or None if no event is similar enough
+        """
+        if not key:
+            return None
+        if key in self.exact:
+            match = self._pick(self.exact[key], year)
+            if match:
+                return match
+
+        # Só os nomes que compartilham algum trigrama são pontuados
+        grams = _trigrams(key)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+
+        ranked = sorted(
+            ((2 * count / (len(grams) + self.sizes[candidate]), candidate)
+             for candidate, count in shared.items()),
+            reverse=True)
+        for similarity, candidate in ranked:
+            if similarity < MIN_SIMILARITY:
+                break
+            if shared[candidate] < MIN_SHARED_TRIGRAMS:
+                continue
+            match = self._pick(self.exact[candidate], year)
+            if match:
+                return match
+        return None
+
+
+@tenant_cache(maxsize=4)
+def _load_index(path, mtime):
+    with open(path) as f:
+        return EventIndex(json.load(f)['events'])
+
+
+def events_path():
+    """
+    Event catalog of the current tenant.
+
+    Returns:
+        str: Catalog JSON path
+    """
+    return current_tenant().catalogs['events']
+
+
+def load_event_index(path=None):
+    """
+    Load the event catalog index, rebuilt only when the file changes.
+
+    Args:
+        path (str): Catalog JSON path (default: the current tenant's)
+
+    Returns:
+        EventIndex: The index
+    """
+    path = path or events_path()
+    return _load_index(path, os.path.getmtime(path))
+
+
+@tenant_cache(maxsize=8192)
+def _resolve_cached(key, year, catalog_mtime):
+    return load_event_index().resolve_normalized(key, year)
+
+
+@timed('events.resolve')
+def resolve_events(text):
+    """
+    Resolve the attended_events textarea (one event per line) in bulk.
+
+    Each distinct normalized line is resolved once, and resolutions are
+    cached across fans (per tenant) until the catalog changes. A line
+    without a year stands for the most recent edition, unless another line
+    names a dated edition of the same series: then it refers to that one
+    and is not counted again ("IEM Rio" + "IEM Rio 2023" is one event).
+
+    Args:
+        text (str): Raw attended_events text
+
+    Returns:
+        tuple: (event_ids, unmatched) - Deduplicated catalog ids, in the
+            order typed, and the distinct lines not found in the catalog
+    """
+    mtime = os.path.getmtime(events_path())
+    resolved, unmatched, seen = [], [], set()
+    for line in (text or '').split('\n'):
+        key, year = normalize_event_name(line)
+        if not key or (key, year) in seen:
+            continue
+        seen.add((key, year))
+        event_id = _resolve_cached(key, year, mtime)
+        if event_id:
+            resolved.append((event_id, year is not None))
+        else:
+            unmatched.append(line.strip())
+
+    series = load_event_index().series
+    dated_series = {series[event_id] for event_id, dated in resolved if dated}
+    event_ids = []
+    for event_id, dated in resolved:
+        if not dated and series[event_id] in dated_series:
+            continue
+        if event_id not in event_ids:
+            event_ids.append(event_id)
+    return event_ids, unmatched
+
+
+def count_attended_events(interests_data):
+    """
+    Count the distinct events a fan attended.
+
+    Args:
+        interests_data (dict): The 'interests' profile section
+
+    Returns:
+        int: Catalog events plus distinct unmatched lines
+    """
+    if 'attended_event_ids' in interests_data:
+        return (len(interests_data['attended_event_ids']) +
+                len(interests_data.get('unmatched_events', [])))
+    event_ids, unmatched = resolve_events(interests_data.get('attended_events', ''))
+    return len(event_ids) + len(unmatched)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS event_attendance (
+    event_id TEXT NOT NULL,
+    fan_id TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (event_id, fan_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS event_attendance_fan ON event_attendance (fan_id);
+"""
+
+
+def _db():
+    conn = connect('event_attendance')
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def record_attendance(fan_id, event_ids):
+    """
+    Replace the set of catalog events attended by a fan.
+
+    Args:
+        fan_id (str): Fan identifier
+        event_ids (list): Catalog event ids
+    """
+    conn = _db()
+    now = datetime.now().isoformat()
+    with conn:
+        conn.execute('BEGIN')
+        conn.execute('DELETE FROM event_attendance WHERE fan_id = ?', (fan_id,))
+        conn.executemany(
+            'INSERT INTO event_attendance (event_id, fan_id, created_at) VALUES (?, ?, ?)',
+            [(event_id, fan_id, now) for event_id in event_ids])
+
+
+def attendance_counts():
+    """
+    Number of fans per catalog event, most attended first.
+
+    Returns:
+        list: Dicts with event_id, name and fans
+    """
+    index = load_event_index()
+    rows = _db().execute(
+        'SELECT event_id, COUNT(*) FROM event_attendance '
+        'GROUP BY event_id ORDER BY COUNT(*) DESC').fetchall()
+    return [{'event_id': event_id,
+             'name': index.events.get(event_id, {}).get('name', event_id),
+             'fans': fans} for event_id, fans in rows]
@@ -0,0 +1,99 @@
+import hashlib
+
+import numpy as np
+
+from utils.data_visualization import (PROFILE_ENGAGEMENT_AXES,
+                                      compute_engagement_scores)
+from utils.tenants import current_tenant, tenant_cache
+
+MAX_HOURS_GAMING = 50
+MAX_HOURS_WATCHING = 30
+
+
+class VectorLayout:
+    """
+    Positions of each feature in a fan vector, for one club's form options.
+
+    Layout:
+      multi-hot of games, teams and merchandise (the club's step-2 options,
+      "Outro" included), hours gaming and watching normalized by the slider
+      maximum, then the profile-derived radar engagement axes (no simulated
+      ones).
+
+    Attributes:
+        games (dict): Game option to position
+        teams (dict): Team option to position
+        merch (dict): Merchandise option to position
+        hours_offset (int): Position of the hours gaming (watching is next)
+        engagement_offset (int): Position of the first engagement axis
+        dim (int): Vector length
+        signature (str): Short hash of the options, which names the index
+    """
+
+    def __init__(self, games, teams, merch):
+        self.games = {name: i for i, name in enumerate(games)}
+        self.teams = {name: i + len(games) for i, name in enumerate(teams)}
+        self.merch = {name: i + len(games) + len(teams)
+                      for i, name in enumerate(merch)}
+        self.hours_offset = len(games) + len(teams) + len(merch)
+        self.engagement_offset = self.hours_offset + 2
+        self.dim = self.engagement_offset + PROFILE_ENGAGEMENT_AXES
+        self.signature = hashlib.sha1(
+            repr((games, teams, merch, PROFILE_ENGAGEMENT_AXES)).encode()).hexdigest()[:8]
+
+
+@tenant_cache(maxsize=4)
+def _layout(games, teams, merch):
+    return VectorLayout(games, teams, merch)
+
+
+def vector_layout():
+    """
+    Vector layout of the current tenant, cached per tenant.
+
+    A new layout is built only when the club's options change.
+
+    Returns:
+        VectorLayout: The layout
+    """
+    tenant = current_tenant()
+    return _layout(tuple(tenant.games), tuple(tenant.teams),
+                   tuple(tenant.merchandise))
+
+
+def encode_profile(user_data):
+    """
+    Encode a fan profile as a fixed-size, L2-normalized vector.
+
+    Args:
+        user_data (dict): Fan profile (or LazyProfile) with its sections
+
+    Returns:
+        numpy.ndarray: float32 vector of length vector_layout().dim
+    """
+    layout = vector_layout()
+    interests = user_data.get('interests') or {}
+    analysis = (user_data.get('social_media') or {}).get('analysis', {})
+    vector = np.zeros(layout.dim, dtype=np.float32)
+
+    for game in interests.get('favorite_games', []):
+        if game in layout.games:
+            vector[layout.games[game]] = 1.0
+    for team in interests.get('favorite_teams', []):
+        if team in layout.teams:
+            vector[layout.teams[team]] = 1.0
+    for merch in interests.get('merchandise', []):
+        if merch in layout.merch:
+            vector[layout.merch[merch]] = 1.0
+
+    vector[layout.hours_offset] = min(
+        interests.get('hours_gaming', 0) / MAX_HOURS_GAMING, 1.0)
+    vector[layout.hours_offset + 1] = min(
+        interests.get('hours_watching', 0) / MAX_HOURS_WATCHING, 1.0)
+
+    engagement = compute_engagement_scores(analysis, interests)
+    vector[layout.engagement_offset:] = np.asarray(
+        engagement[:PROFILE_ENGAGEMENT_AXES], dtype=np.float32) / 10
+
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -0,0 +1,153 @@
+from datetime import datetime
+from itertools import combinations
+
+import cv2
+import numpy as np
+
+from utils.instrumentation import timed
+from utils.storage import connect
+
+# pHash de 256 bits: os 16x16 coeficientes de baixa frequência da DCT de uma
+# redução 64x64. Com 64 bits (8x8), documentos diferentes do mesmo modelo
+# (mesmo layout, outro nome e CPF) ficam praticamente com o mesmo hash.
+HASH_SIZE = 64
+HASH_BLOCK = 16
+HASH_BITS = HASH_BLOCK * HASH_BLOCK
+
+# O hash é dividido em blocos de 16 bits (multi-index hashing): se dois
+# hashes estão a no máximo r bits de distância, pelo menos um dos blocos
+# difere em no máximo r // CHUNKS bits. Basta consultar, em cada bloco, os
+# valores vizinhos dentro desse raio e conferir a distância completa.
+CHUNK_BITS = 16
+CHUNKS = HASH_BITS // CHUNK_BITS
+
+# Distância de Hamming até a qual duas imagens são a mesma foto (reenvio,
+# recompressão JPEG, redimensionamento ou mudança de brilho)
+DEFAULT_MAX_DISTANCE = 10
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS document_hashes (
+    id INTEGER PRIMARY KEY,
+    fan_id TEXT NOT NULL,
+    hash BLOB NOT NULL,
+    created_at TEXT NOT NULL,
+    UNIQUE (fan_id, hash)
+);
+CREATE TABLE IF NOT EXISTS document_hash_chunks (
+    chunk INTEGER NOT NULL,
+    value INTEGER NOT NULL,
+    hash_id INTEGER NOT NULL REFERENCES document_hashes (id),
+    PRIMARY KEY (chunk, value, hash_id)
+) WITHOUT ROWID;
+"""
+
+
+def _db():
+    conn = connect('document_hashes')
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+@timed('document.phash')
+def perceptual_hash(gray):
+    """
+    Calcula o pHash (DCT) de uma imagem em escala de cinza.
+
+    Os coeficientes de baixa frequência da DCT (sem o componente DC) são
+    comparados com a mediana. O hash é estável a recompressão JPEG,
+    redimensionamento, desfoque leve e ajustes de brilho.
+
+    Args:
+        gray (numpy.ndarray): Imagem em escala de cinza (uint8)
+
+    Returns:
+        int: Hash de HASH_BITS bits
+    """
+    small = cv2.resize(gray, (HASH_SIZE, HASH_SIZE),
+                       interpolation=cv2.INTER_AREA)
+    dct = cv2.dct(small.astype(np.float32))[:HASH_BLOCK, :HASH_BLOCK].flatten()
+    bits = dct > np.median(dct[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def _split(image_hash):
+    mask = (1 << CHUNK_BITS) - 1
+    return [(image_hash >> (CHUNK_BITS * i)) & mask for i in range(CHUNKS)]
+
+
+def _to_bytes(image_hash):
+    return image_hash.to_bytes(HASH_BITS // 8, 'big')
+
+
+def _neighbours(chunk, radius):
+    # Todos os valores de 16 bits a no máximo `radius` bits de `chunk`
+    values = [chunk]
+    for flips in range(1, radius + 1):
+        for positions in combinations(range(CHUNK_BITS), flips):
+            value = chunk
+            for position in positions:
+                value ^= 1 << position
+            values.append(value)
+    return values
+
+
+@timed('document.hash_lookup')
+def find_similar_documents(image_hash, max_distance=DEFAULT_MAX_DISTANCE,
+                           exclude_fan_id=None):
+    """
+    Procura imagens de documento já enviadas parecidas com `image_hash`.
+
+    Args:
+        image_hash (int): pHash da imagem
+        max_distance (int): Distância de Hamming máxima
+        exclude_fan_id (str, optional): Fã cujas imagens são ignoradas
+
+    Returns:
+        list: (fan_id, distance) de cada imagem encontrada, da mais parecida
+    """
+    conn = _db()
+    radius = max_distance // CHUNKS
+    hash_ids = set()
+    for chunk, value in enumerate(_split(image_hash)):
+        values = _neighbours(value, radius)
+        placeholders = ', '.join('?' * len(values))
+        hash_ids.update(row[0] for row in conn.execute(
+            f'SELECT hash_id FROM document_hash_chunks '
+            f'WHERE chunk = ? AND value IN ({placeholders})', (chunk, *values)))
+    if not hash_ids:
+        return []
+
+    placeholders = ', '.join('?' * len(hash_ids))
+    matches = []
+    for fan_id, stored in conn.execute(
+            f'SELECT fan_id, hash FROM document_hashes WHERE id IN ({placeholders})',
+            list(hash_ids)):
+        if fan_id == exclude_fan_id:
+            continue
+        distance = bin(int.from_bytes(stored, 'big') ^ image_hash).count('1')
+        if distance <= max_distance:
+            matches.append((fan_id, distance))
+    return sorted(matches, key=lambda match: match[1])
+
+
+def register_document_hash(image_hash, fan_id):
+    """
+    Guarda o hash de uma imagem de documento enviada pelo fã.
+
+    Args:
+        image_hash (int): pHash da imagem
+        fan_id (str): Identificador do fã
+    """
+    conn = _db()
+    with conn:
+        conn.execute('BEGIN')
+        cursor = conn.execute(
+            'INSERT OR IGNORE INTO document_hashes (fan_id, hash, created_at) '
+            'VALUES (?, ?, ?)',
+            (fan_id, _to_bytes(image_hash), datetime.now().isoformat()))
+        if cursor.rowcount:
+            conn.executemany(
+                'INSERT INTO document_hash_chunks (chunk, value, hash_id) '
+                'VALUES (?, ?, ?)',
+                [(chunk, value, cursor.lastrowid)
+                 for chunk, value in enumerate(_split(image_hash))])
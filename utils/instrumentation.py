@@ -0,0 +1,174 @@
+import contextvars
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # OpenTelemetry é opcional
+    otel_trace = None
+
+# Amostras mantidas por etapa; as mais antigas são descartadas
+MAX_SAMPLES = 5000
+
+# Se definido, cada span é gravado como uma linha JSON neste arquivo
+TRACE_FILE = os.environ.get('KYF_TRACE_FILE')
+
+_lock = threading.Lock()
+_samples = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+_counters = defaultdict(int)
+_current_span = contextvars.ContextVar('kyf_current_span', default=None)
+_tracer = otel_trace.get_tracer('know-your-fan') if otel_trace else None
+
+
+def record_duration(stage, seconds):
+    """
+    Record one latency sample for a pipeline stage.
+
+    Args:
+        stage (str): Stage name, e.g. 'ocr.process_image'
+        seconds (float): Measured duration in seconds
+    """
+    with _lock:
+        _samples[stage].append(seconds)
+
+
+def increment(counter, amount=1):
+    """
+    Increment a named counter shown next to the latency table.
+
+    Args:
+        counter (str): Counter name
+        amount (int): Value to add
+    """
+    with _lock:
+        _counters[counter] += amount
+
+
+def _export_span(record):
+    line = json.dumps(record, default=str)
+    with _lock:
+        with open(TRACE_FILE, 'a') as f:
+            f.write(line + '\n')
+
+
+@contextmanager
+def span(stage, **attributes):
+    """
+    Time a block of code as a named stage.
+
+    The duration is always kept in the in-process latency store. When
+    OpenTelemetry is installed the block also runs inside an OTel span, and
+    when KYF_TRACE_FILE is set the span is appended to that file in an
+    OTLP-like JSON layout (trace/span/parent ids and unix-nano timestamps).
+
+    Args:
+        stage (str): Stage name
+        **attributes: Extra attributes attached to the exported span
+    """
+    parent = _current_span.get()
+    trace_id = parent['traceId'] if parent else secrets.token_hex(16)
+    record = {
+        'traceId': trace_id,
+        'spanId': secrets.token_hex(8),
+        'parentSpanId': parent['spanId'] if parent else None,
+        'name': stage,
+        'attributes': attributes,
+    }
+    token = _current_span.set(record)
+    otel_cm = _tracer.start_as_current_span(
+        stage, attributes=attributes) if _tracer else None
+    if otel_cm:
+        otel_cm.__enter__()
+
+    start_ns = time.time_ns()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield record
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        _current_span.reset(token)
+        if otel_cm:
+            otel_cm.__exit__(type(error) if error else None, error,
+                             error.__traceback__ if error else None)
+        record_duration(stage, elapsed)
+        if TRACE_FILE:
+            record['startTimeUnixNano'] = start_ns
+            record['endTimeUnixNano'] = start_ns + int(elapsed * 1e9)
+            record['status'] = 'ERROR' if error else 'OK'
+            _export_span(record)
+
+
+def timed(stage):
+    """
+    Decorator form of span() for hot-path functions.
+
+    Args:
+        stage (str): Stage name
+
+    Returns:
+        callable: Decorator
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def latency_summary():
+    """
+    Summarize the recorded samples per stage.
+
+    Returns:
+        pandas.DataFrame: One row per stage with count and p50/p95/p99/max in ms
+    """
+    with _lock:
+        snapshot = {stage: np.fromiter(values, dtype=float)
+                    for stage, values in _samples.items() if values}
+
+    rows = []
+    for stage, values in sorted(snapshot.items()):
+        p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+        rows.append({
+            'stage': stage,
+            'count': len(values),
+            'p50_ms': round(p50, 2),
+            'p95_ms': round(p95, 2),
+            'p99_ms': round(p99, 2),
+            'max_ms': round(values.max() * 1000, 2),
+        })
+    return pd.DataFrame(
+        rows, columns=['stage', 'count', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'])
+
+
+def counters():
+    """
+    Return a copy of the named counters.
+
+    Returns:
+        dict: Counter name to value
+    """
+    with _lock:
+        return dict(_counters)
+
+
+def reset():
+    """Discard all recorded samples and counters."""
+    with _lock:
+        _samples.clear()
+        _counters.clear()
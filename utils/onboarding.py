@@ -0,0 +1,217 @@
+from utils.activity_features import record_activity, update_features
+from utils.cpf_index import register_cpf
+from utils.data_visualization import engagement_features
+from utils.document_ocr import extract_document_text
+from utils.document_validator import (check_image_quality, find_document_type,
+                                      is_valid_cpf, to_grayscale,
+                                      validate_document)
+from utils.event_catalog import (load_event_index, record_attendance,
+                                  resolve_events)
+from utils.image_hash import (find_similar_documents, perceptual_hash,
+                              register_document_hash)
+from utils.pii_crypto import register_email
+from utils.profile_parsing import index_handles, profile_handles
+from utils.recommendations import load_indexes
+from utils.scoring import load_rules, record_features
+from utils.similarity_index import index_fan
+from utils.tenants import current_tenant, tenant_ids, use_tenant
+
+# Regras de cada etapa compartilhadas pelo app Streamlit (app.py) e pela API
+# HTTP (api.py), para que os dois caminhos validem os dados da mesma forma.
+
+REQUIRED_PERSONAL_FIELDS = ['name', 'email', 'cpf']
+
+# Opções dos formulários da etapa 2 do clube original (tenants/furia.json)
+GAMES_OPTIONS = [
+    "League of Legends", "Counter-Strike", "Valorant", "Dota 2", "Overwatch",
+    "Fortnite", "Rainbow Six Siege", "Rocket League", "Outro"
+]
+TEAMS_OPTIONS = [
+    "FURIA", "LOUD", "Team Liquid", "paiN Gaming", "Cloud9", "Fnatic",
+    "G2 Esports", "T1", "FaZe Clan", "Outro"
+]
+MERCH_OPTIONS = [
+    "Camisetas de Times", "Acessórios de Times", "Equipamentos de Gaming",
+    "Colecionáveis", "Nenhum"
+]
+
+
+def form_options():
+    """
+    Opções dos formulários da etapa 2 para o clube atual.
+    
+    Returns:
+        dict: games, teams e merchandise, como em tenants/<id>.json
+    """
+    tenant = current_tenant()
+    return {'games': tenant.games, 'teams': tenant.teams,
+            'merchandise': tenant.merchandise}
+
+
+def warm_up_tenants():
+    """
+    Carrega a configuração, os catálogos e as regras de todos os clubes.
+    
+    Chamada uma vez na inicialização, para que o primeiro fã de cada clube
+    não pague a montagem dos índices.
+    
+    Returns:
+        list: Clubes carregados
+    """
+    loaded = tenant_ids()
+    for tenant_id in loaded:
+        with use_tenant(tenant_id):
+            load_indexes()
+            load_event_index()
+            load_rules()
+    return loaded
+
+
+def check_personal_data(form_data, fan_id, previous_cpf=None):
+    """
+    Valida os dados pessoais da etapa 1 e registra o CPF do fã.
+    
+    Args:
+        form_data (dict): Dados do formulário de informações pessoais
+        fan_id (str): Identificador do fã
+        previous_cpf (str, optional): CPF salvo anteriormente pelo fã
+        
+    Returns:
+        str or None: Mensagem de erro, ou None se os dados foram aceitos
+    """
+    empty_fields = [
+        field for field in REQUIRED_PERSONAL_FIELDS if not form_data.get(field)
+    ]
+    if empty_fields:
+        return f"Por favor, preencha os seguintes campos obrigatórios: {', '.join(empty_fields)}"
+
+    if not is_valid_cpf(form_data['cpf']):
+        return "CPF inválido. Verifique os números digitados."
+
+    # Impedir que o mesmo CPF seja usado em mais de um perfil
+    is_registered, _ = register_cpf(form_data['cpf'], fan_id, previous_cpf)
+    if not is_registered:
+        return "Este CPF já está cadastrado em outro perfil de fã."
+
+    register_email(form_data['email'], fan_id)
+    return None
+
+
+def prepare_interests(form_data, fan_id):
+    """
+    Resolve os eventos frequentados da etapa 2 para o catálogo de eventos.
+    
+    O texto digitado é mantido para o formulário; os ids canônicos ficam em
+    'attended_event_ids' (sem repetições) e na tabela de presença usada
+    nas agregações por evento.
+    
+    Args:
+        form_data (dict): Dados do formulário de interesses
+        fan_id (str): Identificador do fã
+        
+    Returns:
+        dict: Os dados do formulário com os eventos resolvidos
+    """
+    event_ids, unmatched = resolve_events(form_data.get('attended_events', ''))
+    record_attendance(fan_id, event_ids)
+    return {**form_data, 'attended_event_ids': event_ids,
+            'unmatched_events': unmatched}
+
+
+def link_social_profiles(social_media, esports_profiles, fan_id):
+    """
+    Normaliza os perfis da etapa 4 e os registra no índice de usuários.
+    
+    Args:
+        social_media (dict): Seção 'social_media' do perfil
+        esports_profiles (dict): Seção 'esports_profiles' do perfil
+        fan_id (str): Identificador do fã
+        
+    Returns:
+        list: (plataforma, usuário) já vinculados a outros perfis de fã
+    """
+    return index_handles(fan_id, profile_handles(social_media, esports_profiles))
+
+
+def record_fan_scores(fan_id, interests, social_media, esports_profiles):
+    """
+    Guarda os vetores de características da etapa 4 e suas pontuações.
+    
+    Com as características guardadas, uma mudança de pesos em
+    catalog/scoring_rules.json é aplicada a todos os fãs por
+    `python -m utils.scoring`, sem analisar os perfis de novo. A atividade
+    semanal também é guardada, com as tendências e a previsão do fã
+    (utils/activity_features.py) calculadas na hora para o painel, e o
+    vetor do fã é inserido no índice de fãs parecidos
+    (utils/similarity_index.py), que a etapa 5 só consulta.
+    
+    Args:
+        fan_id (str): Identificador do fã
+        interests (dict): Seção 'interests' do perfil
+        social_media (dict): Seção 'social_media' do perfil
+        esports_profiles (dict): Seção 'esports_profiles' do perfil
+    """
+    features = {'engagement': engagement_features(
+        social_media.get('analysis') or {}, interests or {})}
+    relevance = esports_profiles.get('relevance') or {}
+    if 'features' in relevance:
+        features['relevance'] = relevance['features']
+    record_features(fan_id, features)
+    if record_activity(fan_id, (social_media.get('analysis') or {}).get('activity')):
+        update_features([fan_id])
+    index_fan(fan_id, {'interests': interests, 'social_media': social_media})
+
+
+def verify_document(image, personal_info, fan_id=None):
+    """
+    Executa o OCR de um documento e o valida contra os dados pessoais.
+    
+    Imagens escuras, estouradas, com reflexo ou desfocadas são recusadas
+    sem passar pelo OCR, e passaportes cuja MRZ não confere são recusados
+    sem cair para o OCR completo. Com o fan_id, o hash perceptual da imagem é
+    comparado com os documentos já verificados de outros fãs, e a mesma
+    foto usada em vários perfis é sinalizada em 'image_reused'. Só o hash
+    de um documento validado é registrado; fotos recusadas não ficam no
+    índice.
+    
+    Args:
+        image (numpy.ndarray): Imagem RGB preparada por prepare_document_image
+        personal_info (dict): Seção 'personal' do perfil
+        fan_id (str, optional): Identificador do fã que enviou a imagem
+        
+    Returns:
+        dict: Campos a gravar na seção 'documents' do perfil
+    """
+    gray = to_grayscale(image)
+
+    # Fotos que não podem ser lidas são recusadas antes do OCR
+    is_readable, quality_message = check_image_quality(gray)
+    if is_readable:
+        try:
+            extracted_text = extract_document_text(gray)
+            is_valid, validation_message = validate_document(extracted_text,
+                                                             personal_info)
+            document_type = find_document_type(extracted_text)
+        except ValueError as e:
+            # Passaporte com a MRZ recusada: não é validado pelo texto livre
+            is_valid, validation_message = False, str(e)
+            document_type = "Passport"
+    else:
+        is_valid, validation_message = False, quality_message
+        document_type = "Unknown"
+
+    result = {
+        'id_validated': is_valid,
+        'id_validation_message': validation_message,
+        'id_document_type': document_type,
+    }
+
+    if fan_id:
+        image_hash = perceptual_hash(gray)
+        matches = find_similar_documents(image_hash, exclude_fan_id=fan_id)
+        if is_valid:
+            register_document_hash(image_hash, fan_id)
+        # Apenas a contagem: os outros perfis não são expostos ao fã
+        result['image_reused'] = bool(matches)
+        result['image_reuse_count'] = len({match for match, _ in matches})
+    return result
@@ -0,0 +1,362 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: apenas um processo rotaciona as chaves
+    fcntl = None
+
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:  # só aceito com KYF_PII_ENCRYPTION=0 (ver abaixo)
+    AESGCM = None
+
+from utils.storage import connect, data_path, load_secret
+from utils.tenants import tenant_cache
+
+# Campos sensíveis de cada seção, guardados juntos em um envelope cifrado
+ENCRYPTED_FIELDS = {
+    'personal': ('cpf', 'email', 'phone', 'address', 'birth_date'),
+}
+
+# Campo da seção que guarda o envelope
+ENCRYPTED_KEY = '_encrypted'
+
+# Sempre ligada; KYF_PII_ENCRYPTION=0 é a única forma de gravar os campos em
+# texto puro. Sem o pacote cryptography a importação falha, em vez de gravar
+# os dados pessoais sem criptografia em silêncio
+ENCRYPTION_ENABLED = os.environ.get('KYF_PII_ENCRYPTION', '1') != '0'
+if ENCRYPTION_ENABLED and AESGCM is None:
+    raise RuntimeError(
+        "A criptografia dos dados pessoais exige o pacote cryptography; "
+        "instale-o ou defina KYF_PII_ENCRYPTION=0 para gravar em texto puro.")
+
+_TOKEN_PREFIX = 'v1:'
+_NONCE_SIZE = 12
+
+_keyring_thread_lock = threading.Lock()
+
+
+def _require_crypto():
+    if AESGCM is None:
+        raise RuntimeError(
+            "Perfis criptografados exigem o pacote cryptography.")
+
+
+def _keyring_path():
+    return data_path('secrets', 'pii_keys.json')
+
+
+@contextmanager
+def _keyring_lock(path):
+    # flock só exclui outros processos; entre threads, o lock local
+    with _keyring_thread_lock:
+        fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # fechar libera o flock
+
+
+def _wrap(kek, key_id, data_key):
+    nonce = secrets.token_bytes(_NONCE_SIZE)
+    return (nonce + AESGCM(kek).encrypt(nonce, data_key, key_id.encode())).hex()
+
+
+def _create_keyring(path):
+    key_id = 'k1'
+    keyring = {'active': key_id,
+               'keys': {key_id: _wrap(load_secret('pii_kek'), key_id,
+                                      AESGCM.generate_key(bit_length=256))}}
+    # Gravado ao lado e publicado com link(), que falha se o chaveiro já
+    # existe: quem o encontra sempre o lê completo
+    tmp = f"{path}.{os.getpid()}.{secrets.token_hex(4)}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(keyring, f)
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        os.link(tmp, path)
+    except FileExistsError:
+        pass  # Outra thread ou processo criou o chaveiro ao mesmo tempo
+    finally:
+        os.remove(tmp)
+
+
+@tenant_cache(maxsize=4)
+def _load_keyring(path, mtime):
+    with open(path) as f:
+        keyring = json.load(f)
+    kek = AESGCM(load_secret('pii_kek'))
+    ciphers = {}
+    for key_id, wrapped in keyring['keys'].items():
+        raw = bytes.fromhex(wrapped)
+        data_key = kek.decrypt(raw[:_NONCE_SIZE], raw[_NONCE_SIZE:], key_id.encode())
+        ciphers[key_id] = AESGCM(data_key)
+    return keyring['active'], ciphers
+
+
+def data_keys():
+    """
+    Carrega as chaves de dados, desembrulhadas com a chave mestra local.
+
+    As chaves de dados (AES-256) ficam embrulhadas pela chave mestra
+    'pii_kek' (load_secret) em secrets/pii_keys.json; o chaveiro só é relido
+    quando o arquivo muda (ex.: após rotate_data_key).
+
+    Returns:
+        tuple: (id da chave ativa, id para o objeto AESGCM de cada chave)
+    """
+    _require_crypto()
+    path = _keyring_path()
+    if not os.path.exists(path):
+        _create_keyring(path)
+    return _load_keyring(path, os.path.getmtime(path))
+
+
+def rotate_data_key():
+    """
+    Cria uma nova chave de dados e a torna ativa.
+
+    As chaves antigas continuam no chaveiro para decifrar o que já foi
+    gravado; cada seção passa para a chave nova quando é gravada de novo.
+
+    Returns:
+        str: Id da nova chave
+    """
+    data_keys()
+    path = _keyring_path()
+    # Rotações simultâneas são serializadas: cada uma relê o chaveiro já
+    # com a chave da anterior, e nenhuma chave em uso é perdida
+    with _keyring_lock(path):
+        with open(path) as f:
+            keyring = json.load(f)
+        key_id = f"k{secrets.token_hex(4)}"
+        while key_id in keyring['keys']:
+            key_id = f"k{secrets.token_hex(4)}"
+        keyring['keys'][key_id] = _wrap(load_secret('pii_kek'), key_id,
+                                        AESGCM.generate_key(bit_length=256))
+        keyring['active'] = key_id
+        tmp = f"{path}.{os.getpid()}.{secrets.token_hex(4)}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(keyring, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+    return key_id
+
+
+def _aad(fan_id, section):
+    # O envelope só decifra no mesmo fã e na mesma seção
+    return f"{fan_id}:{section}".encode()
+
+
+def encrypt_section(fan_id, section, data):
+    """
+    Cifra os campos sensíveis de uma seção antes da gravação.
+
+    Os campos de ENCRYPTED_FIELDS saem da seção e vão juntos para um único
+    envelope AES-GCM (uma operação por seção, não uma por campo).
+
+    Args:
+        fan_id (str): Identificador do fã
+        section (str): Nome da seção
+        data (dict): Dados da seção em texto puro
+
+    Returns:
+        dict: Seção com os campos sensíveis no envelope ENCRYPTED_KEY
+    """
+    fields = ENCRYPTED_FIELDS.get(section)
+    if not ENCRYPTION_ENABLED or not fields or not data:
+        return data
+    sensitive = {field: data[field] for field in fields if field in data}
+    if not sensitive:
+        return data
+
+    key_id, ciphers = data_keys()
+    nonce = secrets.token_bytes(_NONCE_SIZE)
+    sealed = ciphers[key_id].encrypt(
+        nonce, json.dumps(sensitive).encode(), _aad(fan_id, section))
+    stored = {field: value for field, value in data.items() if field not in sensitive}
+    stored[ENCRYPTED_KEY] = (f"{_TOKEN_PREFIX}{key_id}:" +
+                             base64.b64encode(nonce + sealed).decode())
+    return stored
+
+
+def decrypt_tokens(tokens, fan_ids, section):
+    """
+    Decifra em lote os envelopes de uma coluna (ex.: exportação em massa).
+
+    As chaves são carregadas uma vez para o lote inteiro.
+
+    Args:
+        tokens (iterable): Envelopes (ou None para linhas sem envelope)
+        fan_ids (iterable): fan_id de cada linha, na mesma ordem
+        section (str): Nome da seção
+
+    Returns:
+        list: Dicionário de campos sensíveis de cada linha ({} sem envelope)
+    """
+    ciphers = None
+    plaintexts = []
+    for token, fan_id in zip(tokens, fan_ids):
+        if not isinstance(token, str):
+            plaintexts.append(b'{}')
+            continue
+        if ciphers is None:
+            ciphers = data_keys()[1]
+        key_id, _, blob = token[len(_TOKEN_PREFIX):].partition(':')
+        raw = binascii.a2b_base64(blob)
+        plaintexts.append(ciphers[key_id].decrypt(
+            raw[:_NONCE_SIZE], raw[_NONCE_SIZE:], _aad(fan_id, section)))
+    # Um único json.loads para o lote inteiro
+    return json.loads(b'[' + b','.join(plaintexts) + b']')
+
+
+def decrypt_section(fan_id, section, data):
+    """
+    Devolve uma seção lida do armazenamento com os campos em texto puro.
+
+    Args:
+        fan_id (str): Identificador do fã
+        section (str): Nome da seção
+        data (dict): Seção como gravada (com ou sem envelope)
+
+    Returns:
+        dict: Seção decifrada
+    """
+    if ENCRYPTED_KEY not in data:
+        return data
+    stored = dict(data)
+    token = stored.pop(ENCRYPTED_KEY)
+    stored.update(decrypt_tokens([token], [fan_id], section)[0])
+    return stored
+
+
+def decrypt_rows(rows, fan_ids, section):
+    """
+    Decifra as seções de uma exportação em massa.
+
+    A coluna de envelopes é decifrada de uma vez (decrypt_tokens) e os
+    campos voltam para as linhas antes de o DataFrame ser montado.
+
+    Args:
+        rows (list): Seções como gravadas, uma por fã
+        fan_ids (list): fan_id de cada linha, na mesma ordem
+        section (str): Nome da seção
+
+    Returns:
+        list: As mesmas linhas, com os campos sensíveis em texto puro
+    """
+    tokens = [row.pop(ENCRYPTED_KEY, None) for row in rows]
+    if any(tokens):
+        for row, fields in zip(rows, decrypt_tokens(tokens, fan_ids, section)):
+            row.update(fields)
+    return rows
+
+
+@tenant_cache(maxsize=8)
+def _index_key(field):
+    return load_secret(f"{field}_index")
+
+
+def normalize_email(email):
+    """
+    Normaliza um e-mail para o índice cego (sem espaços, minúsculo).
+
+    Args:
+        email (str): E-mail informado
+
+    Returns:
+        str: E-mail normalizado
+    """
+    return email.strip().lower()
+
+
+def blind_index(field, value):
+    """
+    Calcula o índice cego de um valor já normalizado.
+
+    É um HMAC-SHA256 determinístico com uma chave local por campo
+    ('<campo>_index'), permitindo buscas por igualdade sem decifrar os
+    perfis; sem a chave, o hash não pode ser revertido por força bruta.
+
+    Args:
+        field (str): Nome do campo ('cpf' ou 'email')
+        value (str): Valor normalizado
+
+    Returns:
+        bytes: Hash de 32 bytes
+    """
+    return hmac.new(_index_key(field), value.encode(), hashlib.sha256).digest()
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS email_index (
+    email_hash BLOB NOT NULL,
+    fan_id TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (email_hash, fan_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS email_index_fan ON email_index (fan_id);
+"""
+
+
+def _db():
+    conn = connect('email_index')
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def register_email(email, fan_id):
+    """
+    Registra o e-mail do fã no índice cego, substituindo o anterior.
+
+    Args:
+        email (str): E-mail informado no cadastro
+        fan_id (str): Identificador do fã
+    """
+    conn = _db()
+    with conn:
+        conn.execute('BEGIN')
+        conn.execute('DELETE FROM email_index WHERE fan_id = ?', (fan_id,))
+        conn.execute(
+            'INSERT INTO email_index (email_hash, fan_id, created_at) VALUES (?, ?, ?)',
+            (blind_index('email', normalize_email(email)), fan_id,
+             datetime.now().isoformat()))
+
+
+def find_fans_by_email(email):
+    """
+    Procura os fãs que informaram o e-mail, sem decifrar perfis.
+
+    Args:
+        email (str): E-mail procurado
+
+    Returns:
+        list: fan_ids com o e-mail
+    """
+    return [row[0] for row in _db().execute(
+        'SELECT fan_id FROM email_index WHERE email_hash = ?',
+        (blind_index('email', normalize_email(email)),))]
+
+
+if __name__ == '__main__':
+    # Rotação da chave de dados: python -m utils.pii_crypto
+    print(f"Nova chave de dados ativa: {rotate_data_key()}")
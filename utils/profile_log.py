@@ -0,0 +1,358 @@
+import glob
+import json
+import os
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: apenas um processo grava no log
+    fcntl = None
+
+from utils.instrumentation import increment, timed
+from utils import storage
+
+# Tamanho a partir do qual o segmento atual é fechado e um novo é aberto
+SEGMENT_BYTES = int(os.environ.get('KYF_LOG_SEGMENT_BYTES', 16 * 1024 * 1024))
+
+# Espera do líder antes de gravar, para reunir mais registros em um fsync
+COMMIT_WINDOW = float(os.environ.get('KYF_LOG_COMMIT_WINDOW_MS', '0')) / 1000
+
+# Registros gravados (por processo) entre compactações automáticas
+COMPACT_EVERY = 1000
+
+# Cabeçalho de cada registro: tamanho e crc32 do payload
+_HEADER = struct.Struct('<II')
+
+
+def log_dir():
+    """
+    Diretório do log dentro do diretório de dados do clube atual.
+
+    Returns:
+        str: storage.data_dir()/profile_log
+    """
+    return os.path.join(storage.data_dir(), 'profile_log')
+
+
+def _encode(entry):
+    payload = json.dumps(entry, separators=(',', ':')).encode()
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _segment_path(directory, number):
+    return os.path.join(directory, f"{number:08d}.log")
+
+
+def _segments(directory):
+    return sorted(int(os.path.basename(path)[:-4])
+                  for path in glob.glob(os.path.join(directory, '*.log')))
+
+
+def _read_segment(path, offset=0):
+    """
+    Lê os registros de um segmento a partir de `offset`.
+
+    Para no primeiro registro incompleto ou com crc inválido (fim do log ou
+    gravação interrompida).
+
+    Yields:
+        tuple: (offset do fim do registro, registro)
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while True:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            size, crc = _HEADER.unpack(header)
+            payload = f.read(size)
+            if len(payload) < size or zlib.crc32(payload) != crc:
+                return
+            offset += _HEADER.size + size
+            yield offset, json.loads(payload)
+
+
+def _write_json(path, data):
+    # Troca atômica: grava ao lado, sincroniza e renomeia
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _read_json(path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def read_changes(position=(0, 0), limit=None, directory=None):
+    """
+    Lê as gravações de perfil feitas depois de `position`, em ordem.
+
+    Args:
+        position (tuple): (segmento, offset) do último registro já lido
+        limit (int): Máximo de registros, ou None para todos
+        directory (str): Diretório do log (padrão: log_dir())
+
+    Returns:
+        list: (posição, registro) com fan_id, sections (seção para JSON)
+            e ts; a posição do último item é o próximo cursor
+    """
+    directory = directory or log_dir()
+    segment, offset = position
+    changes = []
+    for number in _segments(directory):
+        if number < segment:
+            continue
+        start = offset if number == segment else 0
+        for end, entry in _read_segment(_segment_path(directory, number), start):
+            changes.append(((number, end), entry))
+            if limit is not None and len(changes) >= limit:
+                return changes
+    return changes
+
+
+class ChangeFeed:
+    """
+    Consumidor nomeado do log, com o cursor persistido em disco.
+
+    Os segmentos só são apagados pela compactação depois que todos os
+    consumidores registrados passaram por eles.
+    """
+
+    def __init__(self, name, directory=None):
+        self.name = name
+        self.directory = directory or log_dir()
+        self._path = os.path.join(self.directory, 'cursors', f"{name}.json")
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        if not os.path.exists(self._path):
+            self.commit(tuple(_read_json(
+                os.path.join(self.directory, 'checkpoint.json'), (0, 0))))
+
+    @property
+    def position(self):
+        return tuple(_read_json(self._path, (0, 0)))
+
+    def poll(self, limit=500):
+        """
+        Lê as próximas alterações sem avançar o cursor.
+
+        Args:
+            limit (int): Máximo de registros
+
+        Returns:
+            list: (posição, registro), como em read_changes
+        """
+        return read_changes(self.position, limit, self.directory)
+
+    def commit(self, position):
+        """
+        Avança o cursor depois que as alterações foram processadas.
+
+        Args:
+            position (tuple): Posição do último registro processado
+        """
+        _write_json(self._path, list(position))
+
+
+class ProfileLog:
+    """
+    Log de gravações de perfil em segmentos só de acréscimo.
+
+    Cada gravação vira um registro com crc32 no segmento atual. As threads
+    que gravam ao mesmo tempo são agrupadas: uma delas (a líder) grava o
+    lote inteiro com um único fsync e aplica o lote ao armazenamento de
+    perfis; as outras esperam o lote ficar durável. Entre processos, o
+    arquivo LOCK serializa as gravações.
+
+    O armazenamento de perfis é a forma compactada do log: a compactação
+    torna o armazenamento durável, avança o checkpoint e apaga os segmentos
+    que já foram lidos por todos os ChangeFeed. Depois de uma queda,
+    recover() reaplica os registros posteriores ao checkpoint.
+    """
+
+    def __init__(self, apply, sync=None, directory=None):
+        """
+        Args:
+            apply (callable): Recebe uma lista de (fan_id, sections) e grava
+                no armazenamento de perfis, na ordem
+            sync (callable): Torna o armazenamento durável antes de o
+                checkpoint avançar, ou None
+            directory (str): Diretório dos segmentos (padrão: log_dir())
+        """
+        self.directory = directory = directory or log_dir()
+        os.makedirs(os.path.join(directory, 'cursors'), exist_ok=True)
+        self._apply = apply
+        self._sync = sync
+        self._thread_lock = threading.Lock()
+        self._lock_fd = os.open(os.path.join(directory, 'LOCK'),
+                                os.O_RDWR | os.O_CREAT, 0o644)
+        self._cond = threading.Condition()
+        self._pending = []
+        self._leading = False
+        self._since_compact = 0
+
+    @contextmanager
+    def _file_lock(self):
+        # flock só exclui outros processos; entre threads, o lock local
+        with self._thread_lock:
+            if fcntl is not None:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _current_segment(self):
+        segments = _segments(self.directory)
+        return segments[-1] if segments else 1
+
+    def _fsync_directory(self):
+        if hasattr(os, 'O_DIRECTORY'):
+            fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def append(self, fan_id, sections):
+        """
+        Grava seções de um perfil e espera o registro ficar durável.
+
+        Args:
+            fan_id (str): Identificador do fã
+            sections (dict): Seção para seus dados já em JSON
+        """
+        entry = {'fan_id': fan_id, 'sections': sections,
+                 'ts': datetime.now().isoformat()}
+        item = {'record': _encode(entry), 'entry': entry,
+                'done': False, 'error': None}
+        with self._cond:
+            self._pending.append(item)
+            while not item['done']:
+                if self._leading:
+                    self._cond.wait()
+                    continue
+                self._leading = True
+                if COMMIT_WINDOW:
+                    self._cond.wait(COMMIT_WINDOW)
+                batch, self._pending = self._pending, []
+                error = None
+                self._cond.release()
+                try:
+                    self._commit(batch)
+                except Exception as e:
+                    error = e
+                finally:
+                    self._cond.acquire()
+                    for queued in batch:
+                        queued['done'] = True
+                        queued['error'] = error
+                    self._leading = False
+                    self._cond.notify_all()
+        if item['error'] is not None:
+            raise item['error']
+
+    @timed('profile_log.commit')
+    def _commit(self, batch):
+        data = b''.join(item['record'] for item in batch)
+        with self._file_lock():
+            segment = self._current_segment()
+            path = _segment_path(self.directory, segment)
+            created = not os.path.exists(path)
+            with open(path, 'ab') as f:
+                start = f.tell()
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+                size = f.tell()
+                if created:
+                    self._fsync_directory()
+                try:
+                    self._apply([(item['entry']['fan_id'],
+                                  item['entry']['sections']) for item in batch])
+                except Exception:
+                    # O log só guarda o que chegou ao armazenamento
+                    f.truncate(start)
+                    os.fsync(f.fileno())
+                    raise
+            if size >= SEGMENT_BYTES:
+                # Abre o próximo segmento; o atual fica selado
+                open(_segment_path(self.directory, segment + 1), 'ab').close()
+                self._fsync_directory()
+        increment('profile_log.fsyncs')
+        increment('profile_log.records', len(batch))
+
+        self._since_compact += len(batch)
+        if self._since_compact >= COMPACT_EVERY:
+            self._since_compact = 0
+            self.compact()
+
+    def _checkpoint(self):
+        return tuple(_read_json(
+            os.path.join(self.directory, 'checkpoint.json'), (0, 0)))
+
+    @timed('profile_log.recover')
+    def recover(self):
+        """
+        Reaplica ao armazenamento os registros posteriores ao checkpoint e
+        descarta um registro final incompleto (gravação interrompida).
+
+        Returns:
+            int: Número de registros reaplicados
+        """
+        with self._file_lock():
+            path = _segment_path(self.directory, self._current_segment())
+            if os.path.exists(path):
+                end = 0
+                for end, _ in _read_segment(path):
+                    pass
+                if os.path.getsize(path) > end:
+                    increment('profile_log.torn_tail')
+                    with open(path, 'r+b') as f:
+                        f.truncate(end)
+                        os.fsync(f.fileno())
+            changes = read_changes(self._checkpoint(), directory=self.directory)
+            if changes:
+                self._apply([(entry['fan_id'], entry['sections'])
+                             for _, entry in changes])
+        return len(changes)
+
+    @timed('profile_log.compact')
+    def compact(self):
+        """
+        Avança o checkpoint até o fim do log e apaga os segmentos antigos.
+
+        Returns:
+            int: Número de segmentos apagados
+        """
+        with self._file_lock():
+            segment = self._current_segment()
+            path = _segment_path(self.directory, segment)
+            position = (segment, os.path.getsize(path) if os.path.exists(path) else 0)
+            if self._sync is not None:
+                self._sync()
+            _write_json(os.path.join(self.directory, 'checkpoint.json'),
+                        list(position))
+
+            # Um segmento só sai quando todos os consumidores passaram dele
+            cursors = [tuple(_read_json(path, (0, 0))) for path in glob.glob(
+                os.path.join(self.directory, 'cursors', '*.json'))]
+            oldest = min([segment] + [cursor[0] for cursor in cursors])
+            removed = 0
+            for number in _segments(self.directory):
+                if number < oldest:
+                    os.remove(_segment_path(self.directory, number))
+                    removed += 1
+        increment('profile_log.compactions')
+        return removed
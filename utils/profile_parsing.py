@@ -0,0 +1,299 @@
+import re
+from datetime import datetime
+
+import pandas as pd
+
+from utils.storage import connect
+
+# Um padrão por plataforma, compilado uma vez. Cada um aceita a URL do perfil
+# (com ou sem https://, www., barra final, query string) ou só o usuário,
+# com ou sem @, e captura o usuário no grupo 'handle'.
+_URL_TAIL = r'/?(?:[?#].*)?$'
+
+PROFILE_PATTERNS = {
+    'twitch': re.compile(
+        r'^(?:(?:https?://)?(?:www\.|m\.)?twitch\.tv/)?@?'
+        r'(?P<handle>[A-Za-z0-9_]{3,25})' + _URL_TAIL, re.IGNORECASE),
+    'twitter': re.compile(
+        r'^(?:(?:https?://)?(?:www\.|mobile\.)?(?:twitter|x)\.com/)?@?'
+        r'(?P<handle>[A-Za-z0-9_]{1,15})' + _URL_TAIL, re.IGNORECASE),
+    'instagram': re.compile(
+        r'^(?:(?:https?://)?(?:www\.)?instagram\.com/)?@?'
+        r'(?P<handle>[A-Za-z0-9._]{1,30})' + _URL_TAIL, re.IGNORECASE),
+    'facebook': re.compile(
+        r'^(?:(?:https?://)?(?:www\.|m\.|web\.)?(?:facebook|fb)\.com/)?'
+        r'(?:profile\.php\?id=(?P<id>\d{5,20})|(?P<handle>[A-Za-z0-9.]{5,50}))'
+        r'/?(?:[?#&].*)?$', re.IGNORECASE),
+    'steam': re.compile(
+        r'^(?:(?:https?://)?(?:www\.)?steamcommunity\.com/)?'
+        r'(?:(?P<kind>id|profiles)/)?(?P<handle>[A-Za-z0-9_-]{2,32})' + _URL_TAIL,
+        re.IGNORECASE),
+    'discord': re.compile(
+        r'^@?(?P<handle>[A-Za-z0-9_.]{2,32}(?:#\d{4})?)$', re.IGNORECASE),
+}
+
+# Domínio de cada plataforma, para classificar uma URL sem testar uma por uma
+PLATFORM_HOSTS = {
+    'twitch.tv': 'twitch',
+    'twitter.com': 'twitter',
+    'x.com': 'twitter',
+    'instagram.com': 'instagram',
+    'facebook.com': 'facebook',
+    'fb.com': 'facebook',
+    'steamcommunity.com': 'steam',
+    'discord.gg': 'discord',
+    'discord.com': 'discord',
+}
+
+# Caminhos dos sites que não são perfis (ex.: twitter.com/home)
+RESERVED_PATHS = {
+    'twitch': {'directory', 'videos', 'settings', 'search', 'p'},
+    'twitter': {'home', 'i', 'intent', 'search', 'share', 'explore',
+                'settings', 'login', 'notifications', 'messages'},
+    'instagram': {'p', 'reel', 'reels', 'explore', 'stories', 'accounts', 'direct'},
+    'facebook': {'pages', 'groups', 'watch', 'events', 'marketplace',
+                 'profile.php', 'login', 'sharer'},
+    'steam': {'app', 'market', 'groups'},
+    'discord': set(),
+}
+
+# SteamID64 numérico (perfis sem URL personalizada)
+_STEAM_ID64 = re.compile(r'^7656119\d{10}$')
+
+_HOST = re.compile(r'^(?:https?://)?(?:www\.|m\.|mobile\.|web\.)?([^/?#]+)',
+                   re.IGNORECASE)
+
+# Linhas "Plataforma: Usuário" do campo de outras plataformas
+_OTHER_PLATFORM_LINE = re.compile(r'^\s*(?P<platform>[^:\n]{2,30}?)\s*[:\-=]\s*(?P<handle>\S.*?)\s*$')
+
+OTHER_PLATFORM_ALIASES = {
+    'psn': 'playstation', 'playstation': 'playstation',
+    'playstation network': 'playstation', 'ps': 'playstation',
+    'xbox': 'xbox', 'xbox live': 'xbox', 'gamertag': 'xbox',
+    'epic': 'epic', 'epic games': 'epic',
+    'battle.net': 'battlenet', 'battlenet': 'battlenet', 'blizzard': 'battlenet',
+    'riot': 'riot', 'riot games': 'riot', 'riot id': 'riot',
+    'faceit': 'faceit', 'gamersclub': 'gamersclub', 'gc': 'gamersclub',
+    'nintendo': 'nintendo', 'switch': 'nintendo',
+    'youtube': 'youtube', 'kick': 'kick', 'tiktok': 'tiktok',
+}
+
+
+def detect_platform(value):
+    """
+    Identify the platform of a profile URL from its host name.
+
+    Args:
+        value (str): Profile URL
+
+    Returns:
+        str or None: Platform key (see PROFILE_PATTERNS), or None
+    """
+    match = _HOST.match((value or '').strip())
+    if not match or '.' not in match.group(1):
+        return None
+    host = match.group(1).lower()
+    return PLATFORM_HOSTS.get(host)
+
+
+def _canonical(platform, handle, kind=None, facebook_id=None):
+    if platform == 'facebook' and facebook_id:
+        return f"id:{facebook_id}"
+    if not handle or handle.lower() in RESERVED_PATHS[platform]:
+        return None
+    if platform == 'steam':
+        if _STEAM_ID64.match(handle):
+            return f"profiles:{handle}"
+        if kind and kind.lower() == 'profiles':
+            return None
+        return f"id:{handle.lower()}"
+    return handle.lower()
+
+
+def parse_profile(platform, value):
+    """
+    Normalize a profile URL or handle typed in the step-4 form.
+
+    Args:
+        platform (str): Platform key (see PROFILE_PATTERNS)
+        value (str): URL or handle as typed
+
+    Returns:
+        str or None: Canonical handle (lowercase; Steam as 'id:<vanity>' or
+            'profiles:<steamid64>', Facebook numeric ids as 'id:<n>'), or
+            None if the value is not a valid profile of that platform
+    """
+    value = (value or '').strip()
+    if not value:
+        return None
+    detected = detect_platform(value)
+    if detected and detected != platform:
+        return None
+    match = PROFILE_PATTERNS[platform].match(value)
+    if not match:
+        return None
+    groups = match.groupdict()
+    return _canonical(platform, groups.get('handle'), groups.get('kind'),
+                      groups.get('id'))
+
+
+def parse_other_platforms(text):
+    """
+    Parse the "Plataforma: Usuário" lines of the other platforms field.
+
+    Args:
+        text (str): Raw text, one platform per line
+
+    Returns:
+        list: Dicts with 'platform' (normalized name) and 'handle', without
+            repeated (platform, handle) pairs
+    """
+    profiles, seen = [], set()
+    for line in (text or '').split('\n'):
+        match = _OTHER_PLATFORM_LINE.match(line)
+        if not match:
+            continue
+        name = match.group('platform').strip().lower()
+        platform = OTHER_PLATFORM_ALIASES.get(name, name)
+        if platform in PROFILE_PATTERNS:
+            handle = parse_profile(platform, match.group('handle'))
+        else:
+            handle = match.group('handle').lstrip('@').lower() or None
+        if handle and (platform, handle) not in seen:
+            seen.add((platform, handle))
+            profiles.append({'platform': platform, 'handle': handle})
+    return profiles
+
+
+def normalize_series(values, platform):
+    """
+    Normalize a column of stored profile values in bulk.
+
+    Uses the same compiled pattern as parse_profile, through pandas'
+    vectorized string methods, to re-normalize many profiles at once.
+
+    Args:
+        values (pandas.Series): URLs or handles as typed
+        platform (str): Platform key (see PROFILE_PATTERNS)
+
+    Returns:
+        pandas.Series: Canonical handles (None where the value is invalid)
+    """
+    values = values.fillna('').astype(str).str.strip()
+    parts = values.str.extract(PROFILE_PATTERNS[platform])
+    handles = parts['handle'].str.lower()
+
+    # URLs de outra plataforma não são perfis desta
+    hosts = values.str.extract(_HOST)[0].str.lower()
+    other_host = hosts.isin(
+        [host for host, name in PLATFORM_HOSTS.items() if name != platform])
+    handles = handles.where(~other_host & ~handles.isin(RESERVED_PATHS[platform]))
+
+    if platform == 'steam':
+        is_id64 = parts['handle'].str.match(_STEAM_ID64.pattern, na=False)
+        is_profiles = parts['kind'].str.lower().eq('profiles')
+        handles = ('id:' + handles).where(~is_profiles)
+        handles = ('profiles:' + parts['handle']).where(is_id64, handles)
+    elif platform == 'facebook':
+        handles = ('id:' + parts['id']).where(parts['id'].notna(), handles)
+
+    return handles.astype(object).where(handles.notna(), None)
+
+
+def profile_handles(social_media, esports_profiles):
+    """
+    Collect the canonical handles of a fan's step-4 profiles.
+
+    Args:
+        social_media (dict): The 'social_media' profile section
+        esports_profiles (dict): The 'esports_profiles' profile section
+
+    Returns:
+        dict: Platform key to a list of canonical handles
+    """
+    fields = {
+        'twitter': social_media.get('twitter_username'),
+        'instagram': social_media.get('instagram_username'),
+        'facebook': social_media.get('facebook_profile'),
+        'discord': social_media.get('discord_username'),
+        'twitch': esports_profiles.get('twitch_username'),
+        'steam': esports_profiles.get('steam_profile'),
+    }
+    handles = {}
+    for platform, value in fields.items():
+        handle = parse_profile(platform, value)
+        if handle:
+            handles.setdefault(platform, []).append(handle)
+    for profile in parse_other_platforms(esports_profiles.get('other_platforms')):
+        platform_handles = handles.setdefault(profile['platform'], [])
+        if profile['handle'] not in platform_handles:
+            platform_handles.append(profile['handle'])
+    return handles
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profile_handles (
+    platform TEXT NOT NULL,
+    handle TEXT NOT NULL,
+    fan_id TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (platform, handle, fan_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS profile_handles_fan ON profile_handles (fan_id);
+"""
+
+
+def _db():
+    conn = connect('profile_handles')
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def index_handles(fan_id, handles):
+    """
+    Replace the handles indexed for a fan.
+
+    Args:
+        fan_id (str): Fan identifier
+        handles (dict): Output of profile_handles
+
+    Returns:
+        list: (platform, handle) pairs also linked to other fans
+    """
+    rows = [(platform, handle) for platform, values in handles.items()
+            for handle in values]
+    conn = _db()
+    now = datetime.now().isoformat()
+    with conn:
+        conn.execute('BEGIN')
+        conn.execute('DELETE FROM profile_handles WHERE fan_id = ?', (fan_id,))
+        conn.executemany(
+            'INSERT INTO profile_handles (platform, handle, fan_id, created_at) '
+            'VALUES (?, ?, ?, ?)',
+            [(platform, handle, fan_id, now) for platform, handle in rows])
+    return [(platform, handle) for platform, handle in rows
+            if any(other != fan_id for other in _fans_with(conn, platform, handle))]
+
+
+def _fans_with(conn, platform, handle):
+    return [row[0] for row in conn.execute(
+        'SELECT fan_id FROM profile_handles WHERE platform = ? AND handle = ?',
+        (platform, handle))]
+
+
+def find_fans_by_handle(platform, value):
+    """
+    Look up the fans linked to a profile.
+
+    Args:
+        platform (str): Platform key
+        value (str): URL or handle, in any accepted format
+
+    Returns:
+        list: fan_ids linked to the profile
+    """
+    handle = (parse_profile(platform, value)
+              if platform in PROFILE_PATTERNS else value.lstrip('@').lower())
+    if not handle:
+        return []
+    return _fans_with(_db(), platform, handle)
@@ -0,0 +1,300 @@
+import json
+import os
+from datetime import datetime
+from functools import lru_cache
+
+import pandas as pd
+
+from utils.pii_crypto import decrypt_rows, decrypt_section, encrypt_section
+from utils.profile_log import ProfileLog
+from utils.storage import connect
+from utils.tenants import ROOT_TENANT, current_tenant_id
+
+# Seções do perfil de fã, na ordem das etapas do onboarding
+PROFILE_SECTIONS = ('personal', 'interests', 'documents', 'social_media',
+                    'esports_profiles')
+
+# Backend de armazenamento: 'sqlite' (padrão, arquivo local em KYF_DATA_DIR)
+# ou 'redis' (qualquer servidor compatível com Redis em KYF_REDIS_URL)
+PROFILE_BACKEND = os.environ.get('KYF_PROFILE_BACKEND', 'sqlite')
+REDIS_URL = os.environ.get('KYF_REDIS_URL', 'redis://localhost:6379/0')
+
+# Com o log ligado (padrão), cada gravação passa antes pelo log de
+# utils/profile_log.py; KYF_PROFILE_LOG=0 grava direto no backend
+PROFILE_LOG = os.environ.get('KYF_PROFILE_LOG', '1') != '0'
+
+
+class SQLiteProfileBackend:
+    """Perfis em uma tabela SQLite, uma linha por (fã, seção)."""
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS profile_sections (
+        fan_id TEXT NOT NULL,
+        section TEXT NOT NULL,
+        data TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        PRIMARY KEY (fan_id, section)
+    ) WITHOUT ROWID
+    """
+
+    def _db(self):
+        conn = connect('profiles')
+        conn.execute(self._SCHEMA)
+        return conn
+
+    def load_sections(self, fan_id, sections):
+        placeholders = ', '.join('?' * len(sections))
+        rows = self._db().execute(
+            f'SELECT section, data FROM profile_sections '
+            f'WHERE fan_id = ? AND section IN ({placeholders})',
+            (fan_id, *sections))
+        return {section: data for section, data in rows}
+
+    def load_many(self, section, fan_ids=None):
+        if fan_ids is None:
+            rows = self._db().execute(
+                'SELECT fan_id, data FROM profile_sections WHERE section = ?',
+                (section,))
+            return dict(rows)
+        stored = {}
+        fan_ids = list(fan_ids)
+        # Limite de parâmetros por consulta do SQLite
+        for start in range(0, len(fan_ids), 500):
+            chunk = fan_ids[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            stored.update(self._db().execute(
+                f'SELECT fan_id, data FROM profile_sections '
+                f'WHERE section = ? AND fan_id IN ({placeholders})',
+                (section, *chunk)))
+        return stored
+
+    def save_sections(self, fan_id, sections):
+        self.save_many([(fan_id, sections)])
+
+    def save_many(self, batch):
+        now = datetime.now().isoformat()
+        conn = self._db()
+        with conn:
+            conn.execute('BEGIN')
+            conn.executemany(
+                'INSERT OR REPLACE INTO profile_sections (fan_id, section, data, updated_at) '
+                'VALUES (?, ?, ?, ?)',
+                [(fan_id, section, data, now)
+                 for fan_id, sections in batch
+                 for section, data in sections.items()])
+
+    def sync(self):
+        # O checkpoint do WAL copia e sincroniza (fsync) o banco
+        self._db().execute('PRAGMA wal_checkpoint(FULL)')
+
+    def exists(self, fan_id):
+        return self._db().execute(
+            'SELECT 1 FROM profile_sections WHERE fan_id = ? LIMIT 1',
+            (fan_id,)).fetchone() is not None
+
+
+class RedisProfileBackend:
+    """Perfis em um hash Redis por fã, um campo por seção."""
+
+    def __init__(self, url, prefix='kyf:profile:'):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def _key(self, fan_id):
+        return f"{self._prefix}{fan_id}"
+
+    def load_sections(self, fan_id, sections):
+        values = self._client.hmget(self._key(fan_id), list(sections))
+        return {section: value.decode()
+                for section, value in zip(sections, values) if value is not None}
+
+    def load_many(self, section, fan_ids=None):
+        if fan_ids is None:
+            fan_ids = [key.decode().rsplit(':', 1)[1]
+                       for key in self._client.scan_iter(f'{self._prefix}*')]
+        fan_ids = list(fan_ids)
+        pipeline = self._client.pipeline(transaction=False)
+        for fan_id in fan_ids:
+            pipeline.hget(self._key(fan_id), section)
+        return {fan_id: value.decode()
+                for fan_id, value in zip(fan_ids, pipeline.execute())
+                if value is not None}
+
+    def save_sections(self, fan_id, sections):
+        self._client.hset(self._key(fan_id), mapping=sections)
+
+    def save_many(self, batch):
+        pipeline = self._client.pipeline(transaction=False)
+        for fan_id, sections in batch:
+            pipeline.hset(self._key(fan_id), mapping=sections)
+        pipeline.execute()
+
+    def sync(self):
+        # A durabilidade fica a cargo da persistência do próprio Redis
+        pass
+
+    def exists(self, fan_id):
+        return bool(self._client.exists(self._key(fan_id)))
+
+
+@lru_cache(maxsize=None)
+def _backend(tenant_id):
+    if PROFILE_BACKEND == 'redis':
+        prefix = ('kyf:profile:' if tenant_id == ROOT_TENANT
+                  else f"kyf:{tenant_id}:profile:")
+        return RedisProfileBackend(REDIS_URL, prefix)
+    return SQLiteProfileBackend()
+
+
+def get_backend():
+    """
+    Retorna o backend configurado em KYF_PROFILE_BACKEND para o clube atual.
+
+    No SQLite cada clube tem o próprio arquivo (storage.data_dir()); no
+    Redis, o próprio prefixo de chaves.
+
+    Returns:
+        SQLiteProfileBackend or RedisProfileBackend: O backend de perfis
+    """
+    return _backend(current_tenant_id())
+
+
+@lru_cache(maxsize=None)
+def _log(tenant_id):
+    backend = _backend(tenant_id)
+    log = ProfileLog(backend.save_many, backend.sync)
+    log.recover()
+    return log
+
+
+def get_log():
+    """
+    Retorna o log de gravações de perfil do clube atual, recuperado na
+    primeira chamada.
+
+    Returns:
+        ProfileLog: O log, aplicado ao backend configurado
+    """
+    return _log(current_tenant_id())
+
+
+def load_sections(fan_id, sections):
+    """
+    Carrega algumas seções do perfil de fã em uma única leitura.
+
+    Args:
+        fan_id (str): Identificador do fã
+        sections (list): Nomes das seções
+
+    Returns:
+        dict: Seção para seus dados (vazios para seções ainda não salvas)
+    """
+    stored = get_backend().load_sections(fan_id, sections)
+    return {section: decrypt_section(fan_id, section, json.loads(stored[section]))
+            if section in stored else {}
+            for section in sections}
+
+
+def load_section(fan_id, section):
+    """
+    Carrega uma seção do perfil de fã.
+
+    Args:
+        fan_id (str): Identificador do fã
+        section (str): Uma das PROFILE_SECTIONS
+
+    Returns:
+        dict: Dados da seção (vazio se ainda não foi salva)
+    """
+    return load_sections(fan_id, [section])[section]
+
+
+def save_sections(fan_id, sections):
+    """
+    Grava uma ou mais seções do perfil em uma única operação.
+
+    Args:
+        fan_id (str): Identificador do fã
+        sections (dict): Nome da seção para os dados completos da seção
+    """
+    if not sections:
+        return
+    serialized = {section: json.dumps(encrypt_section(fan_id, section, data))
+                  for section, data in sections.items()}
+    if PROFILE_LOG:
+        get_log().append(fan_id, serialized)
+    else:
+        get_backend().save_sections(fan_id, serialized)
+
+
+def load_profile(fan_id):
+    """
+    Carrega o perfil completo do fã.
+
+    Args:
+        fan_id (str): Identificador do fã
+
+    Returns:
+        dict: Todas as PROFILE_SECTIONS (vazias se não salvas)
+    """
+    return load_sections(fan_id, PROFILE_SECTIONS)
+
+
+def load_profiles(fan_ids):
+    """
+    Carrega os perfis completos de muitos fãs, uma leitura por seção.
+
+    Args:
+        fan_ids (list): Fãs a carregar
+
+    Returns:
+        dict: fan_id para o perfil (como load_profile), só para fãs com
+            alguma seção salva
+    """
+    profiles = {}
+    for section in PROFILE_SECTIONS:
+        stored = get_backend().load_many(section, fan_ids)
+        rows = json.loads('[' + ','.join(stored.values()) + ']')
+        for fan_id, row in zip(stored, decrypt_rows(rows, list(stored), section)):
+            profiles.setdefault(fan_id, dict.fromkeys(PROFILE_SECTIONS, {}))[section] = row
+    return profiles
+
+
+def export_section(section, fan_ids=None):
+    """
+    Exporta uma seção de muitos fãs de uma vez, com os campos decifrados.
+
+    Os envelopes são decifrados em lote, como uma coluna (decrypt_rows).
+
+    Args:
+        section (str): Uma das PROFILE_SECTIONS
+        fan_ids (list): Fãs a exportar, ou None para todos
+
+    Returns:
+        pandas.DataFrame: Uma linha por fã, indexada por fan_id
+    """
+    stored = get_backend().load_many(section, fan_ids)
+    rows = json.loads('[' + ','.join(stored.values()) + ']')
+    return pd.DataFrame(decrypt_rows(rows, list(stored), section),
+                        index=pd.Index(list(stored), name='fan_id'))
+
+
+def profile_exists(fan_id):
+    """
+    Verifica se o fã tem alguma seção salva.
+
+    Args:
+        fan_id (str): Identificador do fã
+
+    Returns:
+        bool: Se existe ao menos uma seção
+    """
+    return get_backend().exists(fan_id)
+
+
+if __name__ == '__main__':
+    # Compactação manual: python -m utils.profile_store
+    removed = get_log().compact()
+    print(f"Checkpoint avançado; {removed} segmento(s) apagado(s).")
@@ -0,0 +1,189 @@
+import json
+import os
+from collections import defaultdict
+
+import numpy as np
+
+from utils.instrumentation import timed
+from utils.scoring import current_relevance
+from utils.tenants import current_tenant, tenant_cache
+
+RECOMMENDATION_KINDS = ('events', 'products', 'community')
+
+# Peso de cada tipo de característica do fã no score dos itens
+FEATURE_WEIGHTS = {
+    'game': 1.0,
+    'team': 1.5,
+    'merch': 1.2,
+    'state': 0.8,
+    'engagement': 0.7,
+    'bias': 1.0,
+}
+
+# Engajamento (0-10) a partir do qual o fã recebe itens para fãs muito ativos
+HIGH_ENGAGEMENT_THRESHOLD = 7.0
+
+_ITEM_FEATURE_FIELDS = {
+    'games': 'game',
+    'teams': 'team',
+    'merchandise': 'merch',
+    'states': 'state',
+    'engagement': 'engagement',
+}
+
+
+class ItemIndex:
+    """
+    Item-feature matrix of one recommendation kind, built once per catalog.
+
+    Attributes:
+        items (list): Catalog entries, in row order
+        features (dict): Feature name ('team:furia') to column
+        matrix (numpy.ndarray): items x features, float32
+        postings (dict): Column to the rows of items that have the feature
+    """
+
+    def __init__(self, items):
+        self.items = items
+        self.features = {'bias': 0}
+        entries = []
+        for row, item in enumerate(items):
+            for field, prefix in _ITEM_FEATURE_FIELDS.items():
+                for value in item.get(field, []):
+                    name = f"{prefix}:{value.lower()}"
+                    column = self.features.setdefault(name, len(self.features))
+                    entries.append((row, column, 1.0))
+            if item.get('popularity'):
+                entries.append((row, 0, float(item['popularity'])))
+
+        self.matrix = np.zeros((len(items), len(self.features)), dtype=np.float32)
+        postings = defaultdict(list)
+        for row, column, value in entries:
+            self.matrix[row, column] = value
+            postings[column].append(row)
+        self.postings = {column: np.asarray(rows)
+                         for column, rows in postings.items()}
+
+    def top_k(self, fan_features, k):
+        """
+        Score the candidate items against a sparse fan vector.
+
+        Args:
+            fan_features (tuple): (feature name, weight) pairs
+            k (int): Number of items to return
+
+        Returns:
+            list: Up to k catalog entries, best first
+        """
+        columns, weights = [], []
+        for name, weight in fan_features:
+            column = self.features.get(name)
+            if column is not None:
+                columns.append(column)
+                weights.append(weight)
+        if not columns:
+            return []
+
+        # Só itens que compartilham ao menos uma característica com o fã
+        candidates = np.unique(np.concatenate(
+            [self.postings.get(c, np.empty(0, dtype=int)) for c in columns]))
+        scores = self.matrix[np.ix_(candidates, columns)] @ np.asarray(
+            weights, dtype=np.float32)
+
+        # Ordem estável: empate mantém a ordem do catálogo
+        order = np.lexsort((candidates, -scores))
+        return [self.items[candidates[i]] for i in order[:k] if scores[i] > 0]
+
+
+@tenant_cache(maxsize=4)
+def _load_indexes(path, mtime):
+    with open(path) as f:
+        catalog = json.load(f)
+    return {kind: ItemIndex(catalog.get(kind, []))
+            for kind in RECOMMENDATION_KINDS}
+
+
+def catalog_path():
+    """
+    Recommendation catalog of the current tenant.
+
+    Returns:
+        str: Catalog JSON path
+    """
+    return current_tenant().catalogs['recommendations']
+
+
+def load_indexes(path=None):
+    """
+    Load the catalog and its precomputed item-feature matrices.
+
+    The matrices are rebuilt only when the catalog file changes.
+
+    Args:
+        path (str): Catalog JSON path (default: the current tenant's)
+
+    Returns:
+        dict: Recommendation kind to ItemIndex
+    """
+    path = path or catalog_path()
+    return _load_indexes(path, os.path.getmtime(path))
+
+
+def fan_features(user_data):
+    """
+    Build the sparse feature vector of a fan profile.
+
+    Args:
+        user_data (dict): Fan profile (or LazyProfile) with its sections
+
+    Returns:
+        tuple: Sorted (feature name, weight) pairs, usable as a cache key
+    """
+    interests = user_data.get('interests') or {}
+    personal = user_data.get('personal') or {}
+    analysis = (user_data.get('social_media') or {}).get('analysis', {})
+    relevance = (user_data.get('esports_profiles') or {}).get('relevance', {})
+
+    features = {'bias': FEATURE_WEIGHTS['bias']}
+    for game in interests.get('favorite_games', []):
+        features[f"game:{game.lower()}"] = FEATURE_WEIGHTS['game']
+    for team in interests.get('favorite_teams', []):
+        features[f"team:{team.lower()}"] = FEATURE_WEIGHTS['team']
+    for merch in interests.get('merchandise', []):
+        features[f"merch:{merch.lower()}"] = FEATURE_WEIGHTS['merch']
+    if personal.get('state'):
+        features[f"state:{personal['state'].strip().lower()}"] = FEATURE_WEIGHTS['state']
+
+    engagement = max(analysis.get('engagement_score', 0),
+                     current_relevance(relevance)[0])
+    if engagement >= HIGH_ENGAGEMENT_THRESHOLD:
+        features['engagement:high'] = FEATURE_WEIGHTS['engagement']
+
+    return tuple(sorted(features.items()))
+
+
+@tenant_cache(maxsize=4096)
+def _recommend_cached(features, k, catalog_mtime):
+    indexes = load_indexes()
+    return {kind: [item['title'] for item in indexes[kind].top_k(features, k)]
+            for kind in RECOMMENDATION_KINDS}
+
+
+@timed('recommendations.rank')
+def recommend_for_fan(user_data, k=3):
+    """
+    Rank events, products and community actions for a fan.
+
+    Results are cached per feature vector, so fans with the same interests
+    share one computation until the catalog changes. Each tenant has its
+    own cache partition.
+
+    Args:
+        user_data (dict): Fan profile (or LazyProfile) with its sections
+        k (int): Items per recommendation kind
+
+    Returns:
+        dict: Recommendation kind to a list of item titles
+    """
+    return _recommend_cached(fan_features(user_data), k,
+                             os.path.getmtime(catalog_path()))
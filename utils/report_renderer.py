@@ -0,0 +1,228 @@
+import argparse
+import importlib.util
+import multiprocessing
+import os
+import time
+import zipfile
+from functools import lru_cache
+
+import plotly
+import plotly.io as pio
+
+from utils import storage
+from utils.data_visualization import create_dashboard_figures
+from utils.instrumentation import timed
+from utils.profile_store import get_backend, load_profile
+from utils.tenants import current_tenant_id, set_tenant
+
+REPORT_FORMATS = ('html', 'png', 'pdf')
+
+# Tamanho das imagens exportadas (px)
+IMAGE_WIDTH = 900
+IMAGE_HEIGHT = 520
+
+# Fundo dos relatórios: os gráficos do app são transparentes com texto
+# branco, o que some no fundo branco dos e-mails
+REPORT_BACKGROUND = '#111111'
+
+# Fãs enviados de uma vez para cada processo do pool
+CHUNK_SIZE = 16
+
+# plotly.js é gravado uma única vez no arquivo e referenciado pelas páginas;
+# com self_contained, cada página o embute (~3,5 MB) e pode ser enviada sozinha
+PLOTLY_JS_NAME = f"assets/plotly-{plotly.__version__}.min.js"
+
+_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="pt-BR">
+<head>
+<meta charset="utf-8">
+<title>Painel do Fã - {fan_id}</title>
+{plotly_script}
+</head>
+<body style="background:{background};margin:0;padding:16px">
+{charts}
+</body>
+</html>
+"""
+
+
+_worker_error = None
+
+
+def _init_worker(data_dir, tenant_id, formats):
+    """Set up a pool process: data directory, tenant and a warm image exporter."""
+    global _worker_error
+    storage.DATA_DIR = data_dir
+    set_tenant(tenant_id)
+    storage.forget_connections()
+    if {'png', 'pdf'} & set(formats):
+        # Uma falha aqui derrubaria o processo, e o pool o recriaria sem fim:
+        # o erro é guardado e devolvido em cada tarefa
+        try:
+            import kaleido
+
+            # kaleido >= 1 mantém um navegador aberto entre exportações
+            start_server = getattr(kaleido, 'start_sync_server', None)
+            if start_server is not None:
+                start_server(silence_warnings=True)
+            # A primeira exportação paga a inicialização do navegador
+            pio.to_image({'data': [], 'layout': {}}, format='png',
+                         width=10, height=10)
+        except Exception as e:
+            _worker_error = f"Exportação de imagens indisponível: {e}"
+
+
+def _report_dict(figure):
+    # Dicionário puro: o estilo e a exportação não revalidam a figura
+    data = figure.to_dict()
+    data['layout'].update(paper_bgcolor=REPORT_BACKGROUND,
+                          plot_bgcolor=REPORT_BACKGROUND)
+    return data
+
+
+@lru_cache(maxsize=1)
+def _plotly_js():
+    from plotly.offline import get_plotlyjs
+
+    return get_plotlyjs()
+
+
+@timed('reports.render_fan')
+def render_fan(fan_id, formats=('html', ), self_contained=False):
+    """
+    Render one fan's dashboard from the stored profile.
+
+    Args:
+        fan_id (str): Fan identifier
+        formats (tuple): Any of REPORT_FORMATS
+        self_contained (bool): Inline plotly.js in the HTML page, so it
+            works on its own (e.g. attached to an email) instead of loading
+            the archive's shared copy
+
+    Returns:
+        list: (archive path, bytes) pairs; empty if the profile has no charts
+    """
+    figures = {name: _report_dict(figure) for name, figure in
+               create_dashboard_figures(load_profile(fan_id)).items()}
+    if not figures:
+        return []
+
+    files = []
+    if 'html' in formats:
+        charts = '\n'.join(
+            pio.to_html(figure, full_html=False, include_plotlyjs=False,
+                        div_id=f"{name}-chart", validate=False)
+            for name, figure in figures.items())
+        if self_contained:
+            plotly_script = f"<script>{_plotly_js()}</script>"
+        else:
+            plotly_script = f'<script src="../{PLOTLY_JS_NAME}"></script>'
+        page = _PAGE_TEMPLATE.format(fan_id=fan_id, plotly_script=plotly_script,
+                                     background=REPORT_BACKGROUND, charts=charts)
+        files.append((f"{fan_id}/index.html", page.encode()))
+    for image_format in ('png', 'pdf'):
+        if image_format in formats:
+            for name, figure in figures.items():
+                files.append((f"{fan_id}/{name}.{image_format}",
+                              pio.to_image(figure, format=image_format,
+                                           width=IMAGE_WIDTH, height=IMAGE_HEIGHT,
+                                           validate=False)))
+    return files
+
+
+def _render_task(args):
+    fan_id, formats, self_contained = args
+    if _worker_error:
+        return fan_id, [], _worker_error
+    try:
+        return fan_id, render_fan(fan_id, formats, self_contained), None
+    except Exception as e:
+        return fan_id, [], f"{type(e).__name__}: {e}"
+
+
+def render_reports(fan_ids, output_path, formats=('html', ), workers=None,
+                   self_contained=False):
+    """
+    Render many dashboards in a process pool, streaming them into a zip file.
+
+    Each worker keeps a warm image exporter; finished fans are written to
+    the archive as they arrive, so memory does not grow with the batch.
+    plotly.js is written once under assets/ and every HTML page loads it
+    from there, so the archive needs no network access. With
+    self_contained, each page inlines plotly.js instead and can be sent on
+    its own.
+
+    Args:
+        fan_ids (iterable): Fans to render
+        output_path (str): Zip file to create
+        formats (tuple): Any of REPORT_FORMATS
+        workers (int): Pool size (default: CPU count)
+        self_contained (bool): Inline plotly.js in every HTML page
+
+    Returns:
+        dict: fans rendered, files written, errors (fan_id to message)
+            and elapsed seconds
+    """
+    formats = tuple(formats)
+    unknown = set(formats) - set(REPORT_FORMATS)
+    if unknown:
+        raise ValueError(f"Formatos não suportados: {', '.join(sorted(unknown))}")
+
+    if {'png', 'pdf'} & set(formats) and importlib.util.find_spec('kaleido') is None:
+        raise RuntimeError(
+            "PNG e PDF exigem o pacote kaleido (extra \"reports\").")
+
+    start = time.perf_counter()
+    summary = {'fans': 0, 'files': 0, 'errors': {}}
+    tasks = ((fan_id, formats, self_contained) for fan_id in fan_ids)
+
+    with zipfile.ZipFile(output_path, 'w') as archive, multiprocessing.Pool(
+            workers, initializer=_init_worker,
+            initargs=(storage.DATA_DIR, current_tenant_id(), formats)) as pool:
+        if 'html' in formats and not self_contained:
+            archive.writestr(PLOTLY_JS_NAME, _plotly_js().encode(),
+                             compress_type=zipfile.ZIP_DEFLATED)
+        for fan_id, files, error in pool.imap_unordered(
+                _render_task, tasks, chunksize=CHUNK_SIZE):
+            if error:
+                summary['errors'][fan_id] = error
+                continue
+            summary['fans'] += bool(files)
+            for path, content in files:
+                # PNG e PDF já são comprimidos
+                compress = (zipfile.ZIP_DEFLATED if path.endswith('.html')
+                            else zipfile.ZIP_STORED)
+                archive.writestr(path, content, compress_type=compress)
+                summary['files'] += 1
+
+    summary['seconds'] = round(time.perf_counter() - start, 2)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Renderiza os painéis dos fãs em um arquivo zip.")
+    parser.add_argument('--output', default='reports.zip')
+    parser.add_argument('--format', default='html',
+                        help="Formatos separados por vírgula: html, png, pdf")
+    parser.add_argument('--fans', help="fan_ids separados por vírgula (padrão: todos)")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--self-contained', action='store_true',
+                        help="Embutir o plotly.js em cada página (envio por e-mail)")
+    args = parser.parse_args(argv)
+
+    fan_ids = (args.fans.split(',') if args.fans
+               else list(get_backend().load_many('interests')))
+    summary = render_reports(fan_ids, args.output,
+                             formats=args.format.split(','),
+                             workers=args.workers,
+                             self_contained=args.self_contained)
+    print(f"{summary['fans']} painéis, {summary['files']} arquivos em "
+          f"{summary['seconds']} s -> {args.output}")
+    for fan_id, error in summary['errors'].items():
+        print(f"  erro em {fan_id}: {error}")
+    return 1 if summary['errors'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,253 @@
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+from utils.instrumentation import timed
+from utils.storage import connect
+from utils.tenants import current_tenant, tenant_cache
+
+# Características extraídas de cada fã, na ordem das colunas dos vetores;
+# os pesos ficam só no arquivo de regras do clube (catalog/scoring_rules.json)
+RELEVANCE_FEATURES = ('base', 'profiles', 'matching_games', 'matching_teams')
+ENGAGEMENT_FEATURES = ('social', 'games', 'teams', 'events', 'content',
+                       'community')
+SCORE_KINDS = {'relevance': RELEVANCE_FEATURES,
+               'engagement': ENGAGEMENT_FEATURES}
+
+
+class ScoringRules:
+    """
+    One version of the scoring rules, as weight matrices.
+
+    Attributes:
+        version (int): Rule version, stored with every score
+        max_score (float): Upper bound of every score
+        matrices (dict): Score kind to a (scores x features) weight matrix;
+            relevance has one row, engagement one row per radar axis
+        confidence (list): (label, minimum score) pairs, highest first
+    """
+
+    def __init__(self, rules):
+        self.version = rules['version']
+        self.max_score = float(rules['max_score'])
+        self.matrices = {
+            'relevance': self._matrix([rules['relevance']['weights']],
+                                      RELEVANCE_FEATURES),
+            'engagement': self._matrix([row['weights'] for row in rules['engagement']],
+                                       ENGAGEMENT_FEATURES),
+        }
+        self.confidence = sorted(rules['relevance']['confidence'].items(),
+                                 key=lambda item: item[1], reverse=True)
+
+    @staticmethod
+    def _matrix(rows, features):
+        matrix = np.zeros((len(rows), len(features)))
+        for i, weights in enumerate(rows):
+            for name, weight in weights.items():
+                matrix[i, features.index(name)] = weight
+        return matrix
+
+    def score(self, kind, features):
+        """
+        Score feature vectors with this version's weights.
+
+        Args:
+            kind (str): 'relevance' or 'engagement'
+            features (numpy.ndarray): (features,) or (fans x features)
+
+        Returns:
+            numpy.ndarray: (scores,) or (fans x scores), clipped to
+                [0, max_score] and rounded to one decimal
+        """
+        scores = np.asarray(features, dtype=np.float64) @ self.matrices[kind].T
+        return np.round(np.clip(scores, 0, self.max_score), 1)
+
+    def confidence_label(self, score):
+        """
+        Confidence label of a relevance score.
+
+        Args:
+            score (float): Relevance score
+
+        Returns:
+            str: Label from the rules (e.g. 'High'), or 'Low'
+        """
+        for label, minimum in self.confidence:
+            if score >= minimum:
+                return label
+        return 'Low'
+
+
+@tenant_cache(maxsize=4)
+def _load_rules(path, mtime):
+    with open(path) as f:
+        return ScoringRules(json.load(f))
+
+
+def load_rules(path=None):
+    """
+    Load the active scoring rules, reloaded only when the file changes.
+
+    Args:
+        path (str): Rules JSON path (default: the current tenant's)
+
+    Returns:
+        ScoringRules: The rules
+    """
+    path = path or current_tenant().catalogs['scoring_rules']
+    return _load_rules(path, os.path.getmtime(path))
+
+
+def feature_vector(kind, features):
+    """
+    Order a feature dict as a vector.
+
+    Args:
+        kind (str): 'relevance' or 'engagement'
+        features (dict): Feature name to value (missing ones are 0)
+
+    Returns:
+        numpy.ndarray: float32 vector in SCORE_KINDS[kind] order
+    """
+    return np.array([features.get(name, 0) for name in SCORE_KINDS[kind]],
+                    dtype=np.float32)
+
+
+def current_relevance(relevance):
+    """
+    Relevance score under the active rules.
+
+    Scores stored with an older rule version are recomputed from the
+    stored features; analyses without features keep their stored score.
+
+    Args:
+        relevance (dict): The 'relevance' entry of 'esports_profiles'
+
+    Returns:
+        tuple: (score, confidence label)
+    """
+    rules = load_rules()
+    if 'features' not in relevance or relevance.get('rule_version') == rules.version:
+        return relevance.get('relevance_score', 0), relevance.get('confidence', 'Low')
+    score = float(rules.score('relevance', feature_vector(
+        'relevance', relevance['features']))[0])
+    return score, rules.confidence_label(score)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fan_features (
+    fan_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    features BLOB NOT NULL,
+    PRIMARY KEY (fan_id, kind)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS fan_scores (
+    fan_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    scores BLOB NOT NULL,
+    rule_version INTEGER NOT NULL,
+    scored_at TEXT NOT NULL,
+    PRIMARY KEY (fan_id, kind)
+) WITHOUT ROWID;
+"""
+
+
+def _db():
+    conn = connect('scoring')
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def record_features(fan_id, features_by_kind):
+    """
+    Store a fan's feature vectors and their scores under the active rules.
+
+    Args:
+        fan_id (str): Fan identifier
+        features_by_kind (dict): Score kind to feature dict
+    """
+    rules = load_rules()
+    now = datetime.now().isoformat()
+    features_rows, score_rows = [], []
+    for kind, features in features_by_kind.items():
+        vector = feature_vector(kind, features)
+        features_rows.append((fan_id, kind, vector.tobytes()))
+        score_rows.append((fan_id, kind,
+                           rules.score(kind, vector).tobytes(),
+                           rules.version, now))
+    conn = _db()
+    with conn:
+        conn.execute('BEGIN')
+        conn.executemany(
+            'INSERT OR REPLACE INTO fan_features (fan_id, kind, features) VALUES (?, ?, ?)',
+            features_rows)
+        conn.executemany(
+            'INSERT OR REPLACE INTO fan_scores (fan_id, kind, scores, rule_version, scored_at) '
+            'VALUES (?, ?, ?, ?, ?)', score_rows)
+
+
+def stored_scores(fan_id, kind):
+    """
+    Read a fan's stored scores.
+
+    Args:
+        fan_id (str): Fan identifier
+        kind (str): 'relevance' or 'engagement'
+
+    Returns:
+        tuple: (list of scores, rule version), or (None, None)
+    """
+    row = _db().execute(
+        'SELECT scores, rule_version FROM fan_scores WHERE fan_id = ? AND kind = ?',
+        (fan_id, kind)).fetchone()
+    if row is None:
+        return None, None
+    return np.frombuffer(row[0]).tolist(), row[1]
+
+
+@timed('scoring.rescore')
+def rescore(rules=None, batch_size=50000):
+    """
+    Rescore every fan whose scores come from another rule version.
+
+    Features are not extracted again: each batch of stored feature vectors
+    becomes one matrix and is multiplied by the rule weights.
+
+    Args:
+        rules (ScoringRules): Rules to apply (default: the active rules)
+        batch_size (int): Fans per matrix product
+
+    Returns:
+        int: Scores rewritten
+    """
+    rules = rules or load_rules()
+    conn = _db()
+    now = datetime.now().isoformat()
+    rewritten = 0
+    for kind in SCORE_KINDS:
+        rows = conn.execute(
+            'SELECT f.fan_id, f.features FROM fan_features f '
+            'JOIN fan_scores s ON s.fan_id = f.fan_id AND s.kind = f.kind '
+            'WHERE f.kind = ? AND s.rule_version != ?',
+            (kind, rules.version)).fetchall()
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            matrix = np.frombuffer(b''.join(features for _, features in batch),
+                                   dtype=np.float32).reshape(len(batch), -1)
+            scores = rules.score(kind, matrix)
+            with conn:
+                conn.execute('BEGIN')
+                conn.executemany(
+                    'UPDATE fan_scores SET scores = ?, rule_version = ?, scored_at = ? '
+                    'WHERE fan_id = ? AND kind = ?',
+                    [(scores[i].tobytes(), rules.version, now, fan_id, kind)
+                     for i, (fan_id, _) in enumerate(batch)])
+            rewritten += len(batch)
+    return rewritten
+
+
+if __name__ == '__main__':
+    # Depois de editar os pesos e a versão: python -m utils.scoring
+    print(f"{rescore()} scores recalculados com as regras versão {load_rules().version}.")
@@ -0,0 +1,372 @@
+import io
+import os
+import secrets
+import stat
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:  # só com KYF_PII_ENCRYPTION=0 (utils/pii_crypto.py)
+    AESGCM = None
+
+from utils.instrumentation import increment
+
+# Memória máxima das imagens de documento mantidas por sessão; acima disso
+# as maiores vão para arquivos temporários
+SESSION_IMAGE_BYTES = int(float(os.environ.get('KYF_SESSION_IMAGE_MB', '16')) * 1024 * 1024)
+
+# Sessões sem execução há mais tempo que isso têm o estado pesado liberado
+SESSION_IDLE_SECONDS = float(os.environ.get('KYF_SESSION_IDLE_MINUTES', '30')) * 60
+
+# Sessões acompanhadas; acima disso as menos recentes são liberadas primeiro
+MAX_SESSIONS = int(os.environ.get('KYF_MAX_SESSIONS', '5000'))
+
+# Diretório das imagens despejadas (apagadas junto com a sessão); criado
+# com permissão só para o dono e varrido na inicialização (sweep_spill_dir)
+SPILL_DIR = os.environ.get('KYF_SPILL_DIR',
+                           os.path.join(tempfile.gettempdir(), 'kyf-spill'))
+
+# Chave das imagens despejadas: só existe na memória deste processo, então
+# o que sobrar no disco depois de uma queda não pode ser lido
+_SPILL_KEY = AESGCM.generate_key(bit_length=256) if AESGCM is not None else None
+_NONCE_SIZE = 12
+
+
+def deep_size(obj, _seen=None):
+    """
+    Tamanho aproximado em memória de um objeto e de tudo o que ele referencia.
+
+    Arrays numpy contam os dados (memmaps não, eles ficam no disco) e
+    BytesIO (como o UploadedFile do Streamlit) conta o buffer.
+
+    Args:
+        obj: Objeto a medir
+
+    Returns:
+        int: Bytes
+    """
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, np.memmap):
+        return sys.getsizeof(obj)
+    if isinstance(obj, np.ndarray):
+        return max(sys.getsizeof(obj), obj.nbytes)
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool, type(None))):
+        return sys.getsizeof(obj)
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, io.BytesIO):
+        try:
+            size += obj.getbuffer().nbytes
+        except ValueError:  # arquivo fechado
+            pass
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen)
+                    for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    if hasattr(obj, '__dict__'):
+        size += deep_size(vars(obj), seen)
+    for slot in getattr(type(obj), '__slots__', ()):
+        if hasattr(obj, slot):
+            size += deep_size(getattr(obj, slot), seen)
+    return size
+
+
+def _spill_dir():
+    # 0700 e do próprio usuário: o diretório temporário é compartilhado
+    os.makedirs(SPILL_DIR, mode=0o700, exist_ok=True)
+    info = os.lstat(SPILL_DIR)
+    if not stat.S_ISDIR(info.st_mode) or (
+            hasattr(os, 'getuid') and info.st_uid != os.getuid()):
+        raise RuntimeError(f"{SPILL_DIR} não é um diretório deste usuário.")
+    if stat.S_IMODE(info.st_mode) != 0o700:
+        os.chmod(SPILL_DIR, 0o700)
+    return SPILL_DIR
+
+
+def sweep_spill_dir():
+    """
+    Apaga as imagens despejadas por processos que já terminaram.
+
+    Os arquivos levam o pid do processo que os criou; os de um processo
+    encerrado sem apagá-los (queda, SIGKILL) não podem mais ser lidos. Os
+    sem pid (versões anteriores, em texto puro) também são apagados.
+
+    Returns:
+        int: Arquivos apagados
+    """
+    if not os.path.isdir(SPILL_DIR):
+        return 0
+    removed = 0
+    for name in os.listdir(_spill_dir()):
+        pid = name.split('-', 1)[0]
+        if not pid.isdigit() or (int(pid) != os.getpid()
+                                 and not _process_alive(int(pid))):
+            _remove_file(os.path.join(SPILL_DIR, name))
+            removed += 1
+    if removed:
+        increment('sessions.spill_swept', removed)
+    return removed
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # existe, de outro usuário
+        return True
+    return True
+
+
+class SpilledImage:
+    """
+    Imagem de documento guardada em um arquivo temporário cifrado.
+
+    O arquivo (0600) é cifrado com AES-GCM e uma chave que só existe na
+    memória do processo; load() o decifra só quando a imagem é usada. O
+    arquivo é apagado quando o objeto sai da memória (fim ou liberação da
+    sessão) e, se o processo cair antes, na próxima varredura.
+    """
+
+    __slots__ = ('path', 'shape', 'dtype', 'nbytes', '_finalizer', '__weakref__')
+
+    def __init__(self, image):
+        self.path = os.path.join(_spill_dir(), f"{os.getpid()}-{uuid.uuid4().hex}.bin")
+        data = np.ascontiguousarray(image).tobytes()
+        if _SPILL_KEY is not None:
+            nonce = secrets.token_bytes(_NONCE_SIZE)
+            data = nonce + AESGCM(_SPILL_KEY).encrypt(nonce, data, self.path.encode())
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        self.shape = image.shape
+        self.dtype = image.dtype
+        self.nbytes = image.nbytes
+        self._finalizer = weakref.finalize(self, _remove_file, self.path)
+
+    def load(self):
+        """
+        Returns:
+            numpy.ndarray: A imagem (somente leitura)
+        """
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        if _SPILL_KEY is not None:
+            data = AESGCM(_SPILL_KEY).decrypt(data[:_NONCE_SIZE], data[_NONCE_SIZE:],
+                                              self.path.encode())
+        return np.frombuffer(data, dtype=self.dtype).reshape(self.shape)
+
+    def delete(self):
+        """Apaga o arquivo imediatamente."""
+        self._finalizer()
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def load_image(entry):
+    """
+    Imagem de um item do cache de documentos da sessão.
+
+    Args:
+        entry (numpy.ndarray or SpilledImage): Imagem em memória ou despejada
+
+    Returns:
+        numpy.ndarray: A imagem
+    """
+    return entry.load() if isinstance(entry, SpilledImage) else entry
+
+
+def release_images(images):
+    """
+    Esvazia o cache de imagens de uma sessão, apagando as despejadas.
+
+    Args:
+        images (dict): Cache de imagens da sessão
+    """
+    for image in list(images.values()):
+        if isinstance(image, SpilledImage):
+            image.delete()
+    images.clear()
+
+
+def spill_image(images, key):
+    """
+    Move uma imagem do cache de documentos da sessão para o disco.
+
+    Args:
+        images (dict): Cache de imagens da sessão (chave para imagem)
+        key: Item a despejar
+    """
+    if isinstance(images.get(key), np.ndarray) and not isinstance(images[key], np.memmap):
+        images[key] = SpilledImage(images[key])
+        increment('sessions.spilled_images')
+
+
+def enforce_image_budget(images, limit=SESSION_IMAGE_BYTES):
+    """
+    Despeja as maiores imagens em memória até o cache caber no limite.
+
+    Args:
+        images (dict): Cache de imagens da sessão
+        limit (int): Bytes em memória permitidos
+
+    Returns:
+        int: Imagens despejadas
+    """
+    in_memory = sorted(((image.nbytes, key) for key, image in images.items()
+                        if isinstance(image, np.ndarray)
+                        and not isinstance(image, np.memmap)), reverse=True)
+    total = sum(size for size, _ in in_memory)
+    spilled = 0
+    for size, key in in_memory:
+        if total <= limit:
+            break
+        spill_image(images, key)
+        total -= size
+        spilled += 1
+    return spilled
+
+
+class SessionRegistry:
+    """
+    Memória das sessões abertas, com liberação das ociosas.
+
+    Cada execução do app registra o tamanho do estado da sessão e uma
+    função que libera o que ela tem de pesado (imagens e uploads). Sessões
+    ociosas há mais de `idle_seconds` são liberadas e saem do registro; se o
+    fã voltar, a sessão é registrada de novo (o perfil está no profile_store).
+
+    Quando há mais de `max_sessions`, as menos recentes que ainda não estão
+    ociosas podem estar no meio de uma execução, então não são liberadas pela
+    thread de outra sessão: ficam pendentes e a liberação acontece no início
+    da próxima execução delas (release_pending) ou quando ficarem ociosas.
+    Até lá o estado delas continua na memória, então `max_sessions` não é um
+    limite de memória; o que limita cada sessão é SESSION_IMAGE_BYTES.
+    """
+
+    def __init__(self, idle_seconds=SESSION_IDLE_SECONDS, max_sessions=MAX_SESSIONS):
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+
+    def touch(self, session_id, state_bytes, release=None, now=None):
+        """
+        Registra uma execução da sessão e libera as sessões ociosas.
+
+        Args:
+            session_id (str): Identificador da sessão
+            state_bytes (int): Tamanho do estado da sessão (deep_size)
+            release (callable): Libera o estado pesado da sessão
+            now (float): Horário (time.monotonic) da execução
+
+        Returns:
+            list: Sessões liberadas agora (as excedentes que ainda não estão
+            ociosas ficam pendentes e não entram na lista)
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._pending.pop(session_id, None)
+            self._sessions[session_id] = {'last_seen': now, 'bytes': state_bytes,
+                                          'release': release}
+            self._sessions.move_to_end(session_id)
+            evicted, deferred = [], []
+            # Ordem de uso: as mais antigas estão no início
+            for other, entry in self._sessions.items():
+                if other == session_id:
+                    break
+                if now - entry['last_seen'] > self.idle_seconds:
+                    evicted.append((other, entry['release']))
+                elif len(self._sessions) - len(evicted) - len(deferred) > self.max_sessions:
+                    deferred.append(other)
+                else:
+                    break
+            for other, _ in evicted:
+                del self._sessions[other]
+            for other in deferred:
+                self._pending[other] = self._sessions.pop(other)
+            # Pendentes que ficaram ociosas já podem ser liberadas daqui
+            for other, entry in list(self._pending.items()):
+                if now - entry['last_seen'] > self.idle_seconds:
+                    evicted.append((other, entry['release']))
+                    del self._pending[other]
+
+        for other, release_other in evicted:
+            if release_other is not None:
+                release_other()
+        if evicted:
+            increment('sessions.evicted', len(evicted))
+        if deferred:
+            increment('sessions.deferred', len(deferred))
+        return [other for other, _ in evicted]
+
+    def release_pending(self, session_id):
+        """
+        Libera a sessão se ela foi marcada como excedente.
+
+        Chamada pela própria sessão no início da execução, antes de usar as
+        imagens e os uploads.
+
+        Args:
+            session_id (str): Identificador da sessão
+
+        Returns:
+            bool: True se a sessão estava pendente e foi liberada
+        """
+        with self._lock:
+            entry = self._pending.pop(session_id, None)
+        if entry is None:
+            return False
+        if entry['release'] is not None:
+            entry['release']()
+        increment('sessions.evicted')
+        return True
+
+    def stats(self):
+        """
+        Resumo da memória das sessões registradas.
+
+        Returns:
+            dict: sessions, pending, total_bytes, max_bytes e mean_bytes
+        """
+        with self._lock:
+            sizes = [entry['bytes'] for entry in self._sessions.values()]
+            sizes += [entry['bytes'] for entry in self._pending.values()]
+            pending = len(self._pending)
+        return {
+            'sessions': len(sizes),
+            'pending': pending,
+            'total_bytes': sum(sizes),
+            'max_bytes': max(sizes, default=0),
+            'mean_bytes': sum(sizes) // len(sizes) if sizes else 0,
+        }
+
+
+_registry = SessionRegistry()
+
+
+def get_registry():
+    """
+    Returns:
+        SessionRegistry: O registro de sessões deste processo
+    """
+    return _registry
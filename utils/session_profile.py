@@ -0,0 +1,132 @@
+import hashlib
+import hmac
+import json
+import os
+import time
+
+from utils.profile_store import PROFILE_SECTIONS, load_sections, save_sections
+from utils.storage import load_secret
+
+# Validade do link de retomada do cadastro (?resume= na URL)
+RESUME_HOURS = float(os.environ.get('KYF_RESUME_HOURS', '24'))
+
+
+def _resume_signature(payload):
+    return hmac.new(load_secret('resume'), payload.encode(),
+                    hashlib.sha256).hexdigest()[:32]
+
+
+def resume_token(fan_id, now=None):
+    """
+    Token assinado que permite retomar o cadastro de um fã pela URL.
+
+    O fan_id sozinho não dá acesso ao perfil: o token leva a validade
+    (KYF_RESUME_HOURS) e uma assinatura HMAC com a chave 'resume' do clube.
+
+    Args:
+        fan_id (str): Identificador do fã
+        now (float): Horário (time.time) da emissão
+
+    Returns:
+        str: fan_id.validade.assinatura
+    """
+    expires = int((time.time() if now is None else now) + RESUME_HOURS * 3600)
+    payload = f"{fan_id}.{expires}"
+    return f"{payload}.{_resume_signature(payload)}"
+
+
+def fan_from_token(token, now=None):
+    """
+    Confere um token de resume_token.
+
+    Args:
+        token (str): Token recebido na URL
+        now (float): Horário (time.time) da verificação
+
+    Returns:
+        str or None: O fan_id, ou None se o token é inválido ou expirou
+    """
+    try:
+        fan_id, expires, signature = (token or '').split('.')
+        expires = int(expires)
+    except ValueError:
+        return None
+    if not hmac.compare_digest(signature, _resume_signature(f"{fan_id}.{expires}")):
+        return None
+    if expires < (time.time() if now is None else now):
+        return None
+    return fan_id
+
+
+class LazyProfile:
+    """
+    Perfil de fã guardado no profile_store, com acesso por seção.
+
+    A sessão do Streamlit mantém apenas esta instância (o fan_id e as seções
+    tocadas na execução atual). Cada seção é carregada na primeira vez que é
+    acessada; flush() grava somente as seções alteradas e descarta o cache,
+    então entre execuções nada além do fan_id fica em memória.
+    """
+
+    def __init__(self, fan_id):
+        self.fan_id = fan_id
+        self._sections = {}
+        self._snapshots = {}
+
+    def _load(self, sections):
+        missing = [s for s in sections if s not in self._sections]
+        if missing:
+            for section, data in load_sections(self.fan_id, missing).items():
+                self._sections[section] = data
+                self._snapshots[section] = json.dumps(data, sort_keys=True)
+
+    def __getitem__(self, section):
+        if section not in PROFILE_SECTIONS:
+            raise KeyError(section)
+        self._load([section])
+        return self._sections[section]
+
+    def __setitem__(self, section, data):
+        if section not in PROFILE_SECTIONS:
+            raise KeyError(section)
+        self._load([section])
+        self._sections[section] = data
+
+    def __contains__(self, section):
+        return section in PROFILE_SECTIONS
+
+    def get(self, section, default=None):
+        return self[section] if section in PROFILE_SECTIONS else default
+
+    def to_dict(self):
+        """
+        Carrega todas as seções (ex.: para exportação).
+
+        Returns:
+            dict: O perfil completo
+        """
+        self._load(PROFILE_SECTIONS)
+        return {section: self._sections[section] for section in PROFILE_SECTIONS}
+
+    def clear(self):
+        """Esvazia todas as seções do perfil."""
+        for section in PROFILE_SECTIONS:
+            self[section] = {}
+
+    def dirty_sections(self):
+        """
+        Seções alteradas desde que foram carregadas.
+
+        Returns:
+            dict: Seção para seus dados atuais
+        """
+        return {
+            section: data for section, data in self._sections.items()
+            if json.dumps(data, sort_keys=True) != self._snapshots.get(section)
+        }
+
+    def flush(self):
+        """Grava as seções alteradas e libera o cache desta execução."""
+        save_sections(self.fan_id, self.dirty_sections())
+        self._sections.clear()
+        self._snapshots.clear()
@@ -0,0 +1,335 @@
+import os
+import sys
+import threading
+
+import numpy as np
+
+from utils.fan_vectors import encode_profile, vector_layout
+from utils.instrumentation import timed
+from utils.profile_store import get_backend, load_profiles
+from utils.storage import connect, data_path
+from utils.tenants import current_tenant_id
+
+# Vetores quantizados em int8: os vetores são normalizados (componentes em
+# [-1, 1]), então a escala 127 perde pouca precisão e usa 1/4 da memória
+QUANT_SCALE = 127.0
+
+# Número de listas invertidas (IVF) e de listas visitadas por consulta
+DEFAULT_NLIST = 256
+DEFAULT_NPROBE = 8
+
+# Abaixo disso a busca é exata (força bruta) e train() não faz nada; o
+# treino roda fora do app: python -m utils.similarity_index
+MIN_TRAIN_SIZE = 10_000
+
+# Similaridade (cosseno) a partir da qual dois fãs são considerados parecidos
+SIMILAR_FAN_THRESHOLD = 0.9
+
+_INITIAL_CAPACITY = 1024
+
+
+class FanVectorIndex:
+    """
+    Approximate nearest-neighbour index of fan vectors (IVF, CPU only).
+
+    Vectors live in a memory-mapped int8 matrix that grows by doubling.
+    Coarse centroids are trained with k-means once there is enough data.
+    Every row is assigned to its nearest centroid, and a query scans only
+    the `nprobe` closest inverted lists. Inserts are incremental: a new row
+    is appended and added to its list without retraining.
+
+    Row ids are allocated in SQLite inside a write transaction, which also
+    covers growing the matrix file, so several processes (app replicas,
+    API workers) can share one index. Each process catches up on rows and
+    centroids written by the others before every insert and search.
+    """
+
+    def __init__(self, name, dim):
+        self.dim = dim
+        self._lock = threading.RLock()
+        self._vectors_path = data_path('vector_index', f"{name}.i8")
+        self._centroids_path = data_path('vector_index', f"{name}.centroids.npy")
+        self._db_name = f"vector_index_{name}"
+        self._db().execute("""
+            CREATE TABLE IF NOT EXISTS rows (
+                row INTEGER PRIMARY KEY,
+                fan_id TEXT NOT NULL UNIQUE,
+                list INTEGER NOT NULL DEFAULT -1
+            )""")
+
+        self.count = 0
+        self.capacity = 0
+        self.centroids = None
+        self._centroids_mtime = None
+        self._lists = None
+        self._lists_count = 0
+        conn = self._db()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            self._open_matrix(_INITIAL_CAPACITY)
+        self._refresh()
+
+    def _db(self):
+        return connect(self._db_name)
+
+    def _open_matrix(self, capacity):
+        # O arquivo só cresce, e só dentro de uma transação de escrita, para
+        # que dois processos não o truncarem ao mesmo tempo
+        size = capacity * self.dim
+        if not os.path.exists(self._vectors_path) or os.path.getsize(
+                self._vectors_path) < size:
+            with open(self._vectors_path, 'ab') as f:
+                f.truncate(size)
+        self._map_matrix()
+
+    def _map_matrix(self):
+        self.capacity = os.path.getsize(self._vectors_path) // self.dim
+        self.vectors = np.memmap(self._vectors_path, dtype=np.int8, mode='r+',
+                                 shape=(self.capacity, self.dim))
+
+    def _refresh(self):
+        # Acompanha as linhas e os centróides gravados por outros processos
+        self.count = self._db().execute(
+            'SELECT COALESCE(MAX(row) + 1, 0) FROM rows').fetchone()[0]
+        if self.count > self.capacity:
+            self._map_matrix()
+
+        mtime = (os.path.getmtime(self._centroids_path)
+                 if os.path.exists(self._centroids_path) else None)
+        if mtime != self._centroids_mtime:
+            self.centroids = np.load(self._centroids_path) if mtime else None
+            self._centroids_mtime = mtime
+            self._lists = None
+
+        if self._lists is not None and self.count > self._lists_count:
+            for row, list_id in self._db().execute(
+                    'SELECT row, list FROM rows WHERE row >= ?', (self._lists_count,)):
+                self._add_to_list(list_id, row)
+            self._lists_count = self.count
+
+    def _inverted_lists(self):
+        # Montadas uma vez a partir da tabela e mantidas a cada inserção
+        if self._lists is None:
+            lists = {}
+            for row, list_id in self._db().execute('SELECT row, list FROM rows'):
+                lists.setdefault(list_id, []).append(row)
+            self._lists = {list_id: np.asarray(rows, dtype=np.int64)
+                           for list_id, rows in lists.items()}
+            self._lists_count = self.count
+        return self._lists
+
+    def _nearest_list(self, vector):
+        if self.centroids is None:
+            return -1
+        return int(np.argmax(self.centroids @ vector))
+
+    @timed('similarity.insert')
+    def upsert(self, fan_id, vector):
+        """
+        Insert or replace the vector of a fan.
+
+        Args:
+            fan_id (str): Fan identifier
+            vector (numpy.ndarray): float32 vector of length dim
+        """
+        quantized = np.clip(np.round(vector * QUANT_SCALE), -127,
+                            127).astype(np.int8)
+        with self._lock:
+            conn = self._db()
+            existing = conn.execute('SELECT row, list FROM rows WHERE fan_id = ?',
+                                    (fan_id,)).fetchone()
+            if (existing and existing[0] < self.capacity and
+                    np.array_equal(self.vectors[existing[0]], quantized)):
+                return
+
+            # A transação de escrita serializa a alocação de linhas entre
+            # processos; o estado é relido dentro dela
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                self._refresh()
+                existing = conn.execute('SELECT row, list FROM rows WHERE fan_id = ?',
+                                        (fan_id,)).fetchone()
+                list_id = self._nearest_list(vector)
+                if existing:
+                    row = existing[0]
+                    conn.execute('UPDATE rows SET list = ? WHERE row = ?',
+                                 (list_id, row))
+                else:
+                    row = self.count
+                    if row >= self.capacity:
+                        self.vectors.flush()
+                        self._open_matrix(max(self.capacity * 2, _INITIAL_CAPACITY))
+                    conn.execute('INSERT INTO rows (row, fan_id, list) VALUES (?, ?, ?)',
+                                 (row, fan_id, list_id))
+                    self.count += 1
+                # Sem flush explícito: o sistema operacional grava as páginas
+                # do memmap, e o índice pode ser reconstruído a partir dos perfis
+                self.vectors[row] = quantized
+
+            if self._lists is not None:
+                if existing and existing[1] != list_id:
+                    old = self._lists[existing[1]]
+                    self._lists[existing[1]] = old[old != row]
+                    self._add_to_list(list_id, row)
+                elif not existing:
+                    self._add_to_list(list_id, row)
+                    self._lists_count = max(self._lists_count, row + 1)
+
+    def _add_to_list(self, list_id, row):
+        if self._lists is not None:
+            self._lists[list_id] = np.append(
+                self._lists.get(list_id, np.empty(0, dtype=np.int64)), row)
+
+    def train(self, nlist=DEFAULT_NLIST, iterations=10, sample_size=100_000,
+              seed=0):
+        """
+        Train the coarse centroids with k-means and reassign every row.
+
+        Args:
+            nlist (int): Number of inverted lists
+            iterations (int): k-means iterations
+            sample_size (int): Rows sampled for training
+            seed (int): Random seed
+        """
+        with self._lock:
+            self._refresh()
+            if self.count < max(nlist, MIN_TRAIN_SIZE):
+                return
+            self.vectors.flush()
+            rng = np.random.default_rng(seed)
+            sample_rows = np.sort(rng.choice(
+                self.count, min(sample_size, self.count), replace=False))
+            sample = self.vectors[sample_rows].astype(np.float32) / QUANT_SCALE
+
+            centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+            for _ in range(iterations):
+                assignment = np.argmax(sample @ centroids.T, axis=1)
+                for c in range(nlist):
+                    members = sample[assignment == c]
+                    if len(members):
+                        centroids[c] = members.mean(axis=0)
+                norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+                centroids /= np.where(norms == 0, 1, norms)
+
+            conn = self._db()
+            with conn:
+                # Inserções de outros processos esperam a reatribuição, que
+                # inclui as linhas criadas durante o k-means
+                conn.execute('BEGIN IMMEDIATE')
+                self._refresh()
+                assignments = np.empty(self.count, dtype=np.int64)
+                for start in range(0, self.count, 65536):
+                    block = self.vectors[start:min(start + 65536, self.count)].astype(
+                        np.float32) / QUANT_SCALE
+                    assignments[start:start + len(block)] = np.argmax(
+                        block @ centroids.T, axis=1)
+                conn.executemany('UPDATE rows SET list = ? WHERE row = ?',
+                                 zip(assignments.tolist(), range(self.count)))
+                # Publicados por rename: os outros processos nunca leem um
+                # arquivo pela metade
+                tmp = f"{self._centroids_path}.{os.getpid()}.tmp.npy"
+                np.save(tmp, centroids)
+                os.replace(tmp, self._centroids_path)
+            self._refresh()
+
+    @timed('similarity.search')
+    def search(self, vector, k=10, nprobe=DEFAULT_NPROBE, exclude=None):
+        """
+        Find the fans whose vectors are most similar (cosine) to `vector`.
+
+        Args:
+            vector (numpy.ndarray): Query vector (normalized)
+            k (int): Number of results
+            nprobe (int): Inverted lists scanned when the IVF is trained
+            exclude (str, optional): Fan id left out of the results
+
+        Returns:
+            list: (fan_id, similarity) pairs, most similar first
+        """
+        with self._lock:
+            self._refresh()
+            if self.count == 0:
+                return []
+            if self.centroids is None:
+                candidates = np.arange(self.count)
+            else:
+                lists = self._inverted_lists()
+                probes = np.argsort(-(self.centroids @ vector))[:nprobe]
+                candidates = np.concatenate(
+                    [lists.get(int(p), np.empty(0, dtype=np.int64))
+                     for p in probes])
+                if not len(candidates):
+                    return []
+            scores = (self.vectors[candidates].astype(np.float32) @
+                      vector) / QUANT_SCALE
+
+        top = np.argsort(-scores)[:k + 1]
+        rows = [int(candidates[i]) for i in top]
+        placeholders = ', '.join('?' * len(rows))
+        fan_ids = dict(self._db().execute(
+            f'SELECT row, fan_id FROM rows WHERE row IN ({placeholders})', rows))
+        results = [(fan_ids[int(candidates[i])], float(scores[i])) for i in top
+                   if fan_ids[int(candidates[i])] != exclude]
+        return results[:k]
+
+
+_indexes = {}
+_index_lock = threading.Lock()
+
+
+def get_fan_index():
+    """
+    Return the fan vector index of the current tenant, opened once per process.
+
+    The index is named after the tenant's vector layout, so a change to the
+    club's form options starts a new index instead of mixing vectors of two
+    layouts (rebuild it with `python -m utils.similarity_index --rebuild`).
+
+    Returns:
+        FanVectorIndex: The index of all the tenant's fans
+    """
+    layout = vector_layout()
+    key = (current_tenant_id(), layout.signature)
+    with _index_lock:
+        if key not in _indexes:
+            _indexes[key] = FanVectorIndex(f"fans-{layout.signature}", layout.dim)
+        return _indexes[key]
+
+
+def index_fan(fan_id, user_data):
+    """
+    Encode a fan profile and insert it into the tenant's index.
+
+    Args:
+        fan_id (str): Fan identifier
+        user_data (dict): Fan profile with at least 'interests' and 'social_media'
+    """
+    get_fan_index().upsert(fan_id, encode_profile(user_data))
+
+
+def rebuild(batch_size=1000):
+    """
+    Re-insert every stored profile of the tenant into its index.
+
+    Args:
+        batch_size (int): Profiles loaded per batch
+
+    Returns:
+        int: Number of fans indexed
+    """
+    fan_ids = list(get_backend().load_many('interests'))
+    for start in range(0, len(fan_ids), batch_size):
+        for fan_id, profile in load_profiles(fan_ids[start:start + batch_size]).items():
+            index_fan(fan_id, profile)
+    return len(fan_ids)
+
+
+if __name__ == '__main__':
+    # python -m utils.similarity_index: retreina os centróides com os dados atuais
+    # python -m utils.similarity_index --rebuild: antes, reinsere todos os perfis
+    # (depois de mudar as opções do formulário do clube)
+    if '--rebuild' in sys.argv:
+        print(f"{rebuild()} perfis reinseridos no índice.")
+    index = get_fan_index()
+    index.train()
+    print(f"{index.count} fãs indexados; IVF {'treinado' if index.centroids is not None else 'não treinado (poucos fãs)'}")
@@ -2,6 +2,21 @@ import re
 import random
 from datetime import datetime, timedelta
 
+from utils.instrumentation import timed
+from utils.profile_parsing import detect_platform, parse_profile
+from utils.scoring import feature_vector, load_rules
+from utils.timeseries import POINT_BUDGET, build_activity_levels
+
+PLATFORM_NAMES = {
+    'twitch': 'Twitch',
+    'steam': 'Steam',
+    'discord': 'Discord',
+    'twitter': 'Twitter/X',
+    'instagram': 'Instagram',
+    'facebook': 'Facebook',
+}
+
+@timed('social.extract_info')
 def extract_social_media_info(social_media_data):
     """
     Extract and analyze information from social media profiles.
@@ -26,7 +41,9 @@ def extract_social_media_info(social_media_data):
             'engagement_score': 0,
             'activity': [],
             'top_mentioned_games': [],
-            'top_mentioned_teams': []
+            'top_mentioned_teams': [],
+            'content_creation': 0,
+            'community_involvement': 0
         }
     
     # Common esports games
@@ -72,15 +89,25 @@ def extract_social_media_info(social_media_data):
     top_mentioned_games.sort(key=lambda x: x['mentions'], reverse=True)
     top_mentioned_teams.sort(key=lambda x: x['mentions'], reverse=True)
     
-    return {
+    analysis = {
         'esports_posts': esports_posts,
         'team_mentions': team_mentions,
         'engagement_score': engagement_score,
         'activity': activity,
         'top_mentioned_games': top_mentioned_games,
-        'top_mentioned_teams': top_mentioned_teams
+        'top_mentioned_teams': top_mentioned_teams,
+        # Radar axes that are still simulated; drawn once here and stored
+        # with the analysis, so the radar and the stored scores agree
+        'content_creation': random.randint(3, 8),
+        'community_involvement': random.randint(4, 9)
     }
 
+    # Long histories keep their downsampled resolution levels precomputed
+    if len(activity) > POINT_BUDGET:
+        analysis['activity_levels'] = build_activity_levels(activity)
+    return analysis
+
+@timed('social.analyze_relevance')
 def analyze_social_relevance(esports_profiles, interests):
     """
     Analyze the relevance of esports profiles based on user interests.
@@ -103,18 +130,15 @@ def analyze_social_relevance(esports_profiles, interests):
             'matching_interests': []
         }
     
-    # Calculate a relevance score based on the number of profiles and user interests
-    base_score = random.randint(5, 8)
-    
-    # Adjust score based on available profiles
-    profile_count = sum(1 for key, value in esports_profiles.items() 
-                       if key in ['twitch_username', 'steam_profile'] and value)
-    
-    score_adjustment = profile_count * 0.5
-    
-    # Adjust score based on user interests
-    interest_adjustment = 0
-    
+    # Features of the profile; the weights live in catalog/scoring_rules.json
+    features = {
+        'base': random.randint(5, 8),
+        'profiles': sum(1 for key, value in esports_profiles.items()
+                        if key in ['twitch_username', 'steam_profile'] and value),
+        'matching_games': 0,
+        'matching_teams': 0,
+    }
+
     # Check for matching interests
     matching_interests = []
     
@@ -123,31 +147,25 @@ def analyze_social_relevance(esports_profiles, interests):
         for game in interests['favorite_games']:
             if game != 'Other' and random.random() > 0.3:  # 70% chance of matching
                 matching_interests.append(game)
-                interest_adjustment += 0.3
+                features['matching_games'] += 1
     
     if 'favorite_teams' in interests and interests['favorite_teams']:
         # Simulate finding matching teams in the esports profiles
         for team in interests['favorite_teams']:
             if team != 'Other' and random.random() > 0.5:  # 50% chance of matching
                 matching_interests.append(team)
-                interest_adjustment += 0.2
+                features['matching_teams'] += 1
     
-    # Calculate final score
-    final_score = min(10, base_score + score_adjustment + interest_adjustment)
-    final_score = round(final_score, 1)
-    
-    # Determine confidence level
-    if final_score >= 8:
-        confidence = 'High'
-    elif final_score >= 5:
-        confidence = 'Medium'
-    else:
-        confidence = 'Low'
+    # Calculate final score and confidence level with the active rules
+    rules = load_rules()
+    final_score = float(rules.score('relevance', feature_vector('relevance', features))[0])
     
     return {
         'relevance_score': final_score,
-        'confidence': confidence,
-        'matching_interests': matching_interests
+        'confidence': rules.confidence_label(final_score),
+        'matching_interests': matching_interests,
+        'features': features,
+        'rule_version': rules.version
     }
 
 def validate_esports_profile(profile_url, interests):
@@ -161,16 +179,19 @@ def validate_esports_profile(profile_url, interests):
     Returns:
         dict: Validation result
     """
-    # Extract platform from URL
-    platform = None
-    if 'twitch.tv' in profile_url:
-        platform = 'Twitch'
-    elif 'steamcommunity.com' in profile_url:
-        platform = 'Steam'
-    elif 'discord.gg' in profile_url:
-        platform = 'Discord'
-    else:
-        platform = 'Unknown'
+    # Extract platform and handle from the URL (precompiled patterns)
+    platform_key = detect_platform(profile_url)
+    handle = parse_profile(platform_key, profile_url) if platform_key else None
+    platform = PLATFORM_NAMES.get(platform_key, 'Unknown')
+
+    if platform_key and not handle and platform_key != 'discord':
+        return {
+            'platform': platform,
+            'handle': None,
+            'is_valid': False,
+            'relevance_score': 0,
+            'message': "Profile URL does not point to a user profile."
+        }
     
     # Generate a relevance score
     relevance_score = random.randint(1, 10)
@@ -180,6 +201,7 @@ def validate_esports_profile(profile_url, interests):
     
     return {
         'platform': platform,
+        'handle': handle,
         'is_valid': is_valid,
         'relevance_score': relevance_score,
         'message': f"Profile {'validated' if is_valid else 'not validated'} with a relevance score of {relevance_score}/10."
@@ -0,0 +1,125 @@
+import os
+import secrets
+import sqlite3
+import threading
+
+from utils.tenants import ROOT_TENANT, current_tenant_id
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Diretório dos dados persistentes (índices, perfis, chaves)
+DATA_DIR = os.environ.get('KYF_DATA_DIR', os.path.join(ROOT_DIR, 'data'))
+
+_local = threading.local()
+
+
+def data_dir():
+    """
+    Diretório de dados do clube atual (utils/tenants.py).
+    
+    Cada clube tem os próprios bancos, índices, log de perfis e chaves.
+    
+    Returns:
+        str: DATA_DIR para ROOT_TENANT, DATA_DIR/tenants/<id> para os demais
+    """
+    tenant_id = current_tenant_id()
+    if tenant_id == ROOT_TENANT:
+        return DATA_DIR
+    return os.path.join(DATA_DIR, 'tenants', tenant_id)
+
+
+def data_path(*parts):
+    """
+    Monta um caminho dentro do diretório de dados, criando os diretórios.
+    
+    Args:
+        *parts: Partes do caminho relativas a data_dir()
+        
+    Returns:
+        str: Caminho absoluto
+    """
+    path = os.path.join(data_dir(), *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def connect(name):
+    """
+    Retorna a conexão SQLite do banco `name` para a thread atual.
+    
+    O Streamlit executa cada sessão em sua própria thread, então cada thread
+    mantém uma conexão por banco em vez de compartilhar uma com locks.
+    
+    Args:
+        name (str): Nome do banco (arquivo data_dir()/<name>.db)
+        
+    Returns:
+        sqlite3.Connection: Conexão em modo WAL
+    """
+    path = data_path(f"{name}.db")
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        connections[path] = conn
+    return conn
+
+
+def forget_connections():
+    """
+    Descarta as conexões SQLite desta thread sem fechá-las.
+    
+    Usado em processos filhos criados com fork, que não devem reutilizar as
+    conexões herdadas do processo pai.
+    """
+    _local.connections = {}
+
+
+def load_secret(name, size=32):
+    """
+    Lê uma chave secreta local, gerando-a na primeira utilização.
+    
+    A variável de ambiente KYF_SECRET_<NAME> (hex) tem precedência sobre o
+    arquivo, para que réplicas do app compartilhem a mesma chave.
+    
+    Args:
+        name (str): Nome da chave
+        size (int): Tamanho em bytes de uma chave nova
+        
+    Returns:
+        bytes: A chave
+    """
+    from_env = os.environ.get(f"KYF_SECRET_{name.upper()}")
+    if from_env:
+        return bytes.fromhex(from_env)
+
+    path = data_path('secrets', f"{name}.key")
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+
+    # Gravada ao lado e publicada com link(), que falha se a chave já existe:
+    # quem encontra o arquivo sempre lê a chave completa
+    key = secrets.token_bytes(size)
+    tmp = f"{path}.{os.getpid()}.{secrets.token_hex(4)}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        os.link(tmp, path)
+    except FileExistsError:
+        # Outra thread ou processo criou a chave ao mesmo tempo
+        with open(path, 'rb') as f:
+            key = f.read()
+    finally:
+        os.remove(tmp)
+    return key
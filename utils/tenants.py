@@ -0,0 +1,196 @@
+import contextvars
+import functools
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Configuração de cada clube: tenants/<id>.json
+TENANTS_DIR = os.path.join(ROOT_DIR, 'tenants')
+
+# Clube usado quando nenhum é escolhido (scripts, app sem ?club=, API sem
+# o cabeçalho X-Tenant)
+DEFAULT_TENANT = os.environ.get('KYF_TENANT', 'furia')
+
+# Clube que já usava o DATA_DIR antes dos tenants: seus dados continuam na
+# raiz; os demais ficam em DATA_DIR/tenants/<id>
+ROOT_TENANT = os.environ.get('KYF_ROOT_TENANT', 'furia')
+
+# Catálogos usados quando a configuração do clube não define os seus
+DEFAULT_CATALOGS = {
+    'recommendations': 'catalog/recommendations.json',
+    'events': 'catalog/events.json',
+    'scoring_rules': 'catalog/scoring_rules.json',
+}
+
+_TENANT_ID = re.compile(r'^[a-z0-9][a-z0-9_-]{0,63}$')
+
+# Clube da requisição ou execução atual; contextvars acompanha threads do
+# Streamlit, tarefas do asyncio e o run_in_threadpool da API
+_current = contextvars.ContextVar('kyf_tenant', default=None)
+
+
+class Tenant:
+    """
+    Configuração de um clube: identidade visual, vocabulários e catálogos.
+
+    Attributes:
+        id (str): Identificador (nome do arquivo em TENANTS_DIR)
+        name (str): Nome do clube
+        page_title (str): Título da página do app
+        logo (str): Asset do logo (utils/assets.py)
+        logo_fallback (str): Arquivo exibido se o asset não foi gerado
+        icon (str): Asset do ícone da página
+        games (list): Opções de jogos da etapa 2
+        teams (list): Opções de times da etapa 2
+        merchandise (list): Opções de produtos da etapa 2
+        catalogs (dict): Nome do catálogo para o caminho absoluto do JSON
+    """
+
+    def __init__(self, tenant_id, config):
+        self.id = tenant_id
+        self.name = config['name']
+        self.page_title = config.get('page_title', f"Conheça Seu Fã - {self.name}")
+        self.logo = config.get('logo')
+        self.logo_fallback = config.get('logo_fallback')
+        self.icon = config.get('icon')
+        self.games = config['games']
+        self.teams = config['teams']
+        self.merchandise = config['merchandise']
+        self.catalogs = {name: os.path.join(ROOT_DIR, path) for name, path in
+                         {**DEFAULT_CATALOGS, **config.get('catalogs', {})}.items()}
+
+
+@lru_cache(maxsize=None)
+def _load_tenant(path, mtime):
+    with open(path) as f:
+        return Tenant(os.path.basename(path)[:-5], json.load(f))
+
+
+def load_tenant(tenant_id):
+    """
+    Carrega a configuração de um clube, relida só quando o arquivo muda.
+
+    Args:
+        tenant_id (str): Identificador do clube
+
+    Returns:
+        Tenant: A configuração
+
+    Raises:
+        ValueError: Se o clube não existe
+    """
+    path = os.path.join(TENANTS_DIR, f"{tenant_id}.json")
+    if not _TENANT_ID.match(tenant_id or '') or not os.path.exists(path):
+        raise ValueError(f"Clube desconhecido: {tenant_id}")
+    return _load_tenant(path, os.path.getmtime(path))
+
+
+def tenant_ids():
+    """
+    Lista os clubes configurados.
+
+    Returns:
+        list: Identificadores, em ordem alfabética
+    """
+    return sorted(name[:-5] for name in os.listdir(TENANTS_DIR)
+                  if name.endswith('.json') and _TENANT_ID.match(name[:-5]))
+
+
+def current_tenant_id():
+    """
+    Identificador do clube da execução atual.
+
+    Returns:
+        str: O clube escolhido com set_tenant/use_tenant, ou DEFAULT_TENANT
+    """
+    return _current.get() or DEFAULT_TENANT
+
+
+def current_tenant():
+    """
+    Configuração do clube da execução atual.
+
+    Returns:
+        Tenant: A configuração
+    """
+    return load_tenant(current_tenant_id())
+
+
+def set_tenant(tenant_id):
+    """
+    Escolhe o clube do contexto atual (requisição da API ou execução do app).
+
+    Args:
+        tenant_id (str): Identificador do clube
+
+    Returns:
+        Tenant: A configuração
+
+    Raises:
+        ValueError: Se o clube não existe
+    """
+    tenant = load_tenant(tenant_id)
+    _current.set(tenant.id)
+    return tenant
+
+
+@contextmanager
+def use_tenant(tenant_id):
+    """
+    Executa um bloco com outro clube e restaura o anterior ao sair.
+
+    Args:
+        tenant_id (str): Identificador do clube
+
+    Yields:
+        Tenant: A configuração
+    """
+    tenant = load_tenant(tenant_id)
+    token = _current.set(tenant.id)
+    try:
+        yield tenant
+    finally:
+        _current.reset(token)
+
+
+def tenant_cache(maxsize=128):
+    """
+    lru_cache com uma partição (e um limite `maxsize`) por clube.
+
+    Um clube grande ocupa só a própria partição, então o volume de um clube
+    não tira do cache as entradas quentes dos outros.
+
+    Args:
+        maxsize (int): Entradas por clube
+
+    Returns:
+        callable: O decorador
+    """
+    def decorator(function):
+        partitions = {}
+        lock = threading.Lock()
+
+        @functools.wraps(function)
+        def wrapper(*args):
+            tenant_id = current_tenant_id()
+            cached = partitions.get(tenant_id)
+            if cached is None:
+                with lock:
+                    cached = partitions.setdefault(
+                        tenant_id, lru_cache(maxsize)(function))
+            return cached(*args)
+
+        def cache_clear():
+            for cached in list(partitions.values()):
+                cached.cache_clear()
+
+        wrapper.cache_clear = cache_clear
+        wrapper.cache_info = lambda: {tenant_id: cached.cache_info()
+                                      for tenant_id, cached in list(partitions.items())}
+        return wrapper
+    return decorator
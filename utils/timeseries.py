@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+
+# Pontos máximos por série enviados ao navegador, qualquer que seja o histórico
+POINT_BUDGET = 500
+
+# Níveis de resolução pré-calculados: (nome, janela em dias até o último
+# ponto; None = histórico inteiro). Cada nível tem até POINT_BUDGET pontos.
+RESOLUTION_LEVELS = (('Tudo', None), ('12 meses', 365), ('3 meses', 90))
+
+ACTIVITY_SERIES = ('posts', 'interactions')
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points and, in each bucket, the point forming
+    the largest triangle with the point kept in the previous bucket and
+    the average of the next bucket, which preserves the visual shape.
+
+    Args:
+        x (numpy.ndarray): Increasing x values (numeric)
+        y (numpy.ndarray): y values
+        threshold (int): Number of points to keep
+
+    Returns:
+        numpy.ndarray: Indices of the kept points, increasing
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Os pontos internos são divididos em threshold - 2 baldes
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    indices = np.empty(threshold, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs((x[previous] - avg_x) * (y[start:end] - y[previous]) -
+                      (x[previous] - x[start:end]) * (avg_y - y[previous]))
+        previous = start + int(area.argmax())
+        indices[bucket + 1] = previous
+    return indices
+
+
+def minmax_buckets(y, threshold):
+    """
+    Min/max bucketing: the lowest and highest point of each bucket.
+
+    Cheaper than LTTB and keeps every spike, at the cost of a less faithful
+    line shape.
+
+    Args:
+        y (numpy.ndarray): y values
+        threshold (int): Number of points to keep (two per bucket)
+
+    Returns:
+        numpy.ndarray: Indices of the kept points, increasing
+    """
+    n = len(y)
+    if threshold >= n or threshold < 2:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=float)
+    buckets = threshold // 2
+    edges = np.linspace(0, n, buckets + 1).astype(int)
+    # Cada balde é preenchido até o tamanho do maior para reduzir em bloco
+    width = int(np.diff(edges).max())
+    positions = edges[:-1, None] + np.arange(width)
+    valid = positions < edges[1:, None]
+    positions = np.minimum(positions, n - 1)
+    values = y[positions]
+    lows = np.where(valid, values, np.inf).argmin(axis=1)
+    highs = np.where(valid, values, -np.inf).argmax(axis=1)
+    rows = np.arange(buckets)
+    return np.unique(np.concatenate([positions[rows, lows], positions[rows, highs]]))
+
+
+def downsample(dates, values, max_points=POINT_BUDGET, method='lttb'):
+    """
+    Reduce a daily series to at most `max_points` points.
+
+    Args:
+        dates (pandas.Series): Dates (datetime64), increasing
+        values (pandas.Series): Values for each date
+        max_points (int): Point budget
+        method (str): 'lttb' or 'minmax'
+
+    Returns:
+        tuple: (dates, values) lists with ISO dates
+    """
+    if method == 'minmax':
+        indices = minmax_buckets(values.to_numpy(), max_points)
+    else:
+        x = dates.to_numpy().astype('datetime64[D]').astype(np.int64)
+        indices = lttb(x, values.to_numpy(), max_points)
+    return (dates.iloc[indices].dt.strftime('%Y-%m-%d').tolist(),
+            values.iloc[indices].tolist())
+
+
+def build_activity_levels(activity, max_points=POINT_BUDGET, method='lttb'):
+    """
+    Precompute the resolution levels of an activity history.
+
+    Each level covers a window ending at the last date and keeps at most
+    `max_points` points per series, so a chart built from the levels has
+    the same size for six months or ten years of history. Shorter windows
+    are only added when the whole history exceeds the budget (otherwise
+    zooming already shows every point) and does not fit in the window.
+
+    Args:
+        activity (list): Dicts with date, posts and interactions
+        max_points (int): Point budget per series and level
+        method (str): 'lttb' or 'minmax'
+
+    Returns:
+        dict: Level name to {series: {'x': dates, 'y': values}}, in
+            RESOLUTION_LEVELS order
+    """
+    if not activity:
+        return {}
+    df = pd.DataFrame(activity)
+    df['date'] = pd.to_datetime(df['date'])
+    df = df.sort_values('date', kind='stable').reset_index(drop=True)
+    first, last = df['date'].iloc[0], df['date'].iloc[-1]
+
+    levels = {}
+    for name, days in RESOLUTION_LEVELS:
+        if days is not None:
+            start = last - pd.Timedelta(days=days)
+            if len(df) <= max_points or start <= first:
+                continue
+            window = df[df['date'] > start]
+        else:
+            window = df
+        levels[name] = {}
+        for series in ACTIVITY_SERIES:
+            x, y = downsample(window['date'], window[series], max_points, method)
+            levels[name][series] = {'x': x, 'y': y}
+    return levels